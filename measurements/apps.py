@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class MeasurementsConfig(AppConfig):
+    default_auto_field = 'django.db.models.AutoField'
     name = 'measurements'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the page cache and latest buffer receivers)
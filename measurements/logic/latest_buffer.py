@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.models import Max
+
+from ..models import Measurement
+
+LATEST_BUFFER_SIZE = int(os.getenv('MEASUREMENTS_LATEST_BUFFER_SIZE', '50'))
+# Most per-variable / per-place buffers kept warm; the least recently read are dropped
+LATEST_BUFFER_MAX_KEYS = int(os.getenv('MEASUREMENTS_LATEST_BUFFER_MAX_KEYS', '1000'))
+# Seconds between Max('id') probes; reads in between never touch the database
+LATEST_BUFFER_PROBE_SECONDS = float(os.getenv('MEASUREMENTS_LATEST_BUFFER_PROBE_SECONDS', '5'))
+# Seconds a buffer is served before it is reloaded from SQL, whatever the probe says
+LATEST_BUFFER_TTL = float(os.getenv('MEASUREMENTS_LATEST_BUFFER_TTL', '60'))
+
+
+class LatestMeasurements:
+    """
+    In-process ring buffers with the newest measurements overall, per variable and per place.
+
+    The overall buffer is loaded when the worker starts (see warm()); the others are
+    loaded from SQL the first time they are read. Writes in this process are appended
+    after commit: single saves from the Measurement post_save receiver, bulk ingestion
+    from its on_commit hook. Updates and deletes (and renamed variables) drop the buffers.
+
+    Writes by other processes (or the admin of another worker, a shell) are noticed by a
+    consistency probe that reads Max('id') at most once every LATEST_BUFFER_PROBE_SECONDS:
+    if it moved past the highest id this process knows about, every buffer goes cold.
+    Reads between probes are served from memory. Changes the probe cannot see (a
+    transaction that commits with a lower id after a higher one, updates or deletes in
+    another process) are bounded by LATEST_BUFFER_TTL: a buffer older than that is reloaded.
+    """
+
+    def __init__(self, capacity=LATEST_BUFFER_SIZE, max_keys=LATEST_BUFFER_MAX_KEYS, ttl=LATEST_BUFFER_TTL,
+                 probe_interval=LATEST_BUFFER_PROBE_SECONDS):
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._buffers = {}  # key -> (deque, loaded at)
+        self._max_id = None
+        self._probed_at = None
+        self.hits = 0
+        self.sql_reads = 0
+        self.probes = 0
+
+    @staticmethod
+    def _key(variable=None, place=None):
+        return variable, place
+
+    def _load(self, variable, place):
+        queryset = Measurement.objects.select_related('variable').only(
+            'value', 'unit', 'place', 'dateTime', 'variable__name')
+        if variable is not None:
+            queryset = queryset.filter(variable_id=variable)
+        if place is not None:
+            queryset = queryset.filter(place=place)
+        return list(queryset.order_by('-dateTime', '-id')[:self.capacity])
+
+    def _probe(self, now):
+        """Reads Max('id') if the last probe is older than probe_interval; drops stale buffers."""
+        with self._lock:
+            if self._probed_at is not None and now - self._probed_at < self.probe_interval:
+                return
+        max_id = Measurement.objects.aggregate(max_id=Max('id'))['max_id']
+        with self._lock:
+            self.probes += 1
+            self._probed_at = now
+            if max_id != self._max_id:
+                self._buffers.clear()
+                self._max_id = max_id
+
+    def latest(self, n=10, variable=None, place=None):
+        """Newest n measurements (optionally of one variable and/or place), newest first."""
+        if n > self.capacity:
+            return self._load(variable, place)[:n]
+        key = self._key(variable, place)
+        now = time.monotonic()
+        self._probe(now)
+        with self._lock:
+            entry = self._buffers.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._buffers[key] = self._buffers.pop(key)  # most recently read goes last
+                self.hits += 1
+                return list(entry[0])[:n]
+            max_id = self._max_id
+
+        rows = self._load(variable, place)
+        with self._lock:
+            self.sql_reads += 1
+            # Only keep it if no write or invalidation was noticed while loading
+            if self._max_id == max_id and max_id is not None:
+                self._buffers.pop(key, None)
+                self._buffers[key] = (deque(rows, maxlen=self.capacity), now)
+                while len(self._buffers) > self.max_keys:
+                    self._buffers.pop(next(iter(self._buffers)))
+        return rows[:n]
+
+    def warm(self):
+        """Probes and loads the overall buffer (call once per worker, before serving)."""
+        self._probe(time.monotonic())
+        self.latest(self.capacity)
+
+    def invalidate(self):
+        """Drops every buffer and forces a probe on the next read (updates, deletes)."""
+        with self._lock:
+            self._buffers.clear()
+            self._max_id = None
+            self._probed_at = None
+
+    def record(self, measurements):
+        """
+        Appends committed measurements (oldest first) to the warm buffers they belong to.
+        Their ids must continue the highest known id without gaps; otherwise someone else
+        wrote in between (or ids were skipped) and the buffers are dropped instead.
+        """
+        ids = [measurement.id for measurement in measurements]
+        if not ids:
+            return
+        with self._lock:
+            if self._max_id is None or ids != list(range(self._max_id + 1, self._max_id + 1 + len(ids))):
+                self._buffers.clear()
+                self._max_id = None
+                self._probed_at = None
+                return
+            self._max_id = ids[-1]
+            for measurement in measurements:
+                for key in ((None, None), (measurement.variable_id, None), (None, measurement.place),
+                            (measurement.variable_id, measurement.place)):
+                    entry = self._buffers.get(key)
+                    if entry is not None:
+                        entry[0].appendleft(measurement)
+
+    def stats(self):
+        with self._lock:
+            return {'buffers': len(self._buffers), 'hits': self.hits, 'sqlReads': self.sql_reads, 'probes': self.probes}
+
+
+# One per worker process
+latest_measurements = LatestMeasurements()
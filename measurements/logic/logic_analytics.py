@@ -0,0 +1,206 @@
+import os
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Min, Sum
+
+from ..models import Measurement
+
+ANALYTICS_CHUNK_SIZE = int(os.getenv('MEASUREMENTS_ANALYTICS_CHUNK_SIZE', '100000'))
+# Percentiles come from a fixed histogram over [min, max]: error <= (max - min) / bins
+HISTOGRAM_BINS = 8192
+MAX_ANOMALIES = 1000
+MAX_RESAMPLE_BUCKETS = 100000
+
+def moving_average(values, window, carry=None):
+    """
+    Trailing moving average of `values`. `carry` holds the last window-1 inputs of the
+    previous chunk so a series can be processed chunk by chunk; returns (averages, carry).
+    The first window-1 points of a series average over the points seen so far.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if carry is None:
+        carry = np.empty(0, dtype=np.float64)
+    joined = np.concatenate((carry, values))
+    sums = np.cumsum(joined)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(joined) + 1), window)
+    averages = (sums / counts)[len(carry):]
+    return averages, joined[-(window - 1):] if window > 1 else joined[:0]
+
+def zscore_flags(values, mean, std, threshold, low=None, high=None):
+    """Boolean mask of points with |z| >= threshold or outside [low, high]."""
+    flags = np.zeros(len(values), dtype=bool)
+    if std > 0:
+        flags |= np.abs((values - mean) / std) >= threshold
+    if low is not None:
+        flags |= values < low
+    if high is not None:
+        flags |= values > high
+    return flags
+
+def percentiles_from_histogram(counts, vmin, vmax, percentiles):
+    """Percentiles (0-100) from histogram counts over [vmin, vmax], interpolated inside the bin."""
+    total = counts.sum()
+    if total == 0:
+        return {p: None for p in percentiles}
+    if vmax == vmin:
+        return {p: float(vmin) for p in percentiles}
+    width = (vmax - vmin) / len(counts)
+    cumulative = np.cumsum(counts)
+    result = {}
+    for p in percentiles:
+        rank = p / 100.0 * total
+        index = int(np.searchsorted(cumulative, rank, side='left'))
+        index = min(index, len(counts) - 1)
+        before = cumulative[index - 1] if index else 0
+        inside = (rank - before) / counts[index] if counts[index] else 0.0
+        result[p] = float(vmin + (index + inside) * width)
+    return result
+
+
+class SeriesAnalyzer:
+    """
+    Single streaming pass over a (times, values) series fed in chunks of NumPy arrays.
+    Memory is bounded by the chunk plus fixed-size accumulators (histogram, resample
+    buckets, capped anomaly list), independent of the series length. Needs the global
+    stats (count, mean, std, min, max, first/last time) up front, e.g. from one SQL aggregate.
+    """
+
+    def __init__(self, stats, step_seconds, z_threshold=3.0, low=None, high=None):
+        self.stats = stats
+        self.step = float(step_seconds)
+        self.z_threshold = z_threshold
+        self.low = low
+        self.high = high
+        self.origin = stats['first'] - stats['first'] % self.step
+        buckets = int((stats['last'] - self.origin) // self.step) + 1
+        if buckets > MAX_RESAMPLE_BUCKETS:
+            raise ValueError('step too small: %d buckets (max %d)' % (buckets, MAX_RESAMPLE_BUCKETS))
+        self.bucket_count = np.zeros(buckets, dtype=np.int64)
+        self.bucket_sum = np.zeros(buckets, dtype=np.float64)
+        self.bucket_min = np.full(buckets, np.inf)
+        self.bucket_max = np.full(buckets, -np.inf)
+        self.histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.anomaly_count = 0
+        self.anomalies = []
+
+    def feed(self, times, values):
+        stats = self.stats
+        index = ((times - self.origin) // self.step).astype(np.int64)
+        self.bucket_count += np.bincount(index, minlength=len(self.bucket_count))
+        self.bucket_sum += np.bincount(index, weights=values, minlength=len(self.bucket_sum))
+        np.minimum.at(self.bucket_min, index, values)
+        np.maximum.at(self.bucket_max, index, values)
+
+        if stats['max'] > stats['min']:
+            self.histogram += np.histogram(values, bins=HISTOGRAM_BINS, range=(stats['min'], stats['max']))[0]
+        else:
+            self.histogram[0] += len(values)
+
+        flags = zscore_flags(values, stats['mean'], stats['std'], self.z_threshold, self.low, self.high)
+        flagged = np.flatnonzero(flags)
+        self.anomaly_count += len(flagged)
+        room = MAX_ANOMALIES - len(self.anomalies)
+        if room > 0 and len(flagged):
+            flagged = flagged[:room]
+            z = (values[flagged] - stats['mean']) / stats['std'] if stats['std'] > 0 else np.zeros(len(flagged))
+            self.anomalies.extend(zip(times[flagged].tolist(), values[flagged].tolist(), z.tolist()))
+
+    def result(self, percentiles=(50, 90, 95, 99), window=5):
+        stats = self.stats
+        filled = np.flatnonzero(self.bucket_count)
+        means = self.bucket_sum[filled] / self.bucket_count[filled]
+        smoothed, _ = moving_average(means, window)
+        return {
+            'count': stats['count'],
+            'mean': stats['mean'],
+            'std': stats['std'],
+            'min': stats['min'],
+            'max': stats['max'],
+            'percentiles': percentiles_from_histogram(self.histogram, stats['min'], stats['max'], percentiles),
+            'resample': [
+                {
+                    'start': self.origin + i * self.step,
+                    'count': int(self.bucket_count[i]),
+                    'mean': float(mean),
+                    'min': float(self.bucket_min[i]),
+                    'max': float(self.bucket_max[i]),
+                    'movingAvg': float(average),
+                }
+                for i, mean, average in zip(filled.tolist(), means, smoothed)
+            ],
+            'anomalyCount': self.anomaly_count,
+            'anomalies': [{'time': t, 'value': v, 'z': z} for t, v, z in self.anomalies],
+        }
+
+
+def _series_queryset(variable, start=None, end=None, place=None):
+    queryset = Measurement.objects.filter(variable_id=variable, value__isnull=False)
+    if start is not None:
+        queryset = queryset.filter(dateTime__gte=start)
+    if end is not None:
+        queryset = queryset.filter(dateTime__lt=end)
+    if place is not None:
+        queryset = queryset.filter(place=place)
+    return queryset
+
+def series_stats(queryset):
+    """Global stats of a series in one SQL aggregate (no rows are loaded)."""
+    row = queryset.aggregate(
+        count=Count('value'), total=Sum('value'), squares=Sum(F('value') * F('value')),
+        min=Min('value'), max=Max('value'), first=Min('dateTime'), last=Max('dateTime'), maxId=Max('id'))
+    count = row['count']
+    if not count:
+        return None
+    mean = row['total'] / count
+    variance = max(row['squares'] / count - mean * mean, 0.0)
+    return {
+        'count': count, 'mean': mean, 'std': variance ** 0.5, 'min': row['min'], 'max': row['max'],
+        'first': row['first'].timestamp(), 'last': row['last'].timestamp(),
+        'lastDateTime': row['last'], 'maxId': row['maxId'],
+    }
+
+def iter_series_chunks(queryset, chunk_size=ANALYTICS_CHUNK_SIZE):
+    """Yields (epoch seconds, values) float64 arrays of at most chunk_size points, oldest first."""
+    rows = queryset.order_by('dateTime', 'id').values_list('dateTime', 'value').iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        times = np.fromiter((row[0].timestamp() for row in chunk), dtype=np.float64, count=len(chunk))
+        values = np.fromiter((row[1] for row in chunk), dtype=np.float64, count=len(chunk))
+        yield times, values
+
+def analyze_series(variable, step_seconds, start=None, end=None, place=None, window=5,
+                   z_threshold=3.0, low=None, high=None, percentiles=(50, 90, 95, 99)):
+    """
+    Stats, percentiles, resampled series with moving average and anomalies of one variable.
+    The stats aggregate and the streaming pass read one snapshot (a REPEATABLE READ
+    transaction on PostgreSQL), and the stream is also bounded by the stats' last dateTime
+    and max id, so rows written meanwhile cannot fall outside the analyzer's arrays.
+    """
+    if any(not 0 <= p <= 100 for p in percentiles):
+        raise ValueError('percentiles must be between 0 and 100')
+    queryset = _series_queryset(variable, start, end, place)
+    # The isolation level can only be set by the statement that opens the transaction
+    repeatable_read = connection.vendor == 'postgresql' and not connection.in_atomic_block
+    with transaction.atomic():
+        if repeatable_read:
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        stats = series_stats(queryset)
+        if stats is None:
+            return None
+        analyzer = SeriesAnalyzer(stats, step_seconds, z_threshold, low, high)
+        snapshot = queryset.filter(dateTime__lte=stats['lastDateTime'], id__lte=stats['maxId'])
+        for times, values in iter_series_chunks(snapshot):
+            analyzer.feed(times, values)
+    result = analyzer.result(percentiles, window)
+    for point in result['resample']:
+        point['start'] = datetime.fromtimestamp(point['start'], tz=dt_timezone.utc).isoformat()
+    for anomaly in result['anomalies']:
+        anomaly['time'] = datetime.fromtimestamp(anomaly['time'], tz=dt_timezone.utc).isoformat()
+    return result
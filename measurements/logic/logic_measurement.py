@@ -1,10 +1,164 @@
+import base64
+import math
+import os
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Q
+
+from monitoring.page_cache import invalidate
+from variables.models import Variable
 from ..models import Measurement
+from .latest_buffer import latest_measurements
+from .logic_rollup import apply_measurements
+
+INGEST_CHUNK_SIZE = int(os.getenv('MEASUREMENTS_INGEST_CHUNK_SIZE', '5000'))
+INGEST_MAX_ERRORS = 100
+PAGE_MAX_LIMIT = 500
+EXPORT_CHUNK_SIZE = int(os.getenv('MEASUREMENTS_EXPORT_CHUNK_SIZE', '5000'))
+EXPORT_FIELDS = ('id', 'variable_id', 'variable__name', 'value', 'unit', 'place', 'dateTime')
 
 def get_measurements():
-    queryset = Measurement.objects.all().order_by('-dateTime')[:10]
-    return (queryset)
+    # Served from the in-process ring buffer; it falls back to a joined SQL query when cold
+    return latest_measurements.latest(10)
+
+def _on_commit_written(measurements):
+    # bulk_create sends no post_save, so bulk ingestion does what the receivers in
+    # measurements.signals do for a single save
+    invalidate('measurements')
+    latest_measurements.record(measurements)
+
+def encode_cursor(date_time, measurement_id):
+    raw = '%s|%d' % (date_time.isoformat(), measurement_id)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date_time, measurement_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date_time), int(measurement_id)
+    except (UnicodeError, TypeError, ValueError) as e:
+        raise ValueError('invalid cursor: %s' % e)
+
+def get_measurements_page(variable=None, place=None, cursor=None, limit=50):
+    """
+    Keyset (cursor) page of measurements, newest first on (dateTime, id). Each page is an
+    index range scan on the composite indexes, so its cost does not grow with history.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(int(limit), PAGE_MAX_LIMIT))
+    queryset = Measurement.objects.all()
+    if variable is not None:
+        queryset = queryset.filter(variable_id=variable)
+    if place is not None:
+        queryset = queryset.filter(place=place)
+    if cursor:
+        date_time, measurement_id = decode_cursor(cursor)
+        # The OR alone cannot bound an index range scan; the redundant dateTime <= conjunct
+        # gives the planner a start key on the (dateTime, id) indexes, so deep pages do
+        # not scan from the head of the index
+        queryset = queryset.filter(dateTime__lte=date_time).filter(
+            Q(dateTime__lt=date_time) | Q(dateTime=date_time, id__lt=measurement_id))
+    rows = list(
+        queryset.order_by('-dateTime', '-id')
+        .values('id', 'variable_id', 'variable__name', 'value', 'unit', 'place', 'dateTime')[:limit + 1]
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['dateTime'], rows[-1]['id'])
+    return rows, next_cursor
+
+def iter_export_rows(variable=None, place=None, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Every matching measurement (joined with its variable name) as tuples of EXPORT_FIELDS,
+    oldest first, read through a server-side cursor so memory stays constant.
+    """
+    queryset = Measurement.objects.all()
+    if variable is not None:
+        queryset = queryset.filter(variable_id=variable)
+    if place is not None:
+        queryset = queryset.filter(place=place)
+    if start is not None:
+        queryset = queryset.filter(dateTime__gte=start)
+    if end is not None:
+        queryset = queryset.filter(dateTime__lt=end)
+    return queryset.order_by('dateTime', 'id').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
 
 def create_measurement(form):
-    measurement = form.save()
-    measurement.save()
-    return ()
\ No newline at end of file
+    # form.save() already writes the row; a second save() was a redundant UPDATE
+    with transaction.atomic():
+        measurement = form.save()
+        apply_measurements([measurement])
+    return measurement
+
+def _clean_row(row):
+    """Returns a validated (variable_id, value, unit, place) tuple or raises ValueError."""
+    if not isinstance(row, dict):
+        raise ValueError('row must be an object')
+    variable_id = int(row['variable'])
+    value = row.get('value')
+    value = None if value in (None, '') else float(value)
+    # nan/inf parse as floats but poison rollups and percentiles and are not valid JSON
+    if value is not None and not math.isfinite(value):
+        raise ValueError('value must be a finite number')
+    # A short CSV row leaves the missing cells as None, which str() would turn into 'None'
+    if row['unit'] is None or row['place'] is None:
+        raise ValueError('unit and place are required')
+    unit = str(row['unit']).strip()
+    place = str(row['place']).strip()
+    if not unit or len(unit) > 50:
+        raise ValueError('unit must have 1 to 50 characters')
+    if not place or len(place) > 50:
+        raise ValueError('place must have 1 to 50 characters')
+    return variable_id, value, unit, place
+
+def _flush(pending, known_variables, result):
+    """
+    Resolves the chunk's variable ids with one query and writes it with one bulk_create,
+    together with its rollup buckets in ingest mode.
+    """
+    missing = {variable_id for _, (variable_id, _, _, _) in pending} - known_variables.keys()
+    if missing:
+        known_variables.update(Variable.objects.only('name').in_bulk(missing))
+
+    measurements = []
+    for index, (variable_id, value, unit, place) in pending:
+        variable = known_variables.get(variable_id)
+        if variable is None:
+            _reject(result, index, 'variable %s does not exist' % variable_id)
+            continue
+        measurements.append(Measurement(variable=variable, value=value, unit=unit, place=place))
+    with transaction.atomic():
+        Measurement.objects.bulk_create(measurements, batch_size=INGEST_CHUNK_SIZE)
+        apply_measurements(measurements)
+        transaction.on_commit(lambda: _on_commit_written(measurements))
+    result['accepted'] += len(measurements)
+    return measurements
+
+def _reject(result, index, error):
+    result['rejected'] += 1
+    if len(result['errors']) < INGEST_MAX_ERRORS:
+        result['errors'].append({'row': index, 'error': error})
+
+def ingest_measurements(rows):
+    """
+    Validates and writes an iterable of {variable, value, unit, place} dicts in chunks of
+    INGEST_CHUNK_SIZE. Returns accepted/rejected counts and the first errors.
+    """
+    result = {'accepted': 0, 'rejected': 0, 'errors': []}
+    known_variables = {}
+    pending = []
+    for index, row in enumerate(rows):
+        try:
+            pending.append((index, _clean_row(row)))
+        except (KeyError, TypeError, ValueError) as e:
+            _reject(result, index, str(e) if not isinstance(e, KeyError) else 'missing field %s' % e)
+            continue
+        if len(pending) >= INGEST_CHUNK_SIZE:
+            _flush(pending, known_variables, result)
+            pending = []
+    if pending:
+        _flush(pending, known_variables, result)
+    return result
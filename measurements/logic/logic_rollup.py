@@ -0,0 +1,235 @@
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from ..models import Measurement, MeasurementRollup, RollupWatermark
+
+# 'schedule': the rollup_measurements command recomputes recent buckets outside the write path
+# 'ingest': buckets are upserted in the same transaction as every write. Every writer then
+#           updates the same 1h/1d rows, which serializes concurrent ingestion; opt-in only
+# 'off': no rollups are maintained
+ROLLUP_MODE = os.getenv('MEASUREMENTS_ROLLUP_MODE', 'schedule')
+# Scheduled mode recomputes this trailing window on every run, so rows whose transaction
+# commits late (after a run already covered their dateTime) are still counted
+ROLLUP_RESCAN_SECONDS = int(os.getenv('MEASUREMENTS_ROLLUP_RESCAN_SECONDS', '300'))
+# Longest range recomputed in one transaction while catching up
+ROLLUP_MAX_SPAN_SECONDS = int(os.getenv('MEASUREMENTS_ROLLUP_MAX_SPAN_SECONDS', '3600'))
+UPSERT_ROWS_PER_STATEMENT = 500
+WATERMARK_NAME = 'measurements'
+
+def _bucket_start(date_time, size):
+    seconds = int(date_time.timestamp())
+    return datetime.fromtimestamp(seconds - seconds % size, tz=dt_timezone.utc)
+
+def aggregate_samples(samples):
+    """
+    Folds (variable_id, place, dateTime, value) samples into
+    {(variable_id, resolution, place, bucketStart): [count, total, min, max]}. Null values are skipped.
+    """
+    buckets = {}
+    for variable_id, place, date_time, value in samples:
+        if value is None:
+            continue
+        for resolution, size in MeasurementRollup.RESOLUTIONS.items():
+            key = (variable_id, resolution, place, _bucket_start(date_time, size))
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [1, value, value, value]
+            else:
+                bucket[0] += 1
+                bucket[1] += value
+                bucket[2] = min(bucket[2], value)
+                bucket[3] = max(bucket[3], value)
+    return buckets
+
+def upsert_buckets(buckets, replace=False):
+    """
+    Adds the buckets to the stored rollups with INSERT ... ON CONFLICT DO UPDATE, so
+    concurrent writers increment the same bucket without read-modify-write races.
+    With replace=True the stored buckets are overwritten instead (idempotent recompute).
+    """
+    if not buckets:
+        return
+    qn = connection.ops.quote_name
+    meta = MeasurementRollup._meta
+    table = qn(meta.db_table)
+    columns = [qn(meta.get_field(f).column) for f in
+               ('variable', 'resolution', 'place', 'bucketStart', 'count', 'total', 'minValue', 'maxValue')]
+    variable, resolution, place, bucket_start, count, total, min_value, max_value = columns
+    least, greatest = ('LEAST', 'GREATEST') if connection.vendor == 'postgresql' else ('MIN', 'MAX')
+    sql_head = 'INSERT INTO %s (%s) VALUES ' % (table, ', '.join(columns))
+    if replace:
+        sql_tail = (
+            ' ON CONFLICT (%(variable)s, %(resolution)s, %(place)s, %(bucket_start)s) DO UPDATE SET '
+            '%(count)s = EXCLUDED.%(count)s, %(total)s = EXCLUDED.%(total)s, '
+            '%(min_value)s = EXCLUDED.%(min_value)s, %(max_value)s = EXCLUDED.%(max_value)s'
+        ) % locals()
+    else:
+        sql_tail = (
+            ' ON CONFLICT (%(variable)s, %(resolution)s, %(place)s, %(bucket_start)s) DO UPDATE SET '
+            '%(count)s = %(table)s.%(count)s + EXCLUDED.%(count)s, '
+            '%(total)s = %(table)s.%(total)s + EXCLUDED.%(total)s, '
+            '%(min_value)s = %(least)s(%(table)s.%(min_value)s, EXCLUDED.%(min_value)s), '
+            '%(max_value)s = %(greatest)s(%(table)s.%(max_value)s, EXCLUDED.%(max_value)s)'
+        ) % locals()
+
+    # Stable order so concurrent upserts lock the buckets in the same sequence
+    items = sorted(buckets.items(), key=lambda item: (item[0][0], item[0][1], item[0][2], item[0][3]))
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), UPSERT_ROWS_PER_STATEMENT):
+            chunk = items[start:start + UPSERT_ROWS_PER_STATEMENT]
+            params = []
+            for key, values in chunk:
+                params.extend(key)
+                params.extend(values)
+            values_sql = ', '.join(['(%s)' % ', '.join(['%s'] * len(columns))] * len(chunk))
+            cursor.execute(sql_head + values_sql + sql_tail, params)
+
+def apply_measurements(measurements):
+    """Ingest-mode hook: folds freshly written Measurement objects into the rollups."""
+    if ROLLUP_MODE != 'ingest':
+        return
+    upsert_buckets(aggregate_samples(
+        (m.variable_id, m.place, m.dateTime, m.value) for m in measurements
+    ))
+
+def _recompute(queryset, time_field, resolution, aggregates):
+    """
+    Groups a queryset into `resolution` buckets in SQL with the (count, total, min, max)
+    aggregates and overwrites those rollups.
+    """
+    kind = {'1m': 'minute', '1h': 'hour', '1d': 'day'}[resolution]
+    rows = (
+        queryset.annotate(bucket=Trunc(time_field, kind, tzinfo=dt_timezone.utc))
+        .values_list('variable_id', 'place', 'bucket')
+        .annotate(*aggregates)
+        .order_by()
+    )
+    buckets = {
+        (variable_id, resolution, place, bucket_start): [n, s, low, high]
+        for variable_id, place, bucket_start, n, s, low, high in rows
+    }
+    upsert_buckets(buckets, replace=True)
+    return buckets
+
+def rollup_range(start, end):
+    """
+    Recomputes every bucket touched by measurements in [start, end) (start aligned to the
+    minute): 1m buckets from the raw rows, then 1h from 1m and 1d from 1h, each one
+    overwriting the stored values. Running it twice gives the same rollups.
+    Returns the number of measurements folded.
+    """
+    minutes = _recompute(
+        Measurement.objects.filter(dateTime__gte=start, dateTime__lt=end, value__isnull=False),
+        'dateTime', '1m', (Count('id'), Sum('value'), Min('value'), Max('value')))
+    if not minutes:
+        return 0
+    for resolution, source in (('1h', '1m'), ('1d', '1h')):
+        since = _bucket_start(start, MeasurementRollup.RESOLUTIONS[resolution])
+        _recompute(
+            MeasurementRollup.objects.filter(resolution=source, bucketStart__gte=since, bucketStart__lt=end),
+            'bucketStart', resolution, (Sum('count'), Sum('total'), Min('minValue'), Max('maxValue')))
+    return sum(bucket[0] for bucket in minutes.values())
+
+def rollup_pending(now=None):
+    """
+    Scheduled mode: recomputes the buckets from ROLLUP_RESCAN_SECONDS before the last run
+    up to now (at most ROLLUP_MAX_SPAN_SECONDS per call) and moves the watermark, in one
+    transaction. The rescan window makes a row whose transaction commits after a run
+    already passed its dateTime show up in the next run instead of being skipped.
+    Returns (measurements folded, caught up).
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+        start = now - timedelta(seconds=ROLLUP_RESCAN_SECONDS)
+        if watermark.foldedUntil is None:
+            oldest = Measurement.objects.order_by('dateTime').values_list('dateTime', flat=True).first()
+            start = min(start, oldest) if oldest is not None else start
+        else:
+            start = min(start, watermark.foldedUntil - timedelta(seconds=ROLLUP_RESCAN_SECONDS))
+        start = _bucket_start(start, 60)
+        end = min(now, start + timedelta(seconds=max(ROLLUP_MAX_SPAN_SECONDS, ROLLUP_RESCAN_SECONDS + 60)))
+        folded = rollup_range(start, end)
+        watermark.foldedUntil = end
+        watermark.save(update_fields=['foldedUntil'])
+    return folded, end >= now
+
+def choose_resolution(step):
+    """Coarsest rollup whose bucket divides the step (1m at worst, steps are whole minutes)."""
+    step_seconds = int(step.total_seconds())
+    for resolution, size in sorted(MeasurementRollup.RESOLUTIONS.items(), key=lambda r: -r[1]):
+        if step_seconds % size == 0:
+            return resolution, size
+    return '1m', 60
+
+def _ceil(date_time, size):
+    floor = _bucket_start(date_time, size)
+    return floor if floor == date_time else floor + timedelta(seconds=size)
+
+def plan_segments(start, end, size):
+    """
+    Splits [start, end) into (resolution, from, to) pieces: whole `size` buckets in the
+    middle, and the partial head and tail read from the next finer rollups, down to 1m
+    (start must be aligned to the minute; the last 1m piece covers its whole minute).
+    """
+    finer = sorted((s, r) for r, s in MeasurementRollup.RESOLUTIONS.items() if s <= size)
+    resolution = finer[-1][1]
+    if size == finer[0][0]:
+        return [(resolution, start, end)] if start < end else []
+    body_start, body_end = _ceil(start, size), _bucket_start(end, size)
+    if body_start >= body_end:
+        return plan_segments(start, end, finer[-2][0])
+    return (plan_segments(start, body_start, finer[-2][0]) + [(resolution, body_start, body_end)]
+            + plan_segments(body_end, end, finer[-2][0]))
+
+def aggregate(variable, start, end, step, place=None):
+    """
+    min/max/avg/count of a variable (optionally at one place) per `step` interval of
+    [start, end), read from rollups instead of raw measurements. Intervals are aligned
+    to multiples of `step` (since the epoch, UTC), so the first and last may be partial.
+    Whole buckets of the coarsest rollup that divides the step cover the middle and
+    finer rollups fill the unaligned head and tail, all in one query. Ranges not
+    aligned to the minute are widened to whole minutes.
+    Returns (coarsest resolution used, series).
+    """
+    step_seconds = int(step.total_seconds())
+    resolution, size = choose_resolution(step)
+    start = _bucket_start(start, 60)
+    segments = plan_segments(start, end, size)
+    covering = Q()
+    for segment_resolution, segment_start, segment_end in segments:
+        covering |= Q(resolution=segment_resolution, bucketStart__gte=segment_start, bucketStart__lt=segment_end)
+    queryset = MeasurementRollup.objects.filter(covering, variable_id=variable)
+    if place is not None:
+        queryset = queryset.filter(place=place)
+
+    intervals = {}
+    for bucket_start, count, total, min_value, max_value in queryset.values_list(
+            'bucketStart', 'count', 'total', 'minValue', 'maxValue'):
+        index = int(bucket_start.timestamp()) // step_seconds
+        interval = intervals.get(index)
+        if interval is None:
+            intervals[index] = [count, total, min_value, max_value]
+        else:
+            interval[0] += count
+            interval[1] += total
+            interval[2] = min(interval[2], min_value)
+            interval[3] = max(interval[3], max_value)
+
+    series = [
+        {
+            'start': datetime.fromtimestamp(index * step_seconds, tz=dt_timezone.utc),
+            'count': count,
+            'avg': total / count if count else None,
+            'min': min_value,
+            'max': max_value,
+        }
+        for index, (count, total, min_value, max_value) in sorted(intervals.items())
+    ]
+    used = max((segment[0] for segment in segments), key=MeasurementRollup.RESOLUTIONS.get, default=resolution)
+    return used, series
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from measurements.logic.logic_rollup import ROLLUP_MODE, rollup_pending
+
+
+class Command(BaseCommand):
+    help = 'Recomputes recent 1m/1h/1d measurement rollups (MEASUREMENTS_ROLLUP_MODE=schedule).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='seconds to wait once caught up')
+        parser.add_argument('--once', action='store_true', help='catch up once and exit')
+
+    def handle(self, *args, interval, once, **options):
+        if ROLLUP_MODE != 'schedule':
+            self.stderr.write('MEASUREMENTS_ROLLUP_MODE is %r; rollups are only folded here in "schedule" mode'
+                              % ROLLUP_MODE)
+            return
+        try:
+            while True:
+                folded, caught_up = rollup_pending()
+                if folded:
+                    self.stdout.write('[rollup] %d measurements folded' % folded)
+                if caught_up:
+                    if once:
+                        break
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write('\nStopping...')
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('measurements', '0001_initial'),
+        ('variables', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['-dateTime', '-id'], name='measurement_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['variable', '-dateTime', '-id'], name='measurement_var_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['place', '-dateTime', '-id'], name='measurement_place_time_idx'),
+        ),
+    ]
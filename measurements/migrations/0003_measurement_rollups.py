@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('measurements', '0002_measurement_time_indexes'),
+        ('variables', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('foldedUntil', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MeasurementRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('place', models.CharField(max_length=50)),
+                ('resolution', models.CharField(choices=[('1m', '1m'), ('1h', '1h'), ('1d', '1d')], max_length=2)),
+                ('bucketStart', models.DateTimeField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('minValue', models.FloatField(null=True)),
+                ('maxValue', models.FloatField(null=True)),
+                ('variable', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='variables.variable')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['variable', 'resolution', 'bucketStart'], name='measurement_rollup_var_idx')],
+                'constraints': [models.UniqueConstraint(fields=('variable', 'resolution', 'place', 'bucketStart'), name='measurement_rollup_bucket_uniq')],
+            },
+        ),
+    ]
@@ -8,5 +8,48 @@ class Measurement(models.Model):
     place = models.CharField(max_length=50)
     dateTime = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Keyset pagination walks (dateTime, id) newest first, optionally per variable or place
+        indexes = [
+            models.Index(fields=['-dateTime', '-id'], name='measurement_time_idx'),
+            models.Index(fields=['variable', '-dateTime', '-id'], name='measurement_var_time_idx'),
+            models.Index(fields=['place', '-dateTime', '-id'], name='measurement_place_time_idx'),
+        ]
+
+    def __str__(self):
+        return '%s %s' % (self.value, self.unit)
+
+class MeasurementRollup(models.Model):
+    """Per variable/place time bucket (1m, 1h, 1d) with count, sum, min and max of the values."""
+    RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+    variable = models.ForeignKey(Variable, on_delete=models.CASCADE)
+    place = models.CharField(max_length=50)
+    resolution = models.CharField(max_length=2, choices=[(r, r) for r in RESOLUTIONS])
+    bucketStart = models.DateTimeField()
+    count = models.BigIntegerField(default=0)
+    total = models.FloatField(default=0)
+    minValue = models.FloatField(null=True)
+    maxValue = models.FloatField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['variable', 'resolution', 'place', 'bucketStart'], name='measurement_rollup_bucket_uniq'),
+        ]
+        indexes = [
+            # Queries across every place of a variable
+            models.Index(fields=['variable', 'resolution', 'bucketStart'], name='measurement_rollup_var_idx'),
+        ]
+
+    def __str__(self):
+        return '%s %s %s %s' % (self.variable_id, self.place, self.resolution, self.bucketStart)
+
+
+class RollupWatermark(models.Model):
+    """End of the last time range recomputed into the rollups by the scheduled rollup job."""
+    name = models.CharField(primary_key=True, max_length=50)
+    foldedUntil = models.DateTimeField(null=True)
+
     def __str__(self):
-        return '%s %s' % (self.value, self.unit)
\ No newline at end of file
+        return '%s %s' % (self.name, self.foldedUntil)
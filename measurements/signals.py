@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from monitoring.page_cache import invalidate_on_commit
+from .logic.latest_buffer import latest_measurements
+from .models import Measurement
+
+
+@receiver(post_save, sender=Measurement)
+def measurement_saved(sender, instance, created, **kwargs):
+    invalidate_on_commit('measurements')
+    if created:
+        transaction.on_commit(lambda: latest_measurements.record([instance]))
+    else:
+        transaction.on_commit(latest_measurements.invalidate)
+
+
+@receiver(post_delete, sender=Measurement)
+def measurement_deleted(sender, **kwargs):
+    invalidate_on_commit('measurements')
+    transaction.on_commit(latest_measurements.invalidate)
@@ -1,3 +1,202 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
 from django.test import TestCase
 
-# Create your tests here.
+from variables.models import Variable
+from .logic.latest_buffer import latest_measurements
+from .logic.logic_rollup import rollup_pending, rollup_range
+from .models import Measurement, MeasurementRollup
+
+BASE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class MeasurementTestCase(TestCase):
+    def setUp(self):
+        self.variable = Variable.objects.create(name='temperature')
+        latest_measurements.invalidate()
+
+    def add(self, value, at, place='lab', variable=None):
+        measurement = Measurement.objects.create(variable=variable or self.variable, value=value, unit='C', place=place)
+        Measurement.objects.filter(pk=measurement.pk).update(dateTime=at)
+        return measurement
+
+    def ingest(self, body, content_type='application/json'):
+        if content_type == 'application/json':
+            body = json.dumps(body)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/measurements/ingest/', data=body, content_type=content_type)
+
+
+class IngestTests(MeasurementTestCase):
+    def test_json_rows_are_accepted_or_rejected_per_row(self):
+        response = self.ingest([
+            {'variable': self.variable.id, 'value': 21.5, 'unit': 'C', 'place': 'lab'},
+            {'variable': self.variable.id, 'value': '', 'unit': 'C', 'place': 'lab'},
+            {'variable': 999999, 'value': 1, 'unit': 'C', 'place': 'lab'},
+            {'variable': self.variable.id, 'value': 'nan', 'unit': 'C', 'place': 'lab'},
+            {'variable': self.variable.id, 'value': 'inf', 'unit': 'C', 'place': 'lab'},
+            {'variable': self.variable.id, 'value': 1, 'place': 'lab'},
+            {'variable': self.variable.id, 'value': 1, 'unit': '', 'place': 'lab'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['accepted'], body['rejected']), (2, 5))
+        self.assertEqual([error['row'] for error in body['errors']], [3, 4, 5, 6, 2])
+        self.assertEqual(sorted(Measurement.objects.values_list('value', flat=True), key=str), [21.5, None])
+
+    def test_csv_with_a_short_row(self):
+        body = 'variable,value,unit,place\n%d,3.5,C,lab\n%d,4\n' % (self.variable.id, self.variable.id)
+        response = self.ingest(body, 'text/csv')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['accepted'], body['rejected']), (1, 1))
+        self.assertEqual(body['errors'][0]['error'], 'unit and place are required')
+        self.assertFalse(Measurement.objects.filter(unit='None').exists())
+
+    def test_ndjson_with_a_malformed_line(self):
+        body = '%s\n{oops\n' % json.dumps({'variable': self.variable.id, 'value': 1, 'unit': 'C', 'place': 'lab'})
+        response = self.ingest(body, 'application/x-ndjson')
+        self.assertEqual(response.json()['accepted'], 1)
+        self.assertEqual(response.json()['rejected'], 1)
+
+    def test_nothing_accepted_is_a_400(self):
+        self.assertEqual(self.ingest([{'variable': 'x'}]).status_code, 400)
+        self.assertEqual(self.ingest({'not': 'a list'}).status_code, 400)
+
+    def test_ingested_rows_show_on_the_dashboard(self):
+        self.client.get('/measurements/')
+        self.ingest([{'variable': self.variable.id, 'value': 42.25, 'unit': 'C', 'place': 'roof'}])
+        self.assertContains(self.client.get('/measurements/'), 'roof')
+
+
+class PageTests(MeasurementTestCase):
+    def test_cursor_walks_every_row_once_newest_first(self):
+        ids = [self.add(n, BASE + timedelta(minutes=n // 2)).id for n in range(7)]
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3, 'variable': self.variable.id}
+            if cursor:
+                params['cursor'] = cursor
+            body = self.client.get('/measurements/api/', params).json()
+            seen.extend(row['id'] for row in body['results'])
+            cursor = body['next']
+            if cursor is None:
+                break
+        expected = sorted(ids, key=lambda i: (Measurement.objects.get(pk=i).dateTime, i), reverse=True)
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_is_a_400(self):
+        self.assertEqual(self.client.get('/measurements/api/', {'cursor': '!!'}).status_code, 400)
+
+
+class AggregateTests(MeasurementTestCase):
+    def test_unaligned_range_matches_the_raw_rows(self):
+        for minute in range(0, 3 * 60, 7):
+            self.add(minute % 11, BASE + timedelta(minutes=minute))
+        rollup_range(BASE, BASE + timedelta(days=1))
+        response = self.client.get('/measurements/aggregate/', {
+            'variable': self.variable.id, 'start': (BASE + timedelta(minutes=20)).isoformat(),
+            'end': (BASE + timedelta(hours=2, minutes=30)).isoformat(), 'step': '1h'})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['resolution'], '1h')
+        for interval in body['series']:
+            start = max(datetime.fromisoformat(interval['start']), BASE + timedelta(minutes=20))
+            end = min(datetime.fromisoformat(interval['start']) + timedelta(hours=1), BASE + timedelta(hours=2, minutes=30))
+            values = list(Measurement.objects.filter(dateTime__gte=start, dateTime__lt=end).values_list('value', flat=True))
+            self.assertEqual(interval['count'], len(values))
+            self.assertEqual((interval['min'], interval['max']), (min(values), max(values)))
+            self.assertAlmostEqual(interval['avg'], sum(values) / len(values))
+        self.assertEqual(sum(i['count'] for i in body['series']),
+                         Measurement.objects.filter(dateTime__gte=BASE + timedelta(minutes=20),
+                                                    dateTime__lt=BASE + timedelta(hours=2, minutes=30)).count())
+
+    def test_rollup_pending_picks_up_late_rows_and_is_idempotent(self):
+        now = BASE + timedelta(hours=1)
+        self.add(1, BASE + timedelta(minutes=50))
+        rollup_pending(now=now)
+        self.add(3, BASE + timedelta(minutes=55))  # commits after the run covered its minute
+        rollup_pending(now=now + timedelta(minutes=1))
+        rollup_pending(now=now + timedelta(minutes=1))
+        hour = MeasurementRollup.objects.get(resolution='1h')
+        self.assertEqual((hour.count, hour.total, hour.minValue, hour.maxValue), (2, 4.0, 1.0, 3.0))
+
+    def test_bad_parameters_are_a_400(self):
+        params = {'variable': self.variable.id, 'start': BASE.isoformat(), 'end': BASE.isoformat()}
+        self.assertEqual(self.client.get('/measurements/aggregate/', params).status_code, 400)
+        params['end'] = (BASE + timedelta(hours=1)).isoformat()
+        self.assertEqual(self.client.get('/measurements/aggregate/', dict(params, step='90s')).status_code, 400)
+        self.assertEqual(self.client.get('/measurements/aggregate/', {'variable': 1}).status_code, 400)
+
+
+class AnalyticsTests(MeasurementTestCase):
+    def test_stats_percentiles_and_anomalies(self):
+        for n in range(100):
+            self.add(100.0 if n == 50 else float(n % 10), BASE + timedelta(minutes=n))
+        response = self.client.get('/measurements/analytics/', {
+            'variable': self.variable.id, 'step': '1h', 'percentiles': '50,100', 'z': 3})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['count'], 100)
+        self.assertEqual(body['max'], 100.0)
+        self.assertAlmostEqual(body['percentiles']['p100'], 100.0)
+        self.assertEqual(sum(point['count'] for point in body['resample']), 100)
+        self.assertEqual([anomaly['value'] for anomaly in body['anomalies']], [100.0])
+
+    def test_percentiles_out_of_range_are_a_400(self):
+        self.add(1.0, BASE)
+        for percentiles in ('101', '-1', 'x'):
+            response = self.client.get('/measurements/analytics/', {'variable': self.variable.id, 'percentiles': percentiles})
+            self.assertEqual(response.status_code, 400)
+
+    def test_empty_series(self):
+        response = self.client.get('/measurements/analytics/', {'variable': self.variable.id})
+        self.assertEqual(response.json(), {'count': 0})
+
+
+class ExportTests(MeasurementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add(1.5, BASE)
+        self.add(2.5, BASE + timedelta(minutes=1), place='roof')
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_csv_oldest_first(self):
+        response = self.client.get('/measurements/export/', {'variable': self.variable.id})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(self.read(response).decode())))
+        self.assertEqual(rows[0], ['id', 'variable', 'variableName', 'value', 'unit', 'place', 'dateTime'])
+        self.assertEqual([row[5] for row in rows[1:]], ['lab', 'roof'])
+
+    def test_gzipped_ndjson_with_filters(self):
+        response = self.client.get('/measurements/export/', {'format': 'ndjson', 'gzip': '1', 'place': 'roof'})
+        lines = gzip.decompress(self.read(response)).decode().splitlines()
+        self.assertEqual([json.loads(line)['value'] for line in lines], [2.5])
+
+    def test_unknown_format_is_a_400(self):
+        self.assertEqual(self.client.get('/measurements/export/', {'format': 'xml'}).status_code, 400)
+
+
+class LatestBufferTests(MeasurementTestCase):
+    def test_serves_own_writes_without_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add(1.0, BASE)
+        latest_measurements.latest(5)
+        with self.captureOnCommitCallbacks(execute=True):
+            newest = Measurement.objects.create(variable=self.variable, value=2.0, unit='C', place='lab')
+        with self.assertNumQueries(0):
+            self.assertEqual(latest_measurements.latest(1)[0].id, newest.id)
+
+    def test_update_drops_the_buffers(self):
+        measurement = self.add(1.0, BASE)
+        latest_measurements.latest(5)
+        with self.captureOnCommitCallbacks(execute=True):
+            measurement.value = 9.0
+            measurement.save()
+        self.assertEqual(latest_measurements.latest(1)[0].value, 9.0)
@@ -6,4 +6,9 @@ from . import views
 urlpatterns = [
     path('measurements/', views.measurement_list),
     path('measurementcreate/', csrf_exempt(views.measurement_create), name='measurementCreate'),
+    path('measurements/api/', views.measurement_page, name='measurementPage'),
+    path('measurements/aggregate/', views.measurement_aggregate, name='measurementAggregate'),
+    path('measurements/analytics/', views.measurement_analytics, name='measurementAnalytics'),
+    path('measurements/export/', views.measurement_export, name='measurementExport'),
+    path('measurements/ingest/', csrf_exempt(views.measurement_ingest), name='measurementIngest'),
 ]
\ No newline at end of file
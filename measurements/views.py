@@ -1,10 +1,23 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timedelta, timezone
+
 from django.shortcuts import render
 from .forms import MeasurementForm
 from django.contrib import messages
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
-from .logic.logic_measurement import create_measurement, get_measurements
+from django.views.decorators.http import require_GET, require_POST
+from monitoring.page_cache import cached_page
+from .logic.logic_measurement import (
+    create_measurement, get_measurements, get_measurements_page, ingest_measurements, iter_export_rows,
+)
+from .logic.logic_analytics import analyze_series
+from .logic.logic_rollup import aggregate
 
+@cached_page('measurements')
 def measurement_list(request):
     measurements = get_measurements()
     context = {
@@ -28,4 +41,195 @@ def measurement_create(request):
         'form': form,
     }
 
-    return render(request, 'Measurement/measurementCreate.html', context)
\ No newline at end of file
+    return render(request, 'Measurement/measurementCreate.html', context)
+
+def _json_line(line):
+    # A malformed line becomes a rejected row instead of aborting the whole stream
+    try:
+        return json.loads(line)
+    except ValueError:
+        return line
+
+def _iter_rows(request):
+    """Rows from a JSON array, NDJSON (application/x-ndjson) or CSV (text/csv with header) body."""
+    if request.content_type == 'text/csv':
+        return csv.DictReader(line.decode('utf-8') for line in request)
+    if request.content_type == 'application/x-ndjson':
+        return (_json_line(line) for line in request if line.strip())
+    rows = json.loads(request.body or b'[]')
+    if not isinstance(rows, list):
+        raise ValueError('expected a JSON array')
+    return rows
+
+@require_POST
+def measurement_ingest(request):
+    try:
+        result = ingest_measurements(_iter_rows(request))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return HttpResponseBadRequest('invalid payload: %s' % e)
+    return JsonResponse(result, status=201 if result['accepted'] else 400)
+
+
+@require_GET
+def measurement_page(request):
+    variable = request.GET.get('variable')
+    try:
+        rows, next_cursor = get_measurements_page(
+            variable=int(variable) if variable else None,
+            place=request.GET.get('place') or None,
+            cursor=request.GET.get('cursor'),
+            limit=request.GET.get('limit', 50),
+        )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    results = [
+        {
+            'id': row['id'],
+            'variable': row['variable_id'],
+            'variableName': row['variable__name'],
+            'value': row['value'],
+            'unit': row['unit'],
+            'place': row['place'],
+            'dateTime': row['dateTime'].isoformat(),
+        }
+        for row in rows
+    ]
+    return JsonResponse({'results': results, 'next': next_cursor})
+
+
+_STEP_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+AGGREGATE_MAX_INTERVALS = 10000
+
+def _parse_datetime(value):
+    date_time = datetime.fromisoformat(value)
+    return date_time if date_time.tzinfo else date_time.replace(tzinfo=timezone.utc)
+
+def _parse_step(value):
+    """'90', '5m', '1h', '1d' -> timedelta (plain numbers are seconds)."""
+    if value[-1:] in _STEP_UNITS:
+        seconds = int(value[:-1]) * _STEP_UNITS[value[-1]]
+    else:
+        seconds = int(value)
+    if seconds < 60 or seconds % 60:
+        raise ValueError('step must be a whole number of minutes')
+    return timedelta(seconds=seconds)
+
+@require_GET
+def measurement_aggregate(request):
+    try:
+        variable = int(request.GET['variable'])
+        start = _parse_datetime(request.GET['start'])
+        end = _parse_datetime(request.GET['end'])
+        step = _parse_step(request.GET.get('step', '1h'))
+        if end <= start or (end - start) / step > AGGREGATE_MAX_INTERVALS:
+            raise ValueError('end must be after start and span at most %d steps' % AGGREGATE_MAX_INTERVALS)
+    except KeyError as e:
+        return HttpResponseBadRequest('missing parameter %s' % e)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    resolution, series = aggregate(variable, start, end, step, place=request.GET.get('place') or None)
+    for interval in series:
+        interval['start'] = interval['start'].isoformat()
+    return JsonResponse({'resolution': resolution, 'series': series})
+
+
+def _optional_float(request, name):
+    value = request.GET.get(name)
+    return float(value) if value not in (None, '') else None
+
+@require_GET
+def measurement_analytics(request):
+    try:
+        variable = int(request.GET['variable'])
+        start = request.GET.get('start')
+        end = request.GET.get('end')
+        result = analyze_series(
+            variable,
+            step_seconds=_parse_step(request.GET.get('step', '1h')).total_seconds(),
+            start=_parse_datetime(start) if start else None,
+            end=_parse_datetime(end) if end else None,
+            place=request.GET.get('place') or None,
+            window=max(1, int(request.GET.get('window', 5))),
+            z_threshold=float(request.GET.get('z', 3)),
+            low=_optional_float(request, 'low'),
+            high=_optional_float(request, 'high'),
+            percentiles=[float(p) for p in request.GET.get('percentiles', '50,90,95,99').split(',')],
+        )
+    except KeyError as e:
+        return HttpResponseBadRequest('missing parameter %s' % e)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if result is None:
+        return JsonResponse({'count': 0})
+    result['percentiles'] = {('p%g' % p): value for p, value in result['percentiles'].items()}
+    return JsonResponse(result)
+
+
+EXPORT_BUFFER_BYTES = 64 * 1024
+EXPORT_HEADER = ['id', 'variable', 'variableName', 'value', 'unit', 'place', 'dateTime']
+
+def _export_lines(rows, export_format):
+    """Text pieces of the export; CSV rows are written into a buffer flushed every ~64 KB."""
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_HEADER)
+        for row in rows:
+            writer.writerow(row[:6] + (row[6].isoformat(),))
+            if buffer.tell() >= EXPORT_BUFFER_BYTES:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(EXPORT_HEADER, row[:6] + (row[6].isoformat(),)))) + '\n'
+
+def _export_stream(lines, compress):
+    """Groups lines into ~64 KB pieces (optionally gzip) so the response is not one write per row."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    pending = []
+    size = 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= EXPORT_BUFFER_BYTES:
+            data = ''.join(pending).encode('utf-8')
+            pending, size = [], 0
+            data = compressor.compress(data) if compressor else data
+            if data:
+                yield data
+    data = ''.join(pending).encode('utf-8')
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+@require_GET
+def measurement_export(request):
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return HttpResponseBadRequest('format must be csv or ndjson')
+    compress = request.GET.get('gzip') in ('1', 'true')
+    try:
+        variable = request.GET.get('variable')
+        start = request.GET.get('start')
+        end = request.GET.get('end')
+        rows = iter_export_rows(
+            variable=int(variable) if variable else None,
+            place=request.GET.get('place') or None,
+            start=_parse_datetime(start) if start else None,
+            end=_parse_datetime(end) if end else None,
+        )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = 'measurements.%s%s' % (export_format, '.gz' if compress else '')
+    response = StreamingHttpResponse(
+        _export_stream(_export_lines(rows, export_format), compress),
+        content_type='application/gzip' if compress else content_type,
+    )
+    response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+    return response
@@ -0,0 +1,197 @@
+"""
+Process-local metrics exposed at /metrics in the Prometheus text format.
+
+Hot-path writes take no lock: every thread increments its own shard (a plain
+dict reached through threading.local), and a scrape merges all shards. Shard
+registration is the only locked step and happens once per thread. Shards of
+threads that have exited (runserver starts one per connection) are folded into
+a single retired shard at the next registration or scrape, so the shard list
+stays as long as the number of live threads. Each worker process exports its
+own values; let Prometheus sum over the instances.
+
+    inc('orders_transitions_total', (('outcome', '409'),))
+    observe('orders_publish_duration_seconds', 0.004)
+    with timer('orders_update_phase_seconds', (('phase', 'update'),)):
+        ...
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+# Seconds; the +Inf bucket is implicit
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+_shards = []  # (thread, shard) of every thread that recorded something and may still be running
+_retired = ({}, {})  # counters and histograms of exited threads
+_shards_lock = threading.Lock()
+_gauges = {}
+_help = {}
+
+
+def describe(name, kind, text):
+    _help[name] = (kind, text)
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = ({}, {})  # counters, histograms
+        with _shards_lock:
+            _retire_dead()
+            _shards.append((threading.current_thread(), shard))
+    return shard
+
+
+def _add_into(target, shard):
+    counters, histograms = target
+    for key, value in shard[0].copy().items():
+        counters[key] = counters.get(key, 0.0) + value
+    for key, entry in shard[1].copy().items():
+        total = histograms.setdefault(key, [0] * len(entry[:-1]) + [0.0])
+        for i, value in enumerate(list(entry)):
+            total[i] += value
+
+
+def _retire_dead():
+    """Folds the shards of exited threads into _retired (call with _shards_lock held)."""
+    alive = []
+    for thread, shard in _shards:
+        if thread.is_alive():
+            alive.append((thread, shard))
+        else:
+            _add_into(_retired, shard)
+    _shards[:] = alive
+
+
+def inc(name, labels=(), value=1.0):
+    counters = _shard()[0]
+    key = (name, labels)
+    counters[key] = counters.get(key, 0.0) + value
+
+
+def observe(name, seconds, labels=()):
+    histograms = _shard()[1]
+    key = (name, labels)
+    entry = histograms.get(key)
+    if entry is None:
+        entry = histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+    for i, bound in enumerate(BUCKETS):
+        if seconds <= bound:
+            break
+    else:
+        i = len(BUCKETS)
+    entry[i] += 1
+    entry[-1] += seconds
+
+
+def set_gauge(name, value, labels=()):
+    _gauges[(name, labels)] = value
+
+
+@contextmanager
+def timer(name, labels=()):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, labels)
+
+
+def _merged():
+    merged = ({}, {})
+    with _shards_lock:
+        _retire_dead()
+        shards = [shard for _, shard in _shards]
+        _add_into(merged, _retired)
+    # dict.copy() is atomic under the GIL, so the owner threads can keep writing
+    for shard in shards:
+        _add_into(merged, shard)
+    return merged
+
+
+def _labels(labels, extra=()):
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return '{%s}' % ','.join(escaped)
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics of this process in the Prometheus text exposition format (0.0.4)."""
+    counters, histograms = _merged()
+    families = {}
+    for (name, labels), value in counters.items():
+        families.setdefault((name, 'counter'), []).append('%s%s %s' % (name, _labels(labels), _number(value)))
+    for (name, labels), value in list(_gauges.items()):
+        families.setdefault((name, 'gauge'), []).append('%s%s %s' % (name, _labels(labels), _number(value)))
+    for (name, labels), entry in histograms.items():
+        lines = families.setdefault((name, 'histogram'), [])
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), entry[:-1]):
+            cumulative += count
+            lines.append('%s_bucket%s %d' % (name, _labels(labels, (('le', bound),)), cumulative))
+        lines.append('%s_sum%s %s' % (name, _labels(labels), _number(entry[-1])))
+        lines.append('%s_count%s %d' % (name, _labels(labels), cumulative))
+
+    out = []
+    for (name, kind), lines in sorted(families.items()):
+        text = _help.get(name, (kind, name))[1]
+        out.append('# HELP %s %s' % (name, text))
+        out.append('# TYPE %s %s' % (name, kind))
+        out.extend(sorted(lines))
+    return '\n'.join(out) + '\n'
+
+
+describe('http_requests_total', 'counter', 'Requests by route, method and status code.')
+describe('http_request_duration_seconds', 'histogram', 'View latency by route and method.')
+describe('http_request_db_seconds', 'histogram', 'Time spent in SQL per request, by route.')
+describe('db_queries_total', 'counter', 'SQL queries executed by requests, by route.')
+
+
+class MetricsMiddleware:
+    """
+    Times every request and counts its SQL queries and SQL time through
+    connection.execute_wrapper. Routes are labelled by their URL pattern
+    (e.g. orders/<str:order_id>/status), so label cardinality stays bounded.
+    Streaming responses are timed until the view returns, not until the last chunk.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        db = [0, 0.0]
+
+        def count_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db[0] += 1
+                db[1] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else 'unmatched'
+        labels = (('route', route), ('method', request.method))
+        inc('http_requests_total', labels + (('status', response.status_code),))
+        observe('http_request_duration_seconds', elapsed, labels)
+        if db[0]:
+            inc('db_queries_total', (('route', route),), db[0])
+        observe('http_request_db_seconds', db[1], (('route', route),))
+        return response
@@ -0,0 +1,121 @@
+"""
+Rendered-page cache for the dashboard views.
+
+Every cached page belongs to a namespace with a generation counter stored in the
+Django cache. ``invalidate(namespace)`` bumps the generation, which makes every
+cached page of that namespace unreachable at once. It is called after commit by
+the post_save/post_delete receivers of the measurements and variables apps, so
+writes from any code path (views, admin, shell) invalidate; bulk_create sends no
+signals, so bulk writers call it themselves.
+
+The generation only reaches every worker when CACHES uses a shared backend
+(memcached, redis, database, file). With the default per-process LocMemCache a
+write in one worker cannot invalidate the others, so pages are then kept only
+PAGE_CACHE_LOCAL_TIMEOUT seconds, which bounds how stale they can be.
+"""
+import functools
+import os
+import threading
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse
+
+# With a shared backend: only a memory safety net, invalidation keeps pages fresh
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', '86400'))
+# With a per-process backend: the most a page can lag behind a write made in another process
+PAGE_CACHE_LOCAL_TIMEOUT = int(os.getenv('PAGE_CACHE_LOCAL_TIMEOUT', '5'))
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def _record(namespace, hit, render_seconds=0.0):
+    with _lock:
+        entry = _stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'renderSeconds': 0.0})
+        entry['hits' if hit else 'misses'] += 1
+        entry['renderSeconds'] += render_seconds
+
+
+def stats():
+    with _lock:
+        result = {}
+        for namespace, entry in _stats.items():
+            lookups = entry['hits'] + entry['misses']
+            result[namespace] = dict(
+                entry,
+                hitRate=entry['hits'] / lookups if lookups else 0.0,
+                avgRenderMs=entry['renderSeconds'] * 1000 / entry['misses'] if entry['misses'] else 0.0,
+            )
+        return result
+
+
+def _generation_key(namespace):
+    return 'pagecache:gen:%s' % namespace
+
+
+def _initial_generation():
+    # Time based, so a generation key lost to a cache eviction never reuses an old value
+    return int(time.time() * 1000)
+
+
+def generation(namespace):
+    return cache.get_or_set(_generation_key(namespace), _initial_generation, timeout=None)
+
+
+def shared_backend():
+    """True when the default cache is visible to every worker process."""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def page_timeout():
+    return PAGE_CACHE_TIMEOUT if shared_backend() else PAGE_CACHE_LOCAL_TIMEOUT
+
+
+def invalidate(*namespaces):
+    """Bumps the namespaces' generations; returns {namespace: new generation}."""
+    generations = {}
+    for namespace in namespaces:
+        try:
+            generations[namespace] = cache.incr(_generation_key(namespace))
+        except ValueError:
+            generations[namespace] = _initial_generation()
+            cache.set(_generation_key(namespace), generations[namespace], timeout=None)
+    return generations
+
+
+def invalidate_on_commit(*namespaces):
+    """invalidate() once the current transaction commits (right away outside a transaction)."""
+    transaction.on_commit(lambda: invalidate(*namespaces))
+
+
+def cached_page(namespace):
+    """Caches successful GET responses of a view per namespace generation and full path."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            key = 'pagecache:%s:%s:%s' % (namespace, generation(namespace), request.get_full_path())
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                _record(namespace, hit=True)
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Page-Cache'] = 'hit'
+                return response
+
+            started = time.perf_counter()
+            response = view(request, *args, **kwargs)
+            elapsed = time.perf_counter() - started
+            _record(namespace, hit=False, render_seconds=elapsed)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type']), page_timeout())
+            response['X-Page-Cache'] = 'miss'
+            response['X-Render-Time-Ms'] = '%.2f' % (elapsed * 1000)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,185 @@
+"""
+Opt-in per-request profiler for chasing latency spikes.
+
+Disabled by default: with PROFILE_ENABLED unset the middleware raises
+MiddlewareNotUsed, so Django drops it from the chain and it costs nothing.
+When enabled it profiles
+
+* a random PROFILE_SAMPLE_RATE fraction of requests, and
+* any request whose PROFILE_HEADER (default X-Profile) equals PROFILE_TOKEN
+  (the header is ignored while no token is configured).
+
+PROFILE_MODE=sampler (default) samples the request thread's stack every
+PROFILE_INTERVAL seconds and writes folded stacks (``a;b;c count``), the input
+of flamegraph.pl, speedscope and inferno. PROFILE_MODE=cprofile writes a
+pstats ``.prof`` (snakeviz, flameprof). Files go to PROFILE_DIR, keeping the
+newest PROFILE_KEEP. Each profiled request also logs the top functions and
+its slowest SQL to the ``monitoring.profiling`` logger, and the response
+carries the profile file name in X-Profile-File.
+
+At most one request per process is profiled at a time; others run untouched.
+"""
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', '0') == '1'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_HEADER = os.getenv('PROFILE_HEADER', 'X-Profile')
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'sampler')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.002'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/monitoring-profiles')
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '50'))
+PROFILE_TOP = int(os.getenv('PROFILE_TOP', '15'))
+
+logger = logging.getLogger(__name__)
+_busy = threading.Lock()
+
+
+class StackSampler:
+    """Counts the stacks of one thread, sampled from a helper thread every `interval` seconds."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('%s:%s' % (frame.f_globals.get('__name__', code.co_filename), code.co_name))
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def folded(self):
+        return ''.join('%s %d\n' % (stack, count) for stack, count in sorted(self.stacks.items()))
+
+    def top(self, n):
+        """(function, self samples, total samples), by self samples."""
+        own, total = {}, {}
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] = own.get(frames[-1], 0) + count
+            for frame in set(frames):
+                total[frame] = total.get(frame, 0) + count
+        ranked = sorted(own.items(), key=lambda item: -item[1])[:n]
+        return [(frame, count, total[frame]) for frame, count in ranked]
+
+
+def _prune(directory, keep):
+    files = sorted(
+        (entry for entry in os.scandir(directory) if entry.is_file()),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in files[:-keep] if keep > 0 else files:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not PROFILE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    def _wanted(self, request):
+        if PROFILE_TOKEN:
+            header = request.headers.get(PROFILE_HEADER)
+            if header and hmac.compare_digest(header, PROFILE_TOKEN):
+                return True
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    def __call__(self, request):
+        if not self._wanted(request) or not _busy.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request)
+        finally:
+            _busy.release()
+
+    def _profile(self, request):
+        queries = []
+
+        def record_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append((time.perf_counter() - start, sql))
+
+        if PROFILE_MODE == 'cprofile':
+            profiler = cProfile.Profile()
+        else:
+            profiler = StackSampler(threading.get_ident())
+        start = time.perf_counter()
+        with connection.execute_wrapper(record_query):
+            if PROFILE_MODE == 'cprofile':
+                profiler.enable()
+            else:
+                profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                if PROFILE_MODE == 'cprofile':
+                    profiler.disable()
+                else:
+                    profiler.stop()
+        elapsed = time.perf_counter() - start
+
+        name = '%s-%s-%s' % (time.strftime('%Y%m%d-%H%M%S'), request.method, uuid.uuid4().hex[:8])
+        if PROFILE_MODE == 'cprofile':
+            path = os.path.join(PROFILE_DIR, name + '.prof')
+            profiler.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            top = out.getvalue().strip()
+        else:
+            path = os.path.join(PROFILE_DIR, name + '.folded')
+            with open(path, 'w', encoding='utf-8') as fh:
+                fh.write(profiler.folded())
+            top = '\n'.join(
+                '  %5d self %5d total  %s' % (own, total, frame) for frame, own, total in profiler.top(PROFILE_TOP)
+            ) or '  (no samples: request shorter than PROFILE_INTERVAL)'
+        _prune(PROFILE_DIR, PROFILE_KEEP)
+
+        slowest = sorted(queries, key=lambda q: -q[0])[:5]
+        logger.info(
+            'profile %s %s -> %s in %.1f ms, %d queries (%.1f ms), file %s\ntop functions:\n%s\nslowest SQL:\n%s',
+            request.method, request.path, response.status_code, elapsed * 1000, len(queries),
+            sum(q[0] for q in queries) * 1000, path, top,
+            '\n'.join('  %7.2f ms  %s' % (seconds * 1000, sql[:300]) for seconds, sql in slowest) or '  (none)',
+        )
+        response['X-Profile-File'] = os.path.basename(path)
+        return response
@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'monitoring.metrics.MetricsMiddleware',
+    'monitoring.profiling.ProfilingMiddleware',  # no-op unless PROFILE_ENABLED=1
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -135,3 +137,16 @@ MEDIA_ROOT = os.path.join(PROJECT_ROOT, 'static', 'media')
 STATICFILES_DIRS = (
     os.path.join(PROJECT_ROOT, 'static'),
 )
+
+# monitoring.profiling logs its per-request summaries at INFO; orders.publisher its broker errors
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'monitoring': {'handlers': ['console'], 'level': 'INFO'},
+        'orders': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
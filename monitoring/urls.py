@@ -20,6 +20,8 @@ from . import views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.index),
+    path('pagecache/stats/', views.page_cache_stats),
+    path('metrics', views.metrics),
     path('', include('measurements.urls')),
     path('', include('variables.urls')),
     path('', include('orders.urls')),
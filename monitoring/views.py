@@ -1,4 +1,17 @@
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
 
+from . import metrics as metrics_registry, page_cache
+
+
+@page_cache.cached_page('index')
 def index(request):
-    return render(request, 'index.html')
\ No newline at end of file
+    return render(request, 'index.html')
+
+
+def page_cache_stats(request):
+    return JsonResponse(page_cache.stats())
+
+
+def metrics(request):
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
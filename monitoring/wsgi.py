@@ -14,3 +14,15 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "monitoring.settings")
 
 application = get_wsgi_application()
+
+# Warm the latest-measurements buffer before the first dashboard request. Runs here and
+# not in AppConfig.ready(), where Django discourages queries and migrate/test would run it too
+from django.db import connection, DatabaseError  # noqa: E402
+from measurements.logic.latest_buffer import latest_measurements  # noqa: E402
+
+try:
+    latest_measurements.warm()
+except DatabaseError:
+    pass  # no tables yet (first deploy); buffers load on first read
+finally:
+    connection.close()  # do not hand this connection to forked workers (gunicorn --preload)
@@ -0,0 +1,142 @@
+# orders/cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+# Entradas del LRU en proceso (0 lo desactiva)
+CACHE_SIZE = int(os.getenv("ORDERS_CACHE_SIZE", "10000"))
+# Vida máxima de una entrada del LRU local: sin backend compartido es lo máximo que un
+# proceso puede servir un estado viejo tras un cambio hecho en otro worker. Valores altos
+# son un opt-in explícito a lecturas viejas.
+CACHE_TTL = float(os.getenv("ORDERS_CACHE_TTL", "1"))
+# Vida de una entrada en el backend compartido (ahí los writers la sobrescriben tras el commit)
+CACHE_SHARED_TTL = float(os.getenv("ORDERS_CACHE_SHARED_TTL", "60"))
+# Con backend compartido: edad máxima de una entrada local antes de revalidarla contra él.
+# 0 = cada lectura consulta el backend compartido (coherente entre procesos).
+CACHE_MAX_STALENESS = float(os.getenv("ORDERS_CACHE_MAX_STALENESS", "0"))
+# Alias de settings.CACHES para el segundo nivel compartido (ej. redis); vacío = solo local
+CACHE_BACKEND = os.getenv("ORDERS_CACHE_BACKEND", "")
+
+
+class OrderCache:
+    """
+    Cache read-through de GET /orders/<id>, indexada por id y con (status, version).
+    - LRU local acotado por tamaño y TTL; opcionalmente un backend de Django compartido.
+    - update_status / create_order la sobrescriben después del commit (put); las lecturas
+      de la BD solo la llenan si no hay entrada (fill). En ningún nivel una versión más
+      vieja pisa una más nueva.
+    - Sin backend compartido, los cambios hechos por otros procesos se ven a más tardar
+      al vencer el TTL local (1 s por defecto): ese es el límite de datos viejos que se sirven.
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE, ttl=CACHE_TTL, max_staleness=CACHE_MAX_STALENESS,
+                 backend_alias=CACHE_BACKEND, shared_ttl=CACHE_SHARED_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared_ttl = shared_ttl
+        self.max_staleness = max_staleness
+        self.backend_alias = backend_alias
+        self._entries: OrderedDict[str, tuple[str, int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self.shared_hits = 0
+
+    @property
+    def _shared(self):
+        return caches[self.backend_alias] if self.backend_alias else None
+
+    @staticmethod
+    def _key(order_id: str) -> str:
+        return f"orders:order:{order_id}"
+
+    def get(self, order_id: str) -> tuple[str, int] | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(order_id)
+            if entry is not None:
+                age = now - entry[2]
+                if age > self.ttl:
+                    del self._entries[order_id]
+                    self.expirations += 1
+                elif self._shared is None or age <= self.max_staleness:
+                    self._entries.move_to_end(order_id)
+                    self.hits += 1
+                    return entry[0], entry[1]
+
+        shared = self._shared
+        if shared is not None:
+            value = shared.get(self._key(order_id))
+            if value is not None:
+                # Si el LRU local ya tiene una versión más nueva, gana la local
+                status, version = self._store(order_id, *value, now)
+                with self._lock:
+                    self.shared_hits += 1
+                return status, version
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, order_id: str, status: str, version: int) -> None:
+        """Guarda un estado recién confirmado en ambos niveles (llamar tras el commit)."""
+        self._store(order_id, status, version, time.monotonic())
+        shared = self._shared
+        if shared is not None:
+            key = self._key(order_id)
+            current = shared.get(key)
+            if current is None or current[1] <= version:
+                shared.set(key, (status, version), timeout=self.shared_ttl)
+
+    def fill(self, order_id: str, status: str, version: int) -> None:
+        """
+        Llena la cache con un estado leído de la BD. En el backend compartido usa add(), que
+        no pisa una entrada existente: un lector lento que leyó v1 no puede sobrescribir el
+        v2 que un writer guardó después del commit.
+        """
+        self._store(order_id, status, version, time.monotonic())
+        shared = self._shared
+        if shared is not None:
+            shared.add(self._key(order_id), (status, version), timeout=self.shared_ttl)
+
+    def invalidate(self, order_id: str) -> None:
+        with self._lock:
+            self._entries.pop(order_id, None)
+        shared = self._shared
+        if shared is not None:
+            shared.delete(self._key(order_id))
+
+    def _store(self, order_id: str, status: str, version: int, now: float) -> tuple[str, int]:
+        """Guarda en el LRU local salvo que ya tenga una versión más nueva; retorna la que quedó."""
+        if self.max_entries <= 0:
+            return status, version
+        with self._lock:
+            current = self._entries.get(order_id)
+            if current is not None and current[1] > version:
+                return current[0], current[1]
+            self._entries[order_id] = (status, version, now)
+            self._entries.move_to_end(order_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return status, version
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+
+# Una instancia por proceso worker
+order_cache = OrderCache()
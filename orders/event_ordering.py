@@ -0,0 +1,190 @@
+# orders/event_ordering.py
+"""
+Dedupe y reordenamiento de eventos por (order_id, version) para consumidores.
+
+El publisher reintenta y el broker redelivera, así que un consumidor puede ver
+order.status.updated duplicados o fuera de orden. EventSequencer entrega cada
+(order_id, version) una sola vez y en orden de version:
+
+- Marca de agua (high-water mark) por orden en un LRU acotado; un duplicado o un
+  evento viejo cuesta una búsqueda en un dict, no una escritura en la BD.
+- Si llega version > marca + 1, se retiene en un buffer pequeño hasta que llegue el
+  hueco o pasen `gap_window` segundos; vencido el plazo se entrega saltando el hueco.
+- Una orden sin marca conocida (nunca vista o expulsada del LRU) acepta la primera
+  version que llegue.
+- Opcional: las marcas se leen y guardan en EventWatermark (por nombre de consumidor),
+  así sobreviven reinicios y se comparten entre procesos que se turnan una partición.
+
+Transaccional por lote: accept() calcula qué entregar sin mover las marcas; commit()
+las fija (y las persiste) después de que el handler terminó bien; rollback() descarta
+lo calculado y lo retenido (el nack devuelve esos mensajes a la cola).
+"""
+import os
+import time
+from collections import OrderedDict
+
+# Órdenes cuya marca se guarda en memoria (las menos usadas se olvidan)
+ORDERING_MAX_KEYS = int(os.getenv("CONSUMER_ORDERING_MAX_KEYS", "100000"))
+# Segundos que un evento espera la version faltante antes de entregarse igual
+ORDERING_GAP_WINDOW = float(os.getenv("CONSUMER_ORDERING_GAP_WINDOW", "2"))
+# Máximo de eventos retenidos; pasado este número se liberan los más viejos
+ORDERING_MAX_HELD = int(os.getenv("CONSUMER_ORDERING_MAX_HELD", "1000"))
+
+
+class WatermarkStore:
+    """Persistencia de marcas en la tabla EventWatermark (requiere django.setup())."""
+
+    def __init__(self, consumer: str):
+        self.consumer = consumer
+
+    def load(self, order_ids) -> dict[str, int]:
+        from .models import EventWatermark
+        return dict(
+            EventWatermark.objects.filter(consumer=self.consumer, order_id__in=list(order_ids))
+            .values_list("order_id", "version")
+        )
+
+    def save(self, marks: dict[str, int]) -> None:
+        from .models import EventWatermark
+        EventWatermark.objects.bulk_create(
+            [EventWatermark(consumer=self.consumer, order_id=order_id, version=version)
+             for order_id, version in sorted(marks.items())],
+            update_conflicts=True, unique_fields=["consumer", "order_id"], update_fields=["version"],
+        )
+
+
+class EventSequencer:
+    """Filtro por lotes entre el broker y los handlers; ver docstring del módulo."""
+
+    def __init__(self, max_keys=ORDERING_MAX_KEYS, gap_window=ORDERING_GAP_WINDOW,
+                 max_held=ORDERING_MAX_HELD, store: WatermarkStore | None = None):
+        self.max_keys = max_keys
+        self.gap_window = gap_window
+        self.max_held = max_held
+        self.store = store
+        self._marks: OrderedDict[str, int] = OrderedDict()
+        # order_id -> {version: (event, tag, llegada)}
+        self._held: dict[str, dict[int, tuple[dict, object, float]]] = {}
+        self._pending: dict[str, int] = {}
+        self.duplicates = self.reordered = self.gaps_skipped = 0
+
+    # --- marcas ---
+    def _mark(self, order_id: str) -> int | None:
+        if order_id in self._pending:
+            return self._pending[order_id]
+        version = self._marks.get(order_id)
+        if version is not None:
+            self._marks.move_to_end(order_id)
+        return version
+
+    def _prefetch(self, order_ids) -> None:
+        """Con persistencia: una sola consulta por lote para las órdenes que no están en memoria."""
+        if self.store is None:
+            return
+        missing = {o for o in order_ids if o not in self._marks and o not in self._pending}
+        if missing:
+            for order_id, version in self.store.load(missing).items():
+                self._remember(order_id, version)
+
+    def _remember(self, order_id: str, version: int) -> None:
+        self._marks[order_id] = version
+        self._marks.move_to_end(order_id)
+        while len(self._marks) > self.max_keys:
+            self._marks.popitem(last=False)
+
+    # --- lote ---
+    def accept(self, events, now: float | None = None) -> list:
+        """
+        events: lista de (payload, tag). Retorna los (payload, tag) a entregar, en orden de
+        version por orden, incluyendo retenidos que se destraban o cuyo plazo venció.
+        Los payloads sin order_id/version pasan tal cual.
+        """
+        now = time.monotonic() if now is None else now
+        self._prefetch({e["order_id"] for e, _ in events if "order_id" in e and "version" in e})
+        ready = []
+        for event, tag in events:
+            order_id, version = event.get("order_id"), event.get("version")
+            if order_id is None or version is None:
+                ready.append((event, tag))
+                continue
+            version = int(version)
+            mark = self._mark(order_id)
+            held = self._held.get(order_id)
+            if (mark is not None and version <= mark) or (held and version in held):
+                self.duplicates += 1
+                continue
+            if mark is None or version == mark + 1:
+                self._pending[order_id] = version
+                ready.append((event, tag))
+                self._drain(order_id, ready)
+            else:
+                self._held.setdefault(order_id, {})[version] = (event, tag, now)
+                self.reordered += 1
+        self._expire(now, ready)
+        return ready
+
+    def _drain(self, order_id: str, ready: list) -> None:
+        held = self._held.get(order_id)
+        while held:
+            version = self._pending[order_id] + 1
+            if version not in held:
+                break
+            event, tag, _ = held.pop(version)
+            self._pending[order_id] = version
+            ready.append((event, tag))
+        if not held:
+            self._held.pop(order_id, None)
+
+    def _expire(self, now: float, ready: list) -> None:
+        """Entrega lo que esperó más de gap_window (o excede max_held), saltando los huecos."""
+        overflow = self.held_count() - self.max_held
+        for order_id in list(self._held):
+            held = self._held[order_id]
+            oldest = min(arrived for _, _, arrived in held.values())
+            if now - oldest < self.gap_window and overflow <= 0:
+                continue
+            overflow -= len(held)
+            while order_id in self._held:
+                self.gaps_skipped += 1
+                self._pending[order_id] = min(self._held[order_id]) - 1
+                self._drain(order_id, ready)
+
+    def commit(self) -> None:
+        """Fija las marcas del lote entregado (llamar cuando el handler terminó bien)."""
+        if not self._pending:
+            return
+        if self.store is not None:
+            self.store.save(self._pending)
+        for order_id, version in self._pending.items():
+            self._remember(order_id, version)
+        self._pending = {}
+
+    def reject(self, order_id: str, version: int) -> None:
+        """
+        El handler falló con (order_id, version): la marca del lote vuelve a la version
+        anterior, así el evento devuelto a la cola no se descarta como duplicado.
+        """
+        previous = self._marks.get(order_id)
+        if previous is not None and version - 1 <= previous:
+            self._pending.pop(order_id, None)
+        else:
+            self._pending[order_id] = version - 1
+
+    def rollback(self) -> None:
+        """Descarta el lote y lo retenido; el broker los vuelve a entregar tras el nack."""
+        self._pending = {}
+        self._held.clear()
+
+    # --- estado ---
+    def held_count(self) -> int:
+        return sum(len(held) for held in self._held.values())
+
+    def min_held_tag(self):
+        tags = [tag for held in self._held.values() for _, tag, _ in held.values()]
+        return min(tags) if tags else None
+
+    def stats(self) -> dict:
+        return {
+            "orders": len(self._marks), "held": self.held_count(), "duplicates": self.duplicates,
+            "reordered": self.reordered, "gaps_skipped": self.gaps_skipped,
+        }
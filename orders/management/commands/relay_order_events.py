@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from orders.models import OrderEvent
+from orders.publisher import PARTITIONS, RABBIT_HOST, publish_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Drena el outbox OrderEvent hacia RabbitMQ (entrega at-least-once). Correr UN relay "
+        "por partición: dos relays sobre los mismos eventos pueden publicar los de una orden "
+        "fuera de orden. Sin RABBIT_PARTITIONS, un solo relay; con particiones, uno por "
+        "--partition N (o uno solo sin --partition para todas)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--poll-interval", type=float, default=0.5,
+                            help="segundos de espera cuando el outbox está vacío")
+        parser.add_argument("--max-backoff", type=float, default=30.0,
+                            help="espera máxima entre reintentos si el broker falla")
+        parser.add_argument("--once", action="store_true",
+                            help="drena lo pendiente y termina")
+        parser.add_argument("--partition", type=int, default=None,
+                            help="solo los eventos de la partición N (sufijo .pNN); requiere RABBIT_PARTITIONS")
+
+    def handle(self, *args, batch_size, poll_interval, max_backoff, once, partition, **options):
+        if not RABBIT_HOST:
+            self.stderr.write("RABBIT_HOST no definido; no hay a dónde publicar")
+            return
+        if partition is not None and not 0 <= partition < PARTITIONS:
+            raise CommandError(f"--partition debe estar entre 0 y {PARTITIONS - 1} (RABBIT_PARTITIONS={PARTITIONS})")
+
+        backoff = poll_interval
+        relayed = 0
+        try:
+            while True:
+                try:
+                    sent = self.relay_batch(batch_size, partition)
+                except Exception as e:
+                    # La transacción hizo rollback: los eventos siguen en el outbox
+                    if once:
+                        raise CommandError(f"Error publicando lote: {e!r}")
+                    self.stderr.write(f"[relay] Error publicando lote: {e!r}; reintento en {backoff:.1f}s")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, max_backoff)
+                    continue
+
+                backoff = poll_interval
+                relayed += sent
+                if sent:
+                    self.stdout.write(f"[relay] {sent} eventos publicados ({relayed} en total)")
+                if sent < batch_size:
+                    if once:
+                        break
+                    time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            self.stdout.write("\nCerrando…")
+
+    def relay_batch(self, batch_size: int, partition: int | None = None) -> int:
+        """
+        Toma un lote en orden de id con SELECT ... FOR UPDATE, lo publica con una sola
+        confirmación y borra las filas en la misma transacción. Si el publish falla no
+        se borra nada. SKIP LOCKED solo evita que un relay de más se quede bloqueado: no
+        ordena entre relays, por eso cada partición debe tener un único relay.
+        """
+        queryset = OrderEvent.objects.select_for_update(skip_locked=True)
+        if partition is not None:
+            queryset = queryset.filter(routing_key__endswith=f".p{partition:02d}")
+        with transaction.atomic():
+            events = list(
+                queryset.order_by("id")
+                .values_list("id", "routing_key", "payload")[:batch_size]
+            )
+            if not events:
+                return 0
+            publish_batch([(routing_key, payload) for _, routing_key, payload in events])
+            OrderEvent.objects.filter(id__in=[event_id for event_id, _, _ in events]).delete()
+        return len(events)
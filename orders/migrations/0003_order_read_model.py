@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusCount',
+            fields=[
+                ('status', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderStatusView',
+            fields=[
+                ('order_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('status', models.CharField(max_length=32)),
+                ('version', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
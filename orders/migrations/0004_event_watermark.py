@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_read_model'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consumer', models.CharField(max_length=64)),
+                ('order_id', models.CharField(max_length=64)),
+                ('version', models.IntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('consumer', 'order_id'), name='event_watermark_consumer_order_uniq')],
+            },
+        ),
+    ]
@@ -8,3 +8,54 @@ class Order(models.Model):
 
     def __str__(self):
         return f"{self.id}:{self.status}:{self.version}"
+
+
+class OrderEvent(models.Model):
+    """
+    Outbox de eventos: se escribe en la misma transacción que el cambio de la
+    orden y el comando relay_order_events lo drena hacia RabbitMQ.
+    """
+    routing_key = models.CharField(max_length=64)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.id}:{self.routing_key}"
+
+
+class OrderStatusView(models.Model):
+    """
+    Read model del estado de cada orden, proyectado desde los eventos por
+    orders.projection. Los reportes lo consultan en vez de la tabla Order caliente.
+    """
+    order_id = models.CharField(primary_key=True, max_length=64)
+    status = models.CharField(max_length=32)
+    version = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.order_id}:{self.status}:{self.version}"
+
+
+class OrderStatusCount(models.Model):
+    """Cantidad de órdenes por estado, mantenida por la misma proyección."""
+    status = models.CharField(primary_key=True, max_length=32)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.status}:{self.count}"
+
+
+class EventWatermark(models.Model):
+    """Última version de cada orden ya procesada por un consumidor (orders.event_ordering)."""
+    consumer = models.CharField(max_length=64)
+    order_id = models.CharField(max_length=64)
+    version = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["consumer", "order_id"], name="event_watermark_consumer_order_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.consumer}:{self.order_id}:{self.version}"
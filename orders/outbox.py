@@ -0,0 +1,22 @@
+# orders/outbox.py
+from .models import OrderEvent
+from .publisher import order_created_message, order_status_updated_message
+
+
+def enqueue_order_created(order_id: str, status: str) -> OrderEvent:
+    """Deja el evento order.created en el outbox (llamar dentro de transaction.atomic)."""
+    routing_key, payload = order_created_message(order_id, status)
+    return OrderEvent.objects.create(routing_key=routing_key, payload=payload)
+
+
+def enqueue_order_status_updated(order_id: str, status: str, version: int, meta: dict | None = None) -> OrderEvent:
+    """Deja el evento order.status.updated en el outbox (llamar dentro de transaction.atomic)."""
+    routing_key, payload = order_status_updated_message(order_id, status, version, meta)
+    return OrderEvent.objects.create(routing_key=routing_key, payload=payload)
+
+
+def enqueue_many(messages) -> list[OrderEvent]:
+    """Inserta un lote de (routing_key, payload) en el outbox con un solo INSERT."""
+    return OrderEvent.objects.bulk_create(
+        [OrderEvent(routing_key=routing_key, payload=payload) for routing_key, payload in messages]
+    )
@@ -0,0 +1,72 @@
+# orders/projection.py
+"""
+Proyección de eventos de órdenes a un read model (OrderStatusView + OrderStatusCount).
+
+Se usa como handler por lotes de scripts/consumer.py:
+    CONSUMER_HANDLERS="order.created=orders.projection:apply_events,order.status.updated=orders.projection:apply_events"
+    DJANGO_SETTINGS_MODULE=monitoring.settings
+"""
+from django.db import transaction, models
+from django.utils import timezone
+
+from .models import OrderStatusView, OrderStatusCount
+
+
+def _fold(events) -> dict[str, tuple[str, int]]:
+    """Deja solo el evento de mayor version por orden (order.created cuenta como version 0)."""
+    latest: dict[str, tuple[str, int]] = {}
+    for event in events:
+        order_id = event["order_id"]
+        status = event.get("new_status") or event["status"]
+        version = int(event.get("version", 0))
+        if order_id not in latest or latest[order_id][1] < version:
+            latest[order_id] = (status, version)
+    return latest
+
+
+def apply_events(events, routing_key=None) -> None:
+    """
+    Aplica un lote de eventos en una transacción: un SELECT ... FOR UPDATE de las filas
+    afectadas, un bulk_create de las nuevas, un bulk_update de las que avanzan de version
+    y un UPDATE por estado cuyo conteo cambia. Los eventos con version <= a la proyectada
+    (duplicados o atrasados) se ignoran.
+    """
+    latest = _fold(events)
+    if not latest:
+        return
+
+    with transaction.atomic():
+        current = {
+            row.order_id: row
+            for row in OrderStatusView.objects.select_for_update().filter(order_id__in=list(latest)).order_by("order_id")
+        }
+        now = timezone.now()
+        to_create, to_update = [], []
+        deltas: dict[str, int] = {}
+        for order_id, (status, version) in latest.items():
+            row = current.get(order_id)
+            if row is None:
+                to_create.append(OrderStatusView(order_id=order_id, status=status, version=version))
+                deltas[status] = deltas.get(status, 0) + 1
+                continue
+            if row.version >= version:
+                continue
+            if row.status != status:
+                deltas[row.status] = deltas.get(row.status, 0) - 1
+                deltas[status] = deltas.get(status, 0) + 1
+            row.status, row.version, row.updated_at = status, version, now
+            to_update.append(row)
+
+        OrderStatusView.objects.bulk_create(to_create)
+        OrderStatusView.objects.bulk_update(to_update, ["status", "version", "updated_at"])
+
+        deltas = {status: delta for status, delta in deltas.items() if delta}
+        if deltas:
+            OrderStatusCount.objects.bulk_create(
+                [OrderStatusCount(status=status) for status in deltas], ignore_conflicts=True)
+            for status, delta in sorted(deltas.items()):
+                OrderStatusCount.objects.filter(status=status).update(count=models.F("count") + delta)
+
+
+def status_counts() -> dict[str, int]:
+    return dict(OrderStatusCount.objects.order_by("status").values_list("status", "count"))
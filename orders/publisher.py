@@ -1,8 +1,20 @@
 # orders/publisher.py
+import atexit
 import os
 import json
+import logging
+import re
+import threading
+import time
+import zlib
+from collections import deque
+
 import pika
 
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
 # Se leen SIEMPRE desde variables de entorno (nada hardcodeado)
 RABBIT_HOST   = os.getenv("RABBIT_HOST")                # ej: 52.87.186.136
 RABBIT_PORT   = int(os.getenv("RABBIT_PORT", "5672"))
@@ -10,6 +22,33 @@ RABBIT_VHOST  = os.getenv("RABBIT_VHOST", "/")
 RABBIT_USER   = os.getenv("RABBIT_USER", "monitoring_user")
 RABBIT_PASS   = os.getenv("RABBIT_PASS", "isis2503")
 EXCHANGE      = os.getenv("RABBIT_EXCHANGE", "order_events")
+# Confirmación del broker: "tx" (cada lote cierra con un tx_commit), "confirm" (publisher
+# confirms; BlockingConnection espera el ack de cada mensaje, así que no aprovecha los lotes)
+# o "0" (sin confirmación). "1" equivale a "tx". Ver scripts/bench_publisher.py.
+PUBLISH_CONFIRM = os.getenv("RABBIT_CONFIRM", "tx")
+if PUBLISH_CONFIRM == "1":
+    PUBLISH_CONFIRM = "tx"
+# Particiones por hash de order_id: la routing key lleva el sufijo .pNN (0 = sin sufijo,
+# por defecto). Todos los eventos de una orden caen en la misma partición y conservan su
+# orden. Activarlo cambia las routing keys: los bindings "order.status.updated" exactos
+# dejan de recibir; usar "order.status.updated.#" o las colas .pNN de scripts/consumer.py
+# (con el mismo CONSUMER_PARTITIONS). Cambiar este número reasigna órdenes: con colas vacías.
+PARTITIONS    = int(os.getenv("RABBIT_PARTITIONS", "0"))
+# publish_order_*: "1" = encolar y publicar desde un hilo de fondo (no bloquea al llamador)
+PUBLISH_ASYNC   = os.getenv("RABBIT_ASYNC", "1") == "1"
+ASYNC_QUEUE_SIZE = int(os.getenv("RABBIT_ASYNC_QUEUE_SIZE", "10000"))
+ASYNC_BATCH     = int(os.getenv("RABBIT_ASYNC_BATCH", "200"))
+# Espera máxima para juntar un lote antes de publicarlo
+ASYNC_LINGER    = float(os.getenv("RABBIT_ASYNC_LINGER", "0.02"))
+# Cola llena: "spill" (al outbox OrderEvent, lo publica relay_order_events),
+# "block" (espera hasta RABBIT_BLOCK_DEADLINE y si sigue llena descarta) o "drop_oldest"
+OVERFLOW_POLICY = os.getenv("RABBIT_OVERFLOW", "spill")
+# Cada cuánto el hilo de fondo revisa si el outbox ya drenó las particiones desbordadas
+SPILL_CHECK_INTERVAL = float(os.getenv("RABBIT_SPILL_CHECK_INTERVAL", "1"))
+BLOCK_DEADLINE  = float(os.getenv("RABBIT_BLOCK_DEADLINE", "0.05"))
+# Circuit breaker: tras N fallos seguidos no se intenta conectar durante COOLDOWN segundos
+BREAKER_THRESHOLD = int(os.getenv("RABBIT_BREAKER_THRESHOLD", "3"))
+BREAKER_COOLDOWN  = float(os.getenv("RABBIT_BREAKER_COOLDOWN", "10"))
 
 def _connection_parameters() -> pika.ConnectionParameters:
     """Devuelve parámetros con timeouts y reintentos cortos.
@@ -26,41 +65,478 @@ def _connection_parameters() -> pika.ConnectionParameters:
         retry_delay=2.0,
     )
 
+def _background_connection_parameters() -> pika.ConnectionParameters:
+    """Para el hilo de AsyncPublisher: un solo intento y timeouts de pocos segundos, así
+    un broker caído no retiene el lote en vuelo (ni demora el desborde) por decenas de segundos."""
+    return pika.ConnectionParameters(
+        host=RABBIT_HOST,
+        port=RABBIT_PORT,
+        virtual_host=RABBIT_VHOST,
+        credentials=pika.PlainCredentials(RABBIT_USER, RABBIT_PASS),
+        heartbeat=30,
+        blocked_connection_timeout=2,
+        socket_timeout=2,
+        stack_timeout=3,
+        connection_attempts=1,
+    )
+
+def _close_thread_connection() -> None:
+    """Cierra la conexión a la BD del hilo de fondo: no se deja abierta entre desbordes."""
+    from django.db import connection
+    connection.close()
+
+def _properties() -> pika.BasicProperties:
+    return pika.BasicProperties(
+        content_type="application/json",
+        delivery_mode=2,  # persistente si la cola es durable
+        timestamp=int(time.time()),  # los consumidores lo usan para medir lag
+    )
+
+
+class Publisher:
+    """
+    Publicador de larga vida: una conexión + canal por hilo (BlockingConnection
+    no es thread-safe), abiertos de forma perezosa y reutilizados entre eventos.
+    - El exchange se declara una sola vez por conexión.
+    - Si la conexión se cae, se descarta y se reabre en el siguiente publish.
+    - confirm="tx" (por defecto): publish_batch envía N mensajes y los confirma con un
+      único tx_commit, un round trip por lote. confirm="confirm": publisher confirms;
+      BlockingChannel.basic_publish vuelve cuando el broker confirmó ese mensaje, un round
+      trip por mensaje aunque vayan en lote. scripts/bench_publisher.py compara ambos.
+    """
+
+    def __init__(self, parameters_factory=_connection_parameters, confirm=PUBLISH_CONFIRM):
+        if confirm not in ("confirm", "tx", "0"):
+            raise ValueError(f"modo de confirmación desconocido: {confirm}")
+        self._parameters_factory = parameters_factory
+        self.confirm = confirm
+        self._local = threading.local()
+
+    def _channel(self):
+        ch = getattr(self._local, "channel", None)
+        if ch is not None and ch.is_open:
+            return ch
+        self.close()
+        conn = pika.BlockingConnection(self._parameters_factory())
+        ch = conn.channel()
+        ch.exchange_declare(exchange=EXCHANGE, exchange_type="topic", durable=True)
+        if self.confirm == "confirm":
+            ch.confirm_delivery()
+        elif self.confirm == "tx":
+            ch.tx_select()
+        self._local.connection = conn
+        self._local.channel = ch
+        return ch
+
+    def publish_batch(self, messages) -> None:
+        """
+        Publica una lista de (routing_key, payload). Lanza la excepción de pika
+        si el broker falla, para que el llamador decida (reintento, outbox, etc.).
+        Reintenta una vez con conexión nueva si la actual estaba muerta.
+        """
+        messages = list(messages)
+        if not messages:
+            return
+        start = time.perf_counter()
+        for attempt in (1, 2):
+            try:
+                ch = self._channel()
+                properties = _properties()
+                for routing_key, payload in messages:
+                    ch.basic_publish(
+                        exchange=EXCHANGE,
+                        routing_key=routing_key,
+                        body=json.dumps(payload).encode("utf-8"),
+                        properties=properties,
+                    )
+                if self.confirm == "tx":
+                    ch.tx_commit()
+                metrics.observe("orders_publish_duration_seconds", time.perf_counter() - start)
+                metrics.inc("orders_published_messages_total", value=len(messages))
+                return
+            except (pika.exceptions.AMQPConnectionError, pika.exceptions.AMQPChannelError) as e:
+                self.close()
+                metrics.inc("orders_publish_errors_total", (("error", type(e).__name__),))
+                if attempt == 2:
+                    raise
+
+    def close(self) -> None:
+        """Cierra la conexión del hilo actual (si hay una)."""
+        conn = getattr(self._local, "connection", None)
+        self._local.connection = None
+        self._local.channel = None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+metrics.describe("orders_publish_duration_seconds", "histogram", "Duración de publish_batch (publish + confirmación).")
+metrics.describe("orders_published_messages_total", "counter", "Mensajes confirmados por el broker.")
+metrics.describe("orders_publish_errors_total", "counter", "Errores de AMQP al publicar (incluye el que se reintenta).")
+metrics.describe("orders_publish_skipped_total", "counter", "Eventos omitidos por no haber RABBIT_HOST.")
+metrics.describe("orders_publish_dropped_total", "counter", "Eventos perdidos por _publish tras agotar el reintento.")
+
+# Un publicador por proceso worker; cada hilo obtiene su propio canal
+_publisher = Publisher()
+# El del hilo de AsyncPublisher, con conexión de timeouts cortos
+_background_publisher = Publisher(_background_connection_parameters)
+
+
+def publish_batch(messages) -> None:
+    """Publica un lote de (routing_key, payload); lanza si el broker falla."""
+    _publisher.publish_batch(messages)
+
+
 def _publish(routing_key: str, payload: dict) -> None:
     """Publica sin reventar la request si el broker falla."""
     if not RABBIT_HOST:
         # No hay host configurado → no publicamos, pero tampoco rompemos
-        print("[publisher] RABBIT_HOST no definido; evento omitido")
+        logger.warning("RABBIT_HOST no definido; evento %s omitido", routing_key)
+        metrics.inc("orders_publish_skipped_total")
         return
     try:
-        params = _connection_parameters()
-        conn = pika.BlockingConnection(params)
-        ch = conn.channel()
-        ch.exchange_declare(exchange=EXCHANGE, exchange_type="topic", durable=True)
-        ch.basic_publish(
-            exchange=EXCHANGE,
-            routing_key=routing_key,
-            body=json.dumps(payload).encode("utf-8"),
-            properties=pika.BasicProperties(
-                content_type="application/json",
-                delivery_mode=2,  # persistente si la cola es durable
-            ),
-        )
-    except Exception as e:
+        _publisher.publish_batch([(routing_key, payload)])
+    except Exception:
         # Loguea y sigue; evita que el endpoint de Django se bloquee/falle
-        print(f"[publisher] Error publicando {routing_key}: {e}")
-    finally:
+        logger.exception("Error publicando %s", routing_key)
+        metrics.inc("orders_publish_dropped_total")
+
+class CircuitBreaker:
+    """
+    closed -> open tras `threshold` fallos seguidos; open -> half-open pasado `cooldown`,
+    donde se deja pasar un intento: si funciona se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def remaining(self) -> float:
+        return 0.0 if self.opened_at is None else max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+_LANE = re.compile(r"\.(p\d+)$")
+
+
+def _lane(routing_key: str) -> str:
+    """Partición de un mensaje (sufijo .pNN de la routing key); "" si no está particionada."""
+    match = _LANE.search(routing_key)
+    return match.group(1) if match else ""
+
+
+def _spill_to_outbox(messages) -> int:
+    """
+    Desborde: deja los mensajes en el outbox en su propia transacción (relay_order_events
+    los publica después) y retorna el id más alto escrito.
+    """
+    from django.db import transaction
+    from .models import OrderEvent
+    from .outbox import enqueue_many
+    with transaction.atomic():
+        events = enqueue_many(messages)
+        if events[-1].id is not None:
+            return max(event.id for event in events)
+        # Backend sin RETURNING en bulk_create: el id más alto visible cubre los nuestros
+        return OrderEvent.objects.order_by("-id").values_list("id", flat=True).first()
+
+
+def _outbox_pending(event_ids) -> set[int]:
+    """Cuáles de estos ids siguen en el outbox (búsqueda por PK, sin recorrer la tabla)."""
+    from .models import OrderEvent
+    return set(OrderEvent.objects.filter(id__in=list(event_ids)).values_list("id", flat=True))
+
+
+class AsyncPublisher:
+    """
+    Cola acotada en memoria + hilo de fondo que publica por lotes con `publisher`.
+    - submit() nunca toca el broker ni la BD: encola y vuelve. Con la cola llena
+      aplica la política de desborde (spill / block / drop_oldest).
+    - El hilo junta hasta `batch` mensajes (esperando a lo sumo `linger`) y los publica
+      con una sola llamada a publish_batch (conexión con timeouts cortos, ver
+      _background_connection_parameters). Si falla, el lote vuelve al frente de la cola
+      (se conserva el orden) y el circuit breaker cuenta el fallo; abierto, no se intenta
+      conectar hasta el cooldown.
+    - "spill": submit sigue encolando pasado maxsize (hasta 2 * maxsize; más allá se
+      descarta y se cuenta) y el hilo, apenas termina lo que esté haciendo, pasa toda la
+      cola al outbox, de la más vieja a la más nueva, en su propia transacción (nunca en
+      la del llamador). Las particiones desbordadas quedan "pegadas" al outbox: sus
+      mensajes siguientes también van ahí, en orden, hasta que el relay publica el último
+      desbordado (se recuerda su id y se busca por PK cada spill_check_interval). Así un
+      evento nunca sale antes que uno anterior de la misma orden que espera en el outbox.
+    - El hilo se crea de forma perezosa y por PID (sirve con gunicorn --preload).
+    - Lo que quede en memoria al morir el proceso se pierde salvo lo desbordado al
+      outbox; para eventos que no se pueden perder está el outbox transaccional.
+    """
+
+    def __init__(self, publisher=None, maxsize=ASYNC_QUEUE_SIZE, batch=ASYNC_BATCH, linger=ASYNC_LINGER,
+                 overflow=OVERFLOW_POLICY, block_deadline=BLOCK_DEADLINE, breaker=None, spill=_spill_to_outbox,
+                 outbox_pending=_outbox_pending, spill_check_interval=SPILL_CHECK_INTERVAL):
+        if overflow not in ("spill", "block", "drop_oldest"):
+            raise ValueError(f"política de desborde desconocida: {overflow}")
+        self.publisher = publisher
+        self.maxsize = maxsize
+        self.batch = batch
+        self.linger = linger
+        self.overflow = overflow
+        self.block_deadline = block_deadline
+        self.breaker = breaker or CircuitBreaker()
+        self.spill = spill
+        self.outbox_pending = outbox_pending
+        self.spill_check_interval = spill_check_interval
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._sticky: dict[str, int] = {}  # partición -> id del último evento desbordado al outbox
+        self._checked_at = 0.0
+        self._pid = None
+        self.published = self.dropped = self.spilled = self.failures = 0
+
+    # --- productor ---
+    def submit(self, routing_key: str, payload: dict) -> bool:
+        """Encola un mensaje; False si la política de desborde lo descartó."""
+        self._ensure_thread()
+        with self._cond:
+            if self.overflow == "spill":
+                # El hilo de fondo desborda al outbox; pasado el doble ya no se acumula más
+                if len(self._queue) >= 2 * self.maxsize:
+                    return self._drop(1, "spill")
+            elif len(self._queue) >= self.maxsize:
+                if self.overflow == "block":
+                    deadline = time.monotonic() + self.block_deadline
+                    while len(self._queue) >= self.maxsize and time.monotonic() < deadline:
+                        self._cond.wait(deadline - time.monotonic())
+                    if len(self._queue) >= self.maxsize:
+                        return self._drop(1, "block")
+                else:
+                    self._queue.popleft()
+                    self._drop(1, "drop_oldest")
+            self._queue.append((routing_key, payload))
+            self._cond.notify_all()
+            depth = len(self._queue)
+        metrics.set_gauge("orders_publish_queue_depth", depth)
+        return True
+
+    def _drop(self, count: int, policy: str) -> bool:
+        self.dropped += count
+        metrics.inc("orders_publish_overflow_total", (("policy", policy), ("action", "dropped")), count)
+        return False
+
+    # --- hilo de fondo ---
+    def _ensure_thread(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            # Proceso nuevo (o hijo de un fork): el hilo del padre no existe aquí
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="orders-publisher", daemon=True).start()
+
+    def _overflowing(self) -> bool:
+        return self.overflow == "spill" and len(self._queue) >= self.maxsize
+
+    def _take(self) -> tuple[list, bool]:
+        """
+        (mensajes, desbordar): toda la cola si hay que desbordarla, si no hasta `batch`
+        mensajes. ([], False) si pasa spill_check_interval sin nada que hacer.
+        """
+        with self._cond:
+            idle_until = time.monotonic() + self.spill_check_interval
+            while True:
+                if self._overflowing():
+                    taken = list(self._queue)
+                    self._queue.clear()
+                    self._inflight = len(taken)
+                    self._cond.notify_all()
+                    return taken, True
+                wait = idle_until - time.monotonic()
+                if self._queue:
+                    if self.breaker.allow():
+                        break
+                    wait = min(wait, self.breaker.remaining())
+                if wait <= 0:
+                    return [], False
+                self._cond.wait(wait)
+            deadline = time.monotonic() + self.linger
+            while len(self._queue) < self.batch and time.monotonic() < deadline and not self._overflowing():
+                self._cond.wait(deadline - time.monotonic())
+            if self._overflowing():
+                return self._take()
+            batch = [self._queue.popleft() for _ in range(min(self.batch, len(self._queue)))]
+            self._inflight = len(batch)
+            self._cond.notify_all()  # hay espacio para los que esperan con "block"
+            return batch, False
+
+    def _requeue(self, batch) -> None:
+        """Devuelve mensajes al frente de la cola, en su orden."""
+        with self._cond:
+            self._queue.extendleft(reversed(batch))
+            self._inflight = 0
+            self._cond.notify_all()
+
+    def _settle(self, published: int = 0, spilled: int = 0) -> None:
+        with self._cond:
+            self.published += published
+            self.spilled += spilled
+            self._inflight = 0
+            self._cond.notify_all()
+
+    def _spill(self, messages) -> bool:
+        """Escribe en el outbox (transacción propia) y pega al outbox las particiones escritas."""
         try:
-            conn.close()  # type: ignore[name-defined]
+            last_id = self.spill(messages)
         except Exception:
-            pass
+            logger.exception("No se pudo desbordar %d eventos al outbox; se reintenta", len(messages))
+            self._requeue(messages)
+            return False
+        finally:
+            _close_thread_connection()
+        with self._cond:
+            for lane in {_lane(routing_key) for routing_key, _ in messages}:
+                self._sticky[lane] = last_id
+        metrics.inc("orders_publish_overflow_total", (("policy", "spill"), ("action", "spilled")), len(messages))
+        metrics.set_gauge("orders_publish_spill_partitions", len(self._sticky))
+        return True
 
-def publish_order_created(order_id: str, status: str) -> None:
-    _publish("order.created", {"order_id": order_id, "status": status})
+    def _release_drained(self) -> None:
+        """Despega las particiones cuyo último evento desbordado ya no está en el outbox."""
+        if not self._sticky or time.monotonic() - self._checked_at < self.spill_check_interval:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            pending = self.outbox_pending(set(self._sticky.values()))
+        except Exception:
+            logger.exception("No se pudo revisar el outbox")
+            return
+        finally:
+            _close_thread_connection()
+        with self._cond:
+            self._sticky = {lane: last for lane, last in self._sticky.items() if last in pending}
+        metrics.set_gauge("orders_publish_spill_partitions", len(self._sticky))
 
-def publish_order_status_updated(order_id: str, status: str, version: int, meta: dict | None = None):
+    def _run(self) -> None:
+        publisher = self.publisher or _background_publisher
+        while True:
+            self._release_drained()
+            messages, overflow = self._take()
+            if not messages:
+                continue
+            if overflow:
+                if self._spill(messages):
+                    self._settle(spilled=len(messages))
+                else:
+                    time.sleep(self.spill_check_interval)
+                continue
+            # Las particiones pegadas siguen yendo al outbox hasta que el relay las drene
+            sticky = [m for m in messages if _lane(m[0]) in self._sticky]
+            batch = [m for m in messages if _lane(m[0]) not in self._sticky]
+            if sticky and not self._spill(sticky):
+                self._requeue(messages)
+                time.sleep(self.spill_check_interval)
+                continue
+            try:
+                if batch:
+                    publisher.publish_batch(batch)
+            except Exception as e:
+                self.breaker.record_failure()
+                self.failures += 1
+                logger.warning("Error publicando %d eventos (%r); circuito %s", len(batch), e, self.breaker.state)
+                with self._cond:
+                    self.spilled += len(sticky)
+                self._requeue(batch)
+            else:
+                if batch:
+                    self.breaker.record_success()
+                self._settle(published=len(batch), spilled=len(sticky))
+            metrics.set_gauge("orders_publish_queue_depth", len(self._queue))
+            metrics.set_gauge("orders_publish_breaker_open", 0 if self.breaker.state == "closed" else 1)
+
+    # --- control ---
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera a que la cola quede vacía (True) o a que pase `timeout` (False)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "depth": len(self._queue), "published": self.published, "dropped": self.dropped,
+                "spilled": self.spilled, "failures": self.failures, "breaker": self.breaker.state,
+                "overflow": self.overflow, "spill_partitions": sorted(self._sticky),
+            }
+
+
+metrics.describe("orders_publish_queue_depth", "gauge", "Mensajes en la cola del publicador asíncrono.")
+metrics.describe("orders_publish_overflow_total", "counter", "Mensajes desbordados de la cola (descartados o al outbox).")
+metrics.describe("orders_publish_breaker_open", "gauge", "1 si el circuit breaker del publicador no está cerrado.")
+metrics.describe("orders_publish_spill_partitions", "gauge", "Particiones que se desbordan al outbox hasta que el relay las drene.")
+
+async_publisher = AsyncPublisher()
+# Al salir se intenta vaciar la cola un momento (el hilo es daemon)
+atexit.register(lambda: async_publisher.flush(timeout=2.0) if async_publisher._pid == os.getpid() else None)
+
+
+def _submit(routing_key: str, payload: dict) -> None:
+    if not PUBLISH_ASYNC:
+        _publish(routing_key, payload)
+        return
+    if not RABBIT_HOST:
+        logger.warning("RABBIT_HOST no definido; evento %s omitido", routing_key)
+        metrics.inc("orders_publish_skipped_total")
+        return
+    async_publisher.submit(routing_key, payload)
+
+def partition_of(order_id: str, partitions: int = PARTITIONS) -> int:
+    """Partición estable de una orden (crc32, igual en todos los procesos y máquinas)."""
+    return zlib.crc32(order_id.encode("utf-8")) % partitions
+
+def partitioned_key(routing_key: str, order_id: str, partitions: int = PARTITIONS) -> str:
+    """order.status.updated -> order.status.updated.p07 (sin cambios si partitions es 0)."""
+    if partitions <= 0:
+        return routing_key
+    return f"{routing_key}.p{partition_of(order_id, partitions):02d}"
+
+def order_created_message(order_id: str, status: str) -> tuple[str, dict]:
+    return partitioned_key("order.created", order_id), {"order_id": order_id, "status": status}
+
+def order_status_updated_message(order_id: str, status: str, version: int, meta: dict | None = None) -> tuple[str, dict]:
     payload = {"order_id": order_id, "new_status": status, "version": int(version)}
     if meta:
         payload["meta"] = meta
-    _publish("order.status.updated", payload)
+    return partitioned_key("order.status.updated", order_id), payload
+
+def publish_order_created(order_id: str, status: str) -> None:
+    """Encola el evento (no bloquea); ver AsyncPublisher. Con RABBIT_ASYNC=0 publica en línea."""
+    _submit(*order_created_message(order_id, status))
 
+def publish_order_status_updated(order_id: str, status: str, version: int, meta: dict | None = None):
+    """Encola el evento (no bloquea); ver AsyncPublisher. Con RABBIT_ASYNC=0 publica en línea."""
+    _submit(*order_status_updated_message(order_id, status, version, meta))
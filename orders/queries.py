@@ -0,0 +1,76 @@
+# orders/queries.py
+from django.db import connection
+from django.utils import timezone
+
+from .models import Order
+
+
+def conditional_status_update(order_id: str, new_status: str, sources: list[str],
+                              expected_version: int | None = None) -> tuple[str, int] | None:
+    """
+    Transición en un solo round-trip:
+        UPDATE ... SET status, version = version + 1
+        WHERE id = ? AND status IN (sources) [AND version = ?]
+        RETURNING status, version
+    El lock de fila dura solo lo que dura este statement. Retorna (status, version)
+    nuevos, o None si no se actualizó nada (no existe, versión distinta o transición
+    inválida; el llamador lo distingue con una lectura aparte).
+    """
+    if not sources:
+        return None
+
+    qn = connection.ops.quote_name
+    meta = Order._meta
+    table = qn(meta.db_table)
+    col = {f: qn(meta.get_field(f).column) for f in ("id", "status", "version", "updated_at")}
+
+    sql = (
+        f"UPDATE {table} SET {col['status']} = %s, {col['version']} = {col['version']} + 1, "
+        f"{col['updated_at']} = %s "
+        f"WHERE {col['id']} = %s AND {col['status']} IN ({', '.join(['%s'] * len(sources))})"
+    )
+    params = [new_status, timezone.now(), order_id, *sources]
+    if expected_version is not None:
+        sql += f" AND {col['version']} = %s"
+        params.append(expected_version)
+    sql += f" RETURNING {col['status']}, {col['version']}"
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return (row[0], row[1]) if row else None
+
+
+INSERT_ROWS_PER_STATEMENT = 500
+
+
+def insert_orders_returning_created(orders: list[Order]) -> set[str]:
+    """
+    INSERT ... ON CONFLICT (id) DO NOTHING RETURNING id: los ids vienen del propio
+    INSERT, así que solo se reportan las filas que este statement creó (un id que otro
+    writer insertó en paralelo no aparece, aunque no se haya leído antes).
+    """
+    if not orders:
+        return set()
+
+    qn = connection.ops.quote_name
+    meta = Order._meta
+    table = qn(meta.db_table)
+    col = {f: qn(meta.get_field(f).column) for f in ("id", "status", "version", "updated_at")}
+    now = timezone.now()
+
+    created: set[str] = set()
+    with connection.cursor() as cursor:
+        for start in range(0, len(orders), INSERT_ROWS_PER_STATEMENT):
+            chunk = orders[start:start + INSERT_ROWS_PER_STATEMENT]
+            sql = (
+                f"INSERT INTO {table} ({col['id']}, {col['status']}, {col['version']}, {col['updated_at']}) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(chunk))} "
+                f"ON CONFLICT ({col['id']}) DO NOTHING RETURNING {col['id']}"
+            )
+            params = []
+            for o in chunk:
+                params.extend((o.id, o.status, o.version, now))
+            cursor.execute(sql, params)
+            created.update(row[0] for row in cursor.fetchall())
+    return created
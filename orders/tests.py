@@ -1,3 +1,404 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+
+from monitoring import metrics
+from .event_ordering import EventSequencer
+from .management.commands.relay_order_events import Command as RelayCommand
+from .models import Order, OrderEvent, OrderStatusCount, OrderStatusView
+from .projection import apply_events
+from .publisher import AsyncPublisher, CircuitBreaker, _outbox_pending, _spill_to_outbox
+from .validators import order_etag
+
+
+class FakeOutbox:
+    """Outbox en memoria con la misma interfaz que _spill_to_outbox / _outbox_pending."""
+
+    def __init__(self):
+        self.rows = {}
+        self.last_id = 0
+        self.threads = set()
+
+    def spill(self, messages):
+        self.threads.add(threading.current_thread().name)
+        for message in messages:
+            self.last_id += 1
+            self.rows[self.last_id] = message
+        return self.last_id
+
+    def pending(self, event_ids):
+        return {event_id for event_id in event_ids if event_id in self.rows}
+
+    def relay(self):
+        """Lo que haría relay_order_events: publicar en orden de id y borrar."""
+        relayed = [self.rows.pop(event_id) for event_id in sorted(self.rows)]
+        return relayed
+
+
+class FakePublisher:
+    def __init__(self):
+        self.sent = []
+        self.fail = False
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def publish_batch(self, batch):
+        self.gate.wait()
+        if self.fail:
+            raise ConnectionError("broker caído")
+        self.sent.extend(batch)
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("la condición no se cumplió a tiempo")
+        time.sleep(0.01)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_threshold_and_half_opens_after_cooldown(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, "half-open")
+        self.assertTrue(breaker.allow())
+
+    def test_half_open_failure_reopens_and_success_closes(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        time.sleep(0.02)
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.failures, 0)
+
+
+class AsyncPublisherTests(SimpleTestCase):
+    def make(self, **kwargs):
+        self.outbox = FakeOutbox()
+        self.publisher = FakePublisher()
+        options = dict(publisher=self.publisher, maxsize=4, batch=2, linger=0.001, overflow="spill",
+                       breaker=CircuitBreaker(threshold=100, cooldown=0), spill=self.outbox.spill,
+                       outbox_pending=self.outbox.pending, spill_check_interval=0.01)
+        options.update(kwargs)
+        return AsyncPublisher(**options)
+
+    def test_publishes_in_order(self):
+        publisher = self.make(maxsize=100)
+        for n in range(5):
+            self.assertTrue(publisher.submit("order.status.updated", {"n": n}))
+        self.assertTrue(publisher.flush())
+        self.assertEqual([payload["n"] for _, payload in self.publisher.sent], list(range(5)))
+
+    def test_submit_does_not_wait_for_the_inflight_batch(self):
+        publisher = self.make()
+        self.publisher.gate.clear()  # el lote en vuelo queda colgado en el broker
+        started = time.monotonic()
+        for n in range(8):
+            self.assertTrue(publisher.submit("order.status.updated.p01", {"n": n}))
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(self.outbox.threads, set())  # el llamador nunca escribe en el outbox
+        self.publisher.fail = True
+        self.publisher.gate.set()
+        self.assertTrue(publisher.flush())
+        self.assertNotIn(threading.current_thread().name, self.outbox.threads)
+
+    def test_overflow_spills_oldest_first_and_keeps_the_partition_on_the_outbox(self):
+        publisher = self.make()
+        self.publisher.gate.clear()
+        for n in range(6):
+            publisher.submit("order.status.updated.p01", {"n": n})
+        # Falla el lote en vuelo: vuelve al frente y se desborda antes que el resto
+        self.publisher.fail = True
+        self.publisher.gate.set()
+        self.assertTrue(publisher.flush())
+        self.assertEqual([payload["n"] for _, payload in self.outbox.rows.values()], list(range(6)))
+        self.assertEqual(publisher.stats()["spill_partitions"], ["p01"])
+
+        # Con el broker de vuelta, la partición sigue yendo al outbox hasta que el relay la drene
+        self.publisher.fail = False
+        publisher.submit("order.status.updated.p01", {"n": 6})
+        publisher.submit("order.status.updated.p02", {"n": 7})
+        self.assertTrue(publisher.flush())
+        self.assertEqual([payload["n"] for _, payload in self.publisher.sent], [7])
+        relayed = self.outbox.relay()
+        self.assertEqual([payload["n"] for _, payload in relayed], list(range(7)))
+
+        _wait_until(lambda: publisher.stats()["spill_partitions"] == [])
+        publisher.submit("order.status.updated.p01", {"n": 8})
+        self.assertTrue(publisher.flush())
+        self.assertEqual([payload["n"] for _, payload in self.publisher.sent], [7, 8])
+
+    def test_failed_batch_is_requeued_not_spilled(self):
+        publisher = self.make(maxsize=100, breaker=CircuitBreaker(threshold=1, cooldown=0.05))
+        self.publisher.fail = True
+        for n in range(3):
+            publisher.submit("order.status.updated", {"n": n})
+        _wait_until(lambda: publisher.failures >= 1)
+        self.assertEqual(self.outbox.rows, {})
+        self.publisher.fail = False
+        self.assertTrue(publisher.flush())
+        self.assertEqual([payload["n"] for _, payload in self.publisher.sent], [0, 1, 2])
+
+    def test_spill_drops_past_twice_maxsize(self):
+        publisher = self.make()
+        self.publisher.gate.clear()
+        publisher.submit("order.status.updated", {"n": 0})
+        _wait_until(lambda: publisher.stats()["depth"] == 0)  # en vuelo, colgado en el broker
+        results = [publisher.submit("order.status.updated", {"n": n}) for n in range(1, 12)]
+        # Hasta 2 * maxsize en cola; el resto se descarta en vez de crecer sin límite
+        self.assertEqual(results.count(False), 3)
+        self.assertEqual(publisher.stats()["dropped"], 3)
+        self.publisher.gate.set()
+        self.assertTrue(publisher.flush())
+
+    def test_block_policy_gives_up_after_the_deadline(self):
+        publisher = self.make(overflow="block", block_deadline=0.02, maxsize=1, batch=1)
+        self.publisher.gate.clear()
+        publisher.submit("order.status.updated", {"n": 0})
+        _wait_until(lambda: publisher.stats()["depth"] == 0)  # el primero ya está en vuelo
+        self.assertTrue(publisher.submit("order.status.updated", {"n": 1}))
+        self.assertFalse(publisher.submit("order.status.updated", {"n": 2}))
+        self.publisher.gate.set()
+        self.assertTrue(publisher.flush())
+
+    def test_drop_oldest_policy(self):
+        publisher = self.make(overflow="drop_oldest", maxsize=2, batch=1)
+        self.publisher.gate.clear()
+        for n in range(5):
+            publisher.submit("order.status.updated", {"n": n})
+        self.publisher.gate.set()
+        self.assertTrue(publisher.flush())
+        self.assertEqual([payload["n"] for _, payload in self.publisher.sent][-2:], [3, 4])
+        self.assertGreater(publisher.stats()["dropped"], 0)
+
+
+class OutboxSpillTests(TestCase):
+    def test_spill_writes_in_order_and_reports_the_last_id(self):
+        last_id = _spill_to_outbox([("order.created.p01", {"n": 1}), ("order.created.p01", {"n": 2})])
+        rows = list(OrderEvent.objects.order_by("id").values_list("id", "payload"))
+        self.assertEqual([payload["n"] for _, payload in rows], [1, 2])
+        self.assertEqual(last_id, rows[-1][0])
+        self.assertEqual(_outbox_pending({last_id, last_id + 1000}), {last_id})
+
+
+class OrderApiTests(TestCase):
+    def put_status(self, order_id, body, **headers):
+        return self.client.put(f"/orders/{order_id}/status", data=body, content_type="application/json", **headers)
+
+    def events(self):
+        return list(OrderEvent.objects.order_by("id").values_list("routing_key", "payload"))
+
+    def test_create_is_idempotent_and_writes_one_outbox_event(self):
+        response = self.client.post("/orders", data={"id": "C-1"}, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["ETag"], order_etag("C-1", 0))
+        self.assertEqual(response.json(), {"created": True, "id": "C-1", "status": "CREATED", "version": 0})
+        response = self.client.post("/orders", data={"id": "C-1"}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["created"])
+        self.assertEqual(self.events(), [("order.created", {"order_id": "C-1", "status": "CREATED"})])
+
+    def test_create_rejects_invalid_payload(self):
+        response = self.client.post("/orders", data="{", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_create_reports_created_existing_and_rejected(self):
+        Order.objects.create(id="B-0", status="CREATED")
+        items = [{"id": "B-0"}, {"id": "B-1"}, {"id": "B-2", "status": "UPDATED"}, {"id": "B-1"}, {"nope": 1}, "x"]
+        response = self.client.post("/orders:bulk", data=items, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body["created"], ["B-1", "B-2"])
+        self.assertEqual(body["existing"], ["B-0"])
+        self.assertEqual([(r["index"], r["reason"]) for r in body["rejected"]],
+                         [(3, "duplicate id"), (4, "invalid item"), (5, "invalid item")])
+        self.assertEqual([payload["order_id"] for _, payload in self.events()], ["B-1", "B-2"])
+
+    def test_bulk_create_accepts_ndjson(self):
+        body = "\n".join(json.dumps({"id": f"N-{n}"}) for n in range(3))
+        response = self.client.post("/orders:bulk", data=body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], ["N-0", "N-1", "N-2"])
+
+    def test_update_status_bumps_version_and_writes_the_event(self):
+        Order.objects.create(id="U-1", status="CREATED")
+        response = self.put_status("U-1", {"status": "UPDATED", "meta": {"by": "test"}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"ok": True, "id": "U-1", "status": "UPDATED", "version": 1})
+        self.assertEqual(response["ETag"], order_etag("U-1", 1))
+        self.assertEqual(self.events(), [("order.status.updated", {
+            "order_id": "U-1", "new_status": "UPDATED", "version": 1, "meta": {"by": "test"}})])
+
+    def test_update_status_failure_codes(self):
+        Order.objects.create(id="U-2", status="CREATED")
+        self.assertEqual(self.put_status("missing", {"status": "UPDATED"}).status_code, 404)
+        self.assertEqual(self.put_status("U-2", {"status": "DELIVERED"}).status_code, 400)
+        self.assertEqual(self.put_status("U-2", {"status": ["UPDATED"]}).status_code, 400)
+        self.assertEqual(self.put_status("U-2", {}).status_code, 400)
+        response = self.put_status("U-2", {"status": "UPDATED", "version": 7})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["reason"], "version mismatch")
+        self.assertEqual(self.events(), [])
+
+    def test_if_match(self):
+        Order.objects.create(id="U-3", status="CREATED")
+        response = self.put_status("U-3", {"status": "UPDATED"}, HTTP_IF_MATCH=order_etag("U-3", 5))
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response["ETag"], order_etag("U-3", 0))
+        response = self.put_status("U-3", {"status": "UPDATED"}, HTTP_IF_MATCH=order_etag("other", 0))
+        self.assertEqual(response.status_code, 400)
+        response = self.put_status("U-3", {"status": "UPDATED"}, HTTP_IF_MATCH=order_etag("U-3", 0))
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_returns_etag_and_304_when_unchanged(self):
+        Order.objects.create(id="G-1", status="CREATED", version=3)
+        response = self.client.get("/orders/G-1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"id": "G-1", "status": "CREATED", "version": 3})
+        etag = response["ETag"]
+        response = self.client.get("/orders/G-1", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(self.client.get("/orders/G-missing").status_code, 404)
+
+    def test_get_sees_a_committed_update(self):
+        Order.objects.create(id="G-2", status="CREATED")
+        self.client.get("/orders/G-2")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.put_status("G-2", {"status": "SHIPPED"})
+        self.assertEqual(self.client.get("/orders/G-2").json()["status"], "SHIPPED")
+
+    def test_batch_answers_per_item(self):
+        Order.objects.create(id="T-1", status="CREATED")
+        Order.objects.create(id="T-2", status="DELIVERED")
+        Order.objects.create(id="T-3", status="CREATED", version=2)
+        items = [
+            {"id": "T-1", "status": "SHIPPED"},
+            {"id": "T-2", "status": "CANCELLED"},
+            {"id": "T-3", "status": "UPDATED", "version": 1},
+            {"id": "T-4", "status": "UPDATED"},
+            {"id": "T-1", "status": "DELIVERED"},
+            {"id": "T-5", "status": ["x"]},
+        ]
+        response = self.client.post("/orders/status:batch", data={"items": items}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["applied"], body["failed"]), (1, 5))
+        self.assertEqual([r["code"] for r in body["results"]], [200, 400, 409, 404, 400, 400])
+        self.assertEqual(Order.objects.get(pk="T-1").version, 1)
+        self.assertEqual(len(self.events()), 1)
+
+    def test_batch_rejects_a_non_list(self):
+        response = self.client.post("/orders/status:batch", data={"items": "x"}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_watch_returns_newer_version_or_304_on_timeout(self):
+        Order.objects.create(id="W-1", status="UPDATED", version=2)
+        response = self.client.get("/orders/W-1/watch", {"after_version": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], 2)
+        response = self.client.get("/orders/W-1/watch", {"after_version": 2, "timeout": 0.01})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get("/orders/W-1/watch", {"after_version": "x"}).status_code, 400)
+
+    def test_watch_stream_validates_ids(self):
+        self.assertEqual(self.client.get("/orders:watch").status_code, 400)
+
+    def test_summary_reads_the_projection(self):
+        apply_events([{"order_id": "S-1", "status": "CREATED"}, {"order_id": "S-2", "status": "CREATED"},
+                      {"order_id": "S-1", "new_status": "SHIPPED", "version": 1}])
+        response = self.client.get("/orders:summary")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"total": 2, "by_status": {"CREATED": 1, "SHIPPED": 1}})
+
+
+class ProjectionTests(TestCase):
+    def test_ignores_duplicates_and_older_versions(self):
+        apply_events([{"order_id": "P-1", "new_status": "SHIPPED", "version": 2}])
+        apply_events([{"order_id": "P-1", "new_status": "UPDATED", "version": 1},
+                      {"order_id": "P-1", "new_status": "SHIPPED", "version": 2}])
+        row = OrderStatusView.objects.get(pk="P-1")
+        self.assertEqual((row.status, row.version), ("SHIPPED", 2))
+        self.assertEqual(OrderStatusCount.objects.get(pk="SHIPPED").count, 1)
+
+
+class RelayTests(TestCase):
+    def test_publishes_in_id_order_and_deletes(self):
+        OrderEvent.objects.create(routing_key="order.created.p01", payload={"n": 1})
+        OrderEvent.objects.create(routing_key="order.created.p02", payload={"n": 2})
+        OrderEvent.objects.create(routing_key="order.created.p01", payload={"n": 3})
+        with mock.patch("orders.management.commands.relay_order_events.publish_batch") as publish:
+            self.assertEqual(RelayCommand().relay_batch(10, partition=1), 2)
+        self.assertEqual([payload["n"] for _, payload in publish.call_args.args[0]], [1, 3])
+        self.assertEqual(list(OrderEvent.objects.values_list("payload", flat=True)), [{"n": 2}])
+
+    def test_keeps_the_events_when_publish_fails(self):
+        OrderEvent.objects.create(routing_key="order.created", payload={"n": 1})
+        with mock.patch("orders.management.commands.relay_order_events.publish_batch",
+                        side_effect=ConnectionError("broker caído")):
+            with self.assertRaises(ConnectionError):
+                RelayCommand().relay_batch(10)
+        self.assertEqual(OrderEvent.objects.count(), 1)
+
+
+class EventSequencerTests(SimpleTestCase):
+    def event(self, version, order_id="E-1"):
+        return {"order_id": order_id, "version": version}
+
+    def test_drops_duplicates_and_reorders(self):
+        sequencer = EventSequencer(gap_window=10)
+        ready = sequencer.accept([(self.event(1), 1), (self.event(3), 2), (self.event(2), 3), (self.event(2), 4)], now=0)
+        self.assertEqual([event["version"] for event, _ in ready], [1, 2, 3])
+        sequencer.commit()
+        self.assertEqual(sequencer.accept([(self.event(3), 5)], now=1), [])
+        self.assertEqual(sequencer.stats()["duplicates"], 2)
+
+    def test_delivers_past_a_gap_after_the_window(self):
+        sequencer = EventSequencer(gap_window=1)
+        sequencer.accept([(self.event(1), 1)], now=0)
+        sequencer.commit()
+        self.assertEqual(sequencer.accept([(self.event(3), 2)], now=0), [])
+        ready = sequencer.accept([], now=2)
+        self.assertEqual([event["version"] for event, _ in ready], [3])
+        self.assertEqual(sequencer.stats()["gaps_skipped"], 1)
+
+    def test_reject_lets_the_failed_version_through_again(self):
+        sequencer = EventSequencer()
+        sequencer.accept([(self.event(1), 1), (self.event(2), 2)], now=0)
+        sequencer.reject("E-1", 2)
+        sequencer.commit()
+        ready = sequencer.accept([(self.event(2), 3)], now=0)
+        self.assertEqual([event["version"] for event, _ in ready], [2])
+
+
+class MetricsTests(TestCase):
+    def test_endpoint_exports_transition_counters(self):
+        self.client.put("/orders/missing/status", data={"status": "UPDATED"}, content_type="application/json")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('orders_transitions_total{outcome="404",source="single"}', response.content.decode())
+
+    def test_shards_of_exited_threads_are_folded(self):
+        def work():
+            metrics.inc("orders_test_total")
+
+        threads = [threading.Thread(target=work) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counters = metrics._merged()[0]
+        self.assertEqual(counters[("orders_test_total", ())], 20.0)
+        self.assertFalse(any(thread in threads for thread, _ in metrics._shards))
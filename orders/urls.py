@@ -1,8 +1,18 @@
 from django.urls import path
-from .views import get_order, create_order, update_status
+from .views import (
+    get_order, create_order, update_status, update_status_batch, create_orders_bulk, cache_stats,
+    watch_order, watch_orders_stream, orders_summary,
+)
 
 urlpatterns = [
+    # Antes de orders/<id>: "status:batch" y "cache:stats" también calzan como order_id
+    path("orders/status:batch", update_status_batch),
+    path("orders/cache:stats", cache_stats),
     path("orders/<str:order_id>", get_order),
     path("orders/<str:order_id>/status", update_status),
+    path("orders/<str:order_id>/watch", watch_order),
     path("orders", create_order),
+    path("orders:bulk", create_orders_bulk),
+    path("orders:watch", watch_orders_stream),
+    path("orders:summary", orders_summary),
 ]
@@ -1,4 +1,5 @@
 import json
+import zlib
 
 class BadJSON(Exception):
     """Se lanza cuando el cuerpo no es JSON válido."""
@@ -22,6 +23,65 @@ def parse_json_body(request):
         raise BadJSON(f"JSON inválido: {e}")
 
 
+def iter_json_items(request):
+    """
+    Itera los objetos de un body que puede ser un arreglo JSON o NDJSON
+    (Content-Type application/x-ndjson, un objeto por línea, leído en streaming).
+    Lanza BadJSON si el body no tiene ninguno de los dos formatos.
+    """
+    if request.content_type == "application/x-ndjson":
+        for line in request:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except Exception as e:
+                raise BadJSON(f"NDJSON inválido: {e}")
+        return
+
+    body = parse_json_body(request)
+    if isinstance(body, dict):
+        body = body.get("orders")
+    if not isinstance(body, list):
+        raise BadJSON("se esperaba un arreglo JSON")
+    yield from body
+
+
+def order_etag(order_id: str, version: int) -> str:
+    """ETag fuerte derivado de id + version: '"<crc32(id)>-<version>"'."""
+    return f'"{zlib.crc32(order_id.encode("utf-8")):08x}-{int(version)}"'
+
+
+def etag_matches(header: str | None, order_id: str, version: int) -> bool:
+    """True si algún ETag de un If-None-Match (lista separada por comas o '*') coincide."""
+    if not header:
+        return False
+    current = order_etag(order_id, version)
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == current:
+            return True
+    return False
+
+
+def parse_if_match_version(header: str, order_id: str) -> int | None:
+    """
+    Extrae la version de un If-Match generado por order_etag para esta orden.
+    '*' no impone versión (retorna None). Lanza BadJSON si el ETag no es de esta orden.
+    """
+    tag = header.strip()
+    if tag == "*":
+        return None
+    try:
+        crc, version = tag.removeprefix("W/").strip('"').rsplit("-", 1)
+        if crc != f"{zlib.crc32(order_id.encode('utf-8')):08x}":
+            raise ValueError("ETag de otra orden")
+        return int(version)
+    except ValueError as e:
+        raise BadJSON(f"If-Match inválido: {e}")
+
+
 # Reglas simples de transición de estados
 _ALLOWED_TRANSITIONS = {
     "CREATED":   {"UPDATED", "CANCELLED", "SHIPPED"},
@@ -38,6 +98,8 @@ def validate_status_transition(current_status: str | None, new_status: str) -> b
     - Si current_status es None, siempre permite (caso de creación).
     - Lanza InvalidStatus si la transición no está permitida.
     """
+    if not isinstance(new_status, str):
+        raise InvalidStatus(f"Estado inválido: {new_status!r}")
     if current_status is None:
         return True
 
@@ -45,3 +107,14 @@ def validate_status_transition(current_status: str | None, new_status: str) -> b
     if new_status not in allowed:
         raise InvalidStatus(f"No permitido pasar de {current_status} a {new_status}")
     return True
+
+
+def allowed_source_statuses(new_status: str) -> list[str]:
+    """
+    Estados desde los que se puede pasar a new_status (inverso de _ALLOWED_TRANSITIONS).
+    Sirve para llevar la regla de transición al WHERE de un UPDATE condicional.
+    Lanza InvalidStatus si new_status no es un string.
+    """
+    if not isinstance(new_status, str):
+        raise InvalidStatus(f"Estado inválido: {new_status!r}")
+    return sorted(s for s, targets in _ALLOWED_TRANSITIONS.items() if new_status in targets)
@@ -1,25 +1,94 @@
+import json
+import os
+import queue
+import time
+
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET, require_POST, require_http_methods
 from django.db import transaction, models
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseNotFound
+from django.utils import timezone
+from django.http import (
+    JsonResponse, HttpResponseBadRequest, HttpResponseNotFound, HttpResponseNotModified, StreamingHttpResponse,
+)
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 
+from monitoring import metrics
+from .cache import order_cache
 from .models import Order
-from .publisher import publish_order_status_updated
-from .validators import parse_json_body, validate_status_transition, BadJSON, InvalidStatus
+from .outbox import enqueue_order_created, enqueue_order_status_updated, enqueue_many
+from .publisher import order_created_message, order_status_updated_message
+from .projection import status_counts
+from .queries import conditional_status_update, insert_orders_returning_created
+from .watch import watch_hub, ensure_broker_listener
+from .validators import (
+    parse_json_body, iter_json_items, validate_status_transition, allowed_source_statuses, BadJSON, InvalidStatus,
+    order_etag, etag_matches, parse_if_match_version,
+)
+
+# Máximo de ítems por lote en /orders/status:batch
+BATCH_MAX_ITEMS = int(os.getenv("ORDERS_BATCH_MAX_ITEMS", "1000"))
+# Órdenes por transacción / INSERT en /orders:bulk
+BULK_CHUNK_SIZE = int(os.getenv("ORDERS_BULK_CHUNK_SIZE", "1000"))
+# Long-poll / SSE de /orders/<id>/watch y /orders:watch
+WATCH_MAX_TIMEOUT = float(os.getenv("ORDERS_WATCH_MAX_TIMEOUT", "60"))
+WATCH_STREAM_MAX_SECONDS = float(os.getenv("ORDERS_WATCH_STREAM_MAX_SECONDS", "300"))
+WATCH_STREAM_MAX_IDS = int(os.getenv("ORDERS_WATCH_STREAM_MAX_IDS", "100"))
+WATCH_HEARTBEAT_SECONDS = 15.0
+
+metrics.describe("orders_transitions_total", "counter",
+                 "Resultado de las transiciones de estado (outcome = código HTTP) por endpoint.")
+metrics.describe("orders_update_phase_seconds", "histogram",
+                 "Fases de update_status: update (incluye espera de lock), outbox, commit, failure_read.")
 
 def _json(data, status=200):
     return JsonResponse(data, status=status, json_dumps_params={"ensure_ascii": False})
 
 
+def _order_json(order_id: str, status: str, version: int, data: dict | None = None, code=200):
+    """Respuesta de una orden con su ETag (id + version)."""
+    response = _json(data if data is not None else {"id": order_id, "status": status, "version": version}, code)
+    response["ETag"] = order_etag(order_id, version)
+    return response
+
+
 @require_GET
 def get_order(request, order_id: str):
-    try:
-        o = Order.objects.get(pk=order_id)
-        return _json({"id": o.id, "status": o.status, "version": o.version})
-    except Order.DoesNotExist:
-        return HttpResponseNotFound("order not found")
+    """
+    Lectura de una orden (cache read-through). Con If-None-Match igual al ETag actual
+    responde 304 sin serializar el body: a los pollers solo les cuesta mirar la version.
+    """
+    cached = order_cache.get(order_id)
+    if cached is None:
+        cached = Order.objects.filter(pk=order_id).values_list("status", "version").first()
+        if cached is None:
+            return HttpResponseNotFound("order not found")
+        order_cache.fill(order_id, *cached)
+    status, version = cached
+    if etag_matches(request.headers.get("If-None-Match"), order_id, version):
+        response = HttpResponseNotModified()
+        response["ETag"] = order_etag(order_id, version)
+        return response
+    return _order_json(order_id, status, version)
+
+
+def _on_status_committed(rows) -> None:
+    """Tras el commit: sobrescribe la cache y avisa a los watchers de este proceso."""
+    for order_id, status, version in rows:
+        order_cache.put(order_id, status, version)
+        watch_hub.publish(order_id, status, version)
+
+
+@require_GET
+def orders_summary(request):
+    """Conteo de órdenes por estado desde el read model (no toca la tabla Order)."""
+    counts = status_counts()
+    return _json({"total": sum(counts.values()), "by_status": counts})
+
+
+@require_GET
+def cache_stats(request):
+    return _json(order_cache.stats())
 
 
 @csrf_exempt
@@ -31,58 +100,320 @@ def create_order(request):
     except (BadJSON, KeyError):
         return HttpResponseBadRequest("invalid payload")
 
-    obj, created = Order.objects.get_or_create(id=oid, defaults={"status": status})
-    return _json({"created": created, "id": obj.id, "status": obj.status, "version": obj.version}, 201 if created else 200)
+    # El evento order.created queda en el outbox dentro de la misma transacción
+    with transaction.atomic():
+        obj, created = Order.objects.get_or_create(id=oid, defaults={"status": status})
+        if created:
+            enqueue_order_created(obj.id, obj.status)
+            transaction.on_commit(lambda: order_cache.put(obj.id, obj.status, obj.version))
+    return _order_json(obj.id, obj.status, obj.version,
+                       {"created": created, "id": obj.id, "status": obj.status, "version": obj.version},
+                       201 if created else 200)
+
+def _bulk_create_chunk(chunk: list[Order], created: list[str], existing: list[str]) -> None:
+    """
+    Inserta un bloque con INSERT ... ON CONFLICT DO NOTHING RETURNING id y sus eventos
+    order.created en el outbox, en una transacción. Los ids creados salen del RETURNING,
+    así que un id que otro writer inserta en paralelo se reporta como existente y no
+    genera un order.created fantasma.
+    """
+    with transaction.atomic():
+        inserted = insert_orders_returning_created(chunk)
+        new = [o for o in chunk if o.id in inserted]
+        enqueue_many(order_created_message(o.id, o.status) for o in new)
+    created.extend(o.id for o in new)
+    existing.extend(o.id for o in chunk if o.id not in inserted)
+
+
+@csrf_exempt
+@require_POST
+def create_orders_bulk(request):
+    """
+    Creación masiva: arreglo JSON (o {"orders": [...]}) o NDJSON en streaming con
+    objetos {"id", "status"?}. Se procesa en bloques de BULK_CHUNK_SIZE, cada uno en su
+    propia transacción. Responde qué ids se crearon, cuáles ya existían y qué ítems
+    se rechazaron (posición + motivo). Ids repetidos dentro del body se reportan una vez.
+    """
+    created: list[str] = []
+    existing: list[str] = []
+    rejected: list[dict] = []
+    seen: set[str] = set()
+    chunk: list[Order] = []
+    try:
+        for pos, item in enumerate(iter_json_items(request)):
+            oid = item.get("id") if isinstance(item, dict) else None
+            status = item.get("status", "CREATED") if isinstance(item, dict) else None
+            if not isinstance(oid, str) or not oid or len(oid) > 64 or not isinstance(status, str):
+                rejected.append({"index": pos, "reason": "invalid item"})
+                continue
+            if oid in seen:
+                rejected.append({"index": pos, "id": oid, "reason": "duplicate id"})
+                continue
+            seen.add(oid)
+            chunk.append(Order(id=oid, status=status))
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                _bulk_create_chunk(chunk, created, existing)
+                chunk = []
+        if chunk:
+            _bulk_create_chunk(chunk, created, existing)
+    except BadJSON as e:
+        # Los bloques anteriores ya quedaron confirmados: se informan junto con el error
+        return _json({"error": str(e), "created": created, "existing": existing, "rejected": rejected}, 400)
+
+    return _json({"created": created, "existing": existing, "rejected": rejected}, 201 if created else 200)
+
 
 @csrf_exempt
 @require_http_methods(["PUT", "PATCH"])
 def update_status(request, order_id: str):
     """
     Ruta crítica del ASR:
-    - Actualiza status por PK en una transacción corta (SELECT ... FOR UPDATE + UPDATE).
-    - Maneja control optimista opcional por 'version'.
-    - Publica evento EDA fuera de la transacción (no afecta la latencia).
-    - Códigos: 200 OK, 404 si no existe, 409 si hay conflicto de versión, 400 si payload inválido.
+    - Un único UPDATE condicional con RETURNING: la regla de transición y el control
+      optimista por 'version' van en el WHERE, así el lock de fila dura un statement.
+    - Escribe el evento EDA en el outbox dentro de la misma transacción; el
+      comando relay_order_events lo publica (el broker no está en la ruta de la request).
+    - Códigos: 200 OK, 404 si no existe, 409 si la version del body no coincide,
+      412 si no coincide el If-Match (RFC 9110), 400 si payload inválido.
+      Solo cuando el UPDATE no toca filas se hace una lectura para elegir el código.
+    - La version esperada puede venir en el body o como If-Match con el ETag de GET
+      (si vienen ambos, manda el body).
     """
     try:
         body = parse_json_body(request)
         new_status = body["status"]
         expected   = body.get("version")   # int opcional para control optimista
         meta       = body.get("meta", {})  # opcional: quién actualiza, timestamp cliente, etc.
-    except (BadJSON, KeyError):
+        precondition = False               # la version viene de un If-Match
+        if not isinstance(new_status, str):
+            raise TypeError("status debe ser un string")
+        if expected is not None:
+            expected = int(expected)
+        elif "If-Match" in request.headers:
+            expected = parse_if_match_version(request.headers["If-Match"], order_id)
+            precondition = True
+    except (BadJSON, KeyError, TypeError, ValueError):
+        _count_transition(400, "single")
         return HttpResponseBadRequest("invalid payload")
 
-    # Transacción lo más pequeña posible
+    # Transacción lo más pequeña posible: UPDATE ... RETURNING + INSERT en el outbox
+    # (fases medidas en orders_update_phase_seconds; "update" incluye la espera por el lock)
     with transaction.atomic():
-        # Lock de fila para evitar ‘lost updates’
-        q = Order.objects.select_for_update().filter(id=order_id)
-        if expected is not None:
-            q = q.filter(version=expected)  # control optimista (si cliente envía version)
-        row = q.first()
-
-        if row is None:
-            # Distinguir entre no existe vs. conflicto de versión
-            exists = Order.objects.filter(id=order_id).exists()
-            if exists and expected is not None:
-                return _json({"ok": False, "conflict": True, "reason": "version mismatch"}, 409)
-            return HttpResponseNotFound("order not found")
+        with metrics.timer("orders_update_phase_seconds", (("phase", "update"),)):
+            row = conditional_status_update(order_id, new_status, allowed_source_statuses(new_status), expected)
+        if row is not None:
+            status, version = row
+            # Outbox: el evento se confirma junto con el cambio o no se confirma
+            with metrics.timer("orders_update_phase_seconds", (("phase", "outbox"),)):
+                enqueue_order_status_updated(order_id, status, version, meta=meta)
+            transaction.on_commit(lambda: _on_status_committed([(order_id, status, version)]))
+        commit_start = time.perf_counter()
+    # "commit" incluye los callbacks on_commit (cache y watch)
+    metrics.observe("orders_update_phase_seconds", time.perf_counter() - commit_start, (("phase", "commit"),))
+
+    if row is None:
+        with metrics.timer("orders_update_phase_seconds", (("phase", "failure_read"),)):
+            response = _transition_failure(order_id, new_status, expected, precondition)
+        _count_transition(response.status_code, "single")
+        return response
+
+    _count_transition(200, "single")
+    # Respuesta JSON (rápida, sin incluir datos pesados)
+    return _order_json(order_id, status, version, {"ok": True, "id": order_id, "status": status, "version": version})
 
+
+def _count_transition(code: int, source: str) -> None:
+    metrics.inc("orders_transitions_total", (("outcome", code), ("source", source)))
+
+
+def _transition_failure(order_id: str, new_status: str, expected: int | None, precondition: bool = False):
+    """
+    Lectura posterior a un UPDATE fallido para distinguir 404 / 409 / 412 / 400.
+    precondition: la version esperada vino de un If-Match, y un validador que no
+    coincide es 412 Precondition Failed (con el ETag actual), no 409.
+    """
+    current = Order.objects.filter(pk=order_id).values_list("status", "version").first()
+    if current is None:
+        return HttpResponseNotFound("order not found")
+
+    status, version = current
+    if expected is not None and version != expected:
+        if precondition:
+            return _order_json(order_id, status, version,
+                               {"ok": False, "conflict": True, "reason": "precondition failed"}, 412)
+        return _json({"ok": False, "conflict": True, "reason": "version mismatch"}, 409)
+
+    try:
+        validate_status_transition(status, new_status)
+    except InvalidStatus as e:
+        return HttpResponseBadRequest(str(e))
+
+    # La transición era válida al leer: otro writer cambió la fila entre ambos statements
+    return _json({"ok": False, "conflict": True, "reason": "concurrent update"}, 409)
+
+
+
+def _batch_item_error(oid, code: int, reason: str) -> dict:
+    return {"id": oid, "ok": False, "code": code, "reason": reason}
+
+
+@csrf_exempt
+@require_POST
+def update_status_batch(request):
+    """
+    Transiciones de estado en lote: {"items": [{"id", "status", "version"?, "meta"?}, ...]}.
+    - Una sola transacción corta: un SELECT ... FOR UPDATE de todas las filas (en orden
+      de PK para no generar deadlocks), un UPDATE por estado destino y un INSERT de
+      todos los eventos en el outbox (el relay los publica juntos).
+    - Cada ítem se valida con validate_status_transition y responde su propio código
+      (200 / 404 / 409 / 400); el lote completo responde 200. La version esperada va
+      en cada ítem (no hay If-Match por ítem), así que un desajuste es 409, no 412.
+    """
+    try:
+        body = parse_json_body(request)
+        items = body["items"] if isinstance(body, dict) else body
+        if not isinstance(items, list) or len(items) > BATCH_MAX_ITEMS:
+            raise ValueError
+    except (BadJSON, KeyError, ValueError):
+        return HttpResponseBadRequest("invalid payload")
+
+    results: list[dict | None] = [None] * len(items)
+    pending: dict[str, tuple[int, str, int | None, dict]] = {}
+    for idx, item in enumerate(items):
         try:
-            validate_status_transition(row.status, new_status)
-        except InvalidStatus as e:
-            return HttpResponseBadRequest(str(e))
-
-        # UPDATE atómico (sin re-consultar toda la fila)
-        updated = Order.objects.filter(pk=row.pk).update(
-            status=new_status,
-            version=models.F("version") + 1,
+            oid = item["id"]; new_status = item["status"]
+            expected = item.get("version"); meta = item.get("meta", {})
+            if not isinstance(oid, str) or not isinstance(new_status, str):
+                raise TypeError
+            if expected is not None:
+                expected = int(expected)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            results[idx] = _batch_item_error(item.get("id") if isinstance(item, dict) else None, 400, "invalid item")
+            continue
+        if oid in pending:
+            results[idx] = _batch_item_error(oid, 400, "duplicate id in batch")
+            continue
+        pending[oid] = (idx, new_status, expected, meta)
+
+    with transaction.atomic():
+        current = dict(
+            (oid, (status, version))
+            for oid, status, version in Order.objects.select_for_update()
+            .filter(pk__in=list(pending)).order_by("pk").values_list("id", "status", "version")
         )
 
-        # Releer solo los campos necesarios para responder y publicar
-        row.refresh_from_db(fields=["status", "version"])
+        by_status: dict[str, list[str]] = {}
+        events = []
+        for oid, (idx, new_status, expected, meta) in pending.items():
+            if oid not in current:
+                results[idx] = _batch_item_error(oid, 404, "order not found")
+                continue
+            status, version = current[oid]
+            if expected is not None and version != expected:
+                results[idx] = _batch_item_error(oid, 409, "version mismatch")
+                continue
+            try:
+                validate_status_transition(status, new_status)
+            except InvalidStatus as e:
+                results[idx] = _batch_item_error(oid, 400, str(e))
+                continue
+            by_status.setdefault(new_status, []).append(oid)
+            events.append(order_status_updated_message(oid, new_status, version + 1, meta))
+            results[idx] = {"id": oid, "ok": True, "code": 200, "status": new_status, "version": version + 1}
 
-    # Publicar evento EDA fuera de la transacción
-    publish_order_status_updated(row.id, row.status, row.version, meta=meta)
+        # Un UPDATE por estado destino (a lo sumo tantos como estados hay)
+        now = timezone.now()
+        for new_status, ids in by_status.items():
+            Order.objects.filter(pk__in=ids).update(
+                status=new_status,
+                version=models.F("version") + 1,
+                updated_at=now,
+            )
+        enqueue_many(events)
+        applied_rows = [(r["id"], r["status"], r["version"]) for r in results if r["ok"]]
+        transaction.on_commit(lambda: _on_status_committed(applied_rows))
 
-    # Respuesta JSON (rápida, sin incluir datos pesados)
-    return _json({"ok": True, "id": row.id, "status": row.status, "version": row.version})
\ No newline at end of file
+    for result in results:
+        _count_transition(result["code"], "batch")
+    applied = len(events)
+    return _json({"applied": applied, "failed": len(items) - applied, "results": results})
+
+
+@require_GET
+def watch_order(request, order_id: str):
+    """
+    Long-poll: GET /orders/<id>/watch?after_version=N[&timeout=s]
+    Responde apenas la version de la orden supera N (200 con la orden) o 304 al vencer
+    el timeout. La espera se alimenta de los eventos order.status.updated (commits de
+    este proceso + broker), no de consultas repetidas: hay una sola lectura inicial.
+    """
+    try:
+        after_version = int(request.GET.get("after_version", "-1"))
+        timeout = min(float(request.GET.get("timeout", "25")), WATCH_MAX_TIMEOUT)
+    except ValueError:
+        return HttpResponseBadRequest("invalid after_version/timeout")
+
+    ensure_broker_listener()
+    # Suscribirse antes de leer: un cambio entre la lectura y la espera no se pierde
+    q = watch_hub.subscribe([order_id])
+    try:
+        current = Order.objects.filter(pk=order_id).values_list("status", "version").first()
+        if current is None:
+            return HttpResponseNotFound("order not found")
+        if current[1] > after_version:
+            return _order_json(order_id, *current)
+        changed = watch_hub.wait(q, order_id, after_version, timeout)
+    finally:
+        watch_hub.unsubscribe([order_id], q)
+
+    if changed is None:
+        response = HttpResponseNotModified()
+        response["ETag"] = order_etag(order_id, current[1])
+        return response
+    return _order_json(order_id, *changed)
+
+
+def _sse(order_id: str, status: str, version: int) -> str:
+    data = json.dumps({"id": order_id, "status": status, "version": version}, ensure_ascii=False)
+    return f"event: order.status.updated\nid: {order_id}:{version}\ndata: {data}\n\n"
+
+
+@require_GET
+def watch_orders_stream(request):
+    """
+    Server-Sent Events: GET /orders:watch?ids=A,B,C
+    Envía primero el estado actual de cada orden y luego cada cambio de version.
+    El stream se cierra tras ORDERS_WATCH_STREAM_MAX_SECONDS (EventSource reconecta solo).
+    """
+    ids = [oid for oid in request.GET.get("ids", "").split(",") if oid]
+    if not ids or len(ids) > WATCH_STREAM_MAX_IDS:
+        return HttpResponseBadRequest(f"ids: entre 1 y {WATCH_STREAM_MAX_IDS} órdenes")
+
+    ensure_broker_listener()
+    q = watch_hub.subscribe(ids)
+
+    def stream():
+        try:
+            last_sent: dict[str, int] = {}
+            for oid, status, version in Order.objects.filter(pk__in=ids).values_list("id", "status", "version"):
+                last_sent[oid] = version
+                yield _sse(oid, status, version)
+
+            deadline = time.monotonic() + WATCH_STREAM_MAX_SECONDS
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    oid, status, version = q.get(timeout=min(WATCH_HEARTBEAT_SECONDS, remaining))
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                # El mismo cambio puede llegar por el commit local y por el broker
+                if version <= last_sent.get(oid, -1):
+                    continue
+                last_sent[oid] = version
+                yield _sse(oid, status, version)
+        finally:
+            watch_hub.unsubscribe(ids, q)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
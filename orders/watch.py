@@ -0,0 +1,119 @@
+# orders/watch.py
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import pika
+
+from . import publisher
+
+logger = logging.getLogger(__name__)
+
+# Escucha order.status.updated en RabbitMQ para enterarse de cambios hechos por otros procesos
+WATCH_FROM_BROKER = os.getenv("ORDERS_WATCH_BROKER", "1") == "1"
+# Eventos pendientes por suscriptor; si un cliente SSE no lee, se descartan los nuevos
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("ORDERS_WATCH_QUEUE_SIZE", "1000"))
+
+
+class OrderWatchHub:
+    """
+    Difusión en proceso de cambios de estado: cada suscriptor (long-poll o stream SSE)
+    tiene una cola y se registra por order_id. Se alimenta de los commits locales
+    (transaction.on_commit) y de los eventos order.status.updated del broker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, set[queue.Queue]] = {}
+
+    def subscribe(self, order_ids) -> queue.Queue:
+        q: queue.Queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            for oid in order_ids:
+                self._subscribers.setdefault(oid, set()).add(q)
+        return q
+
+    def unsubscribe(self, order_ids, q: queue.Queue) -> None:
+        with self._lock:
+            for oid in order_ids:
+                subs = self._subscribers.get(oid)
+                if subs is None:
+                    continue
+                subs.discard(q)
+                if not subs:
+                    del self._subscribers[oid]
+
+    def publish(self, order_id: str, status: str, version: int) -> None:
+        with self._lock:
+            subs = list(self._subscribers.get(order_id, ()))
+        for q in subs:
+            try:
+                q.put_nowait((order_id, status, int(version)))
+            except queue.Full:
+                pass
+
+    def wait(self, q: queue.Queue, order_id: str, after_version: int, timeout: float) -> tuple[str, int] | None:
+        """Espera en q un evento de order_id con version > after_version; None si vence el timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                oid, status, version = q.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if oid == order_id and version > after_version:
+                return status, version
+
+
+watch_hub = OrderWatchHub()
+
+_listener_lock = threading.Lock()
+_listener_started = False
+
+
+def ensure_broker_listener() -> None:
+    """Arranca (una vez por proceso) el hilo que pasa order.status.updated del broker al hub."""
+    global _listener_started
+    if not (WATCH_FROM_BROKER and publisher.RABBIT_HOST) or _listener_started:
+        return
+    with _listener_lock:
+        if _listener_started:
+            return
+        threading.Thread(target=_listen_broker, name="orders-watch-listener", daemon=True).start()
+        _listener_started = True
+
+
+def _listen_broker() -> None:
+    backoff = 1.0
+    while True:
+        conn = None
+        try:
+            conn = pika.BlockingConnection(publisher._connection_parameters())
+            ch = conn.channel()
+            ch.exchange_declare(exchange=publisher.EXCHANGE, exchange_type="topic", durable=True)
+            # Cola exclusiva por proceso: cada worker web recibe todos los cambios
+            qname = ch.queue_declare(queue="", exclusive=True, auto_delete=True).method.queue
+            # ".#" acepta la key con o sin sufijo de partición (.pNN)
+            ch.queue_bind(exchange=publisher.EXCHANGE, queue=qname, routing_key="order.status.updated.#")
+            backoff = 1.0
+            for _method, _props, body in ch.consume(qname, auto_ack=True):
+                try:
+                    event = json.loads(body)
+                    watch_hub.publish(event["order_id"], event["new_status"], event["version"])
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning("Evento inválido: %s", e)
+        except Exception:
+            logger.exception("Listener desconectado; reintento en %.0fs", backoff)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30.0)
@@ -0,0 +1,35 @@
+"""Shared Django bootstrap for the benchmark scripts.
+
+By default the benchmarks run against a throwaway SQLite file so they work on a
+laptop without the RDS instance. Set BENCH_DB=settings to use the database
+configured in monitoring/settings.py instead (e.g. a local Postgres).
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DB = os.getenv("BENCH_DB", "sqlite")
+
+
+def setup() -> None:
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "monitoring.settings")
+
+    import django
+    from django.conf import settings
+
+    if BENCH_DB == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.sqlite3")
+        # IMMEDIATE transactions + busy timeout: concurrent writers queue instead of failing with "locked"
+        settings.DATABASES["default"] = {
+            "ENGINE": "django.db.backends.sqlite3", "NAME": path,
+            "OPTIONS": {"timeout": 30, "transaction_mode": "IMMEDIATE"},
+        }
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
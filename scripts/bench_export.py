@@ -0,0 +1,54 @@
+"""Benchmark: streaming measurement export throughput and memory.
+
+Seeds BENCH_ROWS measurements (default 200000) through bulk ingestion, then
+drains GET /measurements/export/ through the Django test client for CSV, NDJSON
+and gzip, reporting MB/s and the tracemalloc peak of the streaming phase (which
+should not grow with the row count).
+
+    BENCH_ROWS=500000 python3 scripts/bench_export.py
+"""
+from __future__ import annotations
+
+import os
+import time
+import tracemalloc
+
+import _bench_django
+
+ROWS = int(os.getenv("BENCH_ROWS", "200000"))
+
+
+def main() -> None:
+    _bench_django.setup()
+
+    from django.test import Client
+
+    from measurements.logic.logic_measurement import ingest_measurements
+    from variables.models import Variable
+
+    variables = [Variable.objects.create(name=f"var-{i}") for i in range(10)]
+    ingest_measurements(
+        {"variable": variables[i % 10].id, "value": i * 0.5, "unit": "C", "place": f"room-{i % 7}"}
+        for i in range(ROWS)
+    )
+
+    client = Client()
+    print(f"[bench] {ROWS:,} rows, db={_bench_django.BENCH_DB}")
+    for label, query in (("csv", "format=csv"), ("ndjson", "format=ndjson"), ("csv+gzip", "format=csv&gzip=1")):
+        t0 = time.perf_counter()
+        response = client.get(f"/measurements/export/?{query}")
+        size = sum(len(piece) for piece in response.streaming_content)
+        elapsed = time.perf_counter() - t0
+
+        # Second pass under tracemalloc (which slows Python down) only for the memory peak
+        tracemalloc.start()
+        for _piece in client.get(f"/measurements/export/?{query}").streaming_content:
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {label:>9}: {size / 2**20 / elapsed:8.1f} MB/s  ({size / 2**20:7.1f} MB in {elapsed:5.2f} s,"
+              f" {ROWS / elapsed:10,.0f} rows/s, peak {peak / 2**20:5.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Benchmark: measurement ingestion through the HTML form path vs. bulk ingestion.
+
+* form: one MeasurementForm + create_measurement per sample (what measurementcreate does)
+* bulk: ingest_measurements over the same rows (what POST /measurements/ingest/ does)
+
+Knobs: BENCH_ROWS (default 20000), BENCH_FORM_ROWS (default 2000, the slow path
+is extrapolated from a smaller sample), BENCH_DB (see _bench_django).
+
+    python3 scripts/bench_ingest.py
+"""
+from __future__ import annotations
+
+import os
+import time
+
+import _bench_django
+
+ROWS = int(os.getenv("BENCH_ROWS", "20000"))
+FORM_ROWS = int(os.getenv("BENCH_FORM_ROWS", "2000"))
+
+
+def main() -> None:
+    _bench_django.setup()
+
+    from measurements.forms import MeasurementForm
+    from measurements.logic.logic_measurement import create_measurement, ingest_measurements
+    from variables.models import Variable
+
+    variables = [Variable.objects.create(name=f"var-{i}") for i in range(10)]
+    rows = [
+        {"variable": variables[i % len(variables)].id, "value": float(i), "unit": "C", "place": f"room-{i % 7}"}
+        for i in range(max(ROWS, FORM_ROWS))
+    ]
+
+    t0 = time.perf_counter()
+    for row in rows[:FORM_ROWS]:
+        form = MeasurementForm(row)
+        form.is_valid()
+        create_measurement(form)
+    form_rate = FORM_ROWS / (time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    result = ingest_measurements(rows[:ROWS])
+    bulk_rate = result["accepted"] / (time.perf_counter() - t0)
+
+    print(f"[bench] db={_bench_django.BENCH_DB}")
+    print(f"  form path: {form_rate:10.1f} rows/s  ({FORM_ROWS} rows)")
+    print(f"  bulk path: {bulk_rate:10.1f} rows/s  ({result['accepted']} rows, {result['rejected']} rejected)")
+    print(f"  speedup:   {bulk_rate / form_rate:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Benchmark: the orders hot path through Django's test client (no server needed).
+
+Scenarios (BENCH_SCENARIOS, comma separated, default all but replay unless
+BENCH_REPLAY is set):
+
+* create:     POST /orders with new ids
+* get:        GET /orders/<id> over the created orders
+* update:     PUT /orders/<id>/status (CREATED -> UPDATED) on distinct orders
+* contention: BENCH_WRITERS threads racing the same order through
+              UPDATED -> SHIPPED -> DELIVERED (per step one 200, the losers are
+              rejected with 400/409),
+              repeated on BENCH_HOT_ORDERS fresh orders
+* replay:     requests from a JSONL log (BENCH_REPLAY), one object per line:
+              {"method": "PUT", "path": "/orders/A1/status", "body": {...}, "headers": {...}}
+              "{order_id}" in a path is replaced by a created order; lines without
+              method/path are skipped.
+
+Each scenario reports throughput, latency percentiles and SQL queries per
+request. BENCH_OUTPUT writes the results as JSON; BENCH_BASELINE compares
+against such a file and exits with status 1 when throughput drops or p99 grows
+by more than BENCH_TOLERANCE (default 0.2), or when queries per request grow.
+
+Knobs: BENCH_ORDERS (default 2000), BENCH_CLIENTS (threads for create/get/
+update/replay, default 1), BENCH_WRITERS (default 8), BENCH_HOT_ORDERS
+(default 50), BENCH_DB (see _bench_django).
+
+    python3 scripts/bench_orders.py
+    BENCH_OUTPUT=baseline.json python3 scripts/bench_orders.py
+    BENCH_BASELINE=baseline.json python3 scripts/bench_orders.py
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+import _bench_django
+
+ORDERS = int(os.getenv("BENCH_ORDERS", "2000"))
+CLIENTS = int(os.getenv("BENCH_CLIENTS", "1"))
+WRITERS = int(os.getenv("BENCH_WRITERS", "8"))
+HOT_ORDERS = int(os.getenv("BENCH_HOT_ORDERS", "50"))
+REPLAY = os.getenv("BENCH_REPLAY", "")
+SCENARIOS = os.getenv("BENCH_SCENARIOS", "create,get,update,contention" + (",replay" if REPLAY else ""))
+OUTPUT = os.getenv("BENCH_OUTPUT", "")
+BASELINE = os.getenv("BENCH_BASELINE", "")
+TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.2"))
+
+HOT_STEPS = ("UPDATED", "SHIPPED", "DELIVERED")
+
+
+class Recorder:
+    """Latencies, status codes and query counts of one client thread."""
+
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.statuses: dict[str, int] = {}
+        self.queries = 0
+        self.errors = 0
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def request(self, client, method: str, path: str, body=None, headers=None) -> int | None:
+        data = body if isinstance(body, (str, bytes)) else (json.dumps(body) if body is not None else "")
+        t0 = time.perf_counter()
+        try:
+            status = client.generic(method, path, data=data, content_type="application/json",
+                                    headers=headers or {}).status_code
+            key = str(status)
+        except Exception as exc:  # noqa: BLE001
+            status, key = None, type(exc).__name__
+        self.latencies.append((time.perf_counter() - t0) * 1000.0)
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        if status is None or status >= 500:
+            self.errors += 1
+        return status
+
+
+def _client_thread(recorder: Recorder, work, barrier=None) -> None:
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    try:
+        with connection.execute_wrapper(recorder.count_query):
+            for method, path, body, headers in work:
+                if barrier is not None:
+                    barrier.wait()
+                recorder.request(client, method, path, body, headers)
+    finally:
+        connection.close()
+
+
+def run_threads(works, barrier=None) -> tuple[list[Recorder], float]:
+    recorders = [Recorder() for _ in works]
+    threads = [threading.Thread(target=_client_thread, args=(r, w, barrier)) for r, w in zip(recorders, works)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorders, time.perf_counter() - t0
+
+
+def split(requests, parts: int):
+    return [requests[i::parts] for i in range(parts)]
+
+
+def summarize(recorders: list[Recorder], seconds: float) -> dict:
+    latencies = sorted(ms for r in recorders for ms in r.latencies)
+    count = len(latencies)
+    statuses: dict[str, int] = {}
+    for r in recorders:
+        for key, n in r.statuses.items():
+            statuses[key] = statuses.get(key, 0) + n
+
+    def pct(p: float) -> float:
+        return round(latencies[min(count - 1, int(p / 100.0 * count))], 3) if count else 0.0
+
+    return {
+        "requests": count,
+        "errors": sum(r.errors for r in recorders),
+        "seconds": round(seconds, 3),
+        "throughput": round(count / seconds, 1) if seconds else 0.0,
+        "p50_ms": pct(50), "p90_ms": pct(90), "p99_ms": pct(99),
+        "max_ms": round(latencies[-1], 3) if count else 0.0,
+        "queries_per_request": round(sum(r.queries for r in recorders) / count, 2) if count else 0.0,
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+def load_replay(path: str, order_ids: list[str]) -> tuple[list, int]:
+    requests, skipped = [], 0
+    with open(path, encoding="utf-8") as fh:
+        for i, line in enumerate(fh):
+            try:
+                entry = json.loads(line)
+                method, target = entry["method"].upper(), entry["path"]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                skipped += 1
+                continue
+            if "{order_id}" in target and order_ids:
+                target = target.replace("{order_id}", order_ids[i % len(order_ids)])
+            requests.append((method, target, entry.get("body"), entry.get("headers")))
+    return requests, skipped
+
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    regressions = []
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        if before["throughput"] and current["throughput"] < before["throughput"] * (1 - TOLERANCE):
+            regressions.append(f"{name}: throughput {before['throughput']} -> {current['throughput']} req/s")
+        if before["p99_ms"] and current["p99_ms"] > before["p99_ms"] * (1 + TOLERANCE):
+            regressions.append(f"{name}: p99 {before['p99_ms']} -> {current['p99_ms']} ms")
+        if current["queries_per_request"] > before["queries_per_request"] + 0.01:
+            regressions.append(f"{name}: queries/request {before['queries_per_request']}"
+                               f" -> {current['queries_per_request']}")
+    return regressions
+
+
+def main() -> None:
+    _bench_django.setup()
+    logging.getLogger("django.request").setLevel(logging.ERROR)  # 4xx from the races are expected
+    scenarios = [s.strip() for s in SCENARIOS.split(",") if s.strip()]
+    run = uuid.uuid4().hex[:6]
+    ids = [f"B{run}-{i}" for i in range(ORDERS)]
+    results: dict = {"db": _bench_django.BENCH_DB, "orders": ORDERS, "clients": CLIENTS,
+                     "writers": WRITERS, "scenarios": {}}
+
+    def scenario(name: str, works, barrier=None) -> None:
+        recorders, seconds = run_threads(works, barrier)
+        results["scenarios"][name] = summarize(recorders, seconds)
+
+    # create always runs (the other scenarios need the orders); it is only reported if requested
+    create = [("POST", "/orders", {"id": oid, "status": "CREATED"}, None) for oid in ids]
+    scenario("create", split(create, CLIENTS))
+    if "create" not in scenarios:
+        del results["scenarios"]["create"]
+    if "get" in scenarios:
+        scenario("get", split([("GET", f"/orders/{oid}", None, None) for oid in ids], CLIENTS))
+    if "update" in scenarios:
+        scenario("update", split([("PUT", f"/orders/{oid}/status", {"status": "UPDATED"}, None)
+                                  for oid in ids], CLIENTS))
+    if "contention" in scenarios:
+        hot = [f"H{run}-{i}" for i in range(HOT_ORDERS)]
+        run_threads([[("POST", "/orders", {"id": oid, "status": "CREATED"}, None) for oid in hot]])
+        steps = [("PUT", f"/orders/{oid}/status", {"status": status}, None) for oid in hot for status in HOT_STEPS]
+        scenario("contention", [steps] * WRITERS, threading.Barrier(WRITERS))
+    if "replay" in scenarios and REPLAY:
+        requests, skipped = load_replay(REPLAY, ids)
+        scenario("replay", split(requests, CLIENTS))
+        results["scenarios"]["replay"]["skipped_lines"] = skipped
+
+    print(f"[bench] db={results['db']} orders={ORDERS} clients={CLIENTS} writers={WRITERS}")
+    print(f"  {'scenario':12} {'reqs':>7} {'err':>5} {'req/s':>9} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'q/req':>6}")
+    for name, s in results["scenarios"].items():
+        print(f"  {name:12} {s['requests']:7d} {s['errors']:5d} {s['throughput']:9.1f} {s['p50_ms']:8.2f}"
+              f" {s['p90_ms']:8.2f} {s['p99_ms']:8.2f} {s['max_ms']:8.2f} {s['queries_per_request']:6.2f}"
+              f"  {s['statuses']}")
+
+    if OUTPUT:
+        with open(OUTPUT, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"  results written to {OUTPUT}")
+    if BASELINE:
+        with open(BASELINE, encoding="utf-8") as fh:
+            regressions = compare(results, json.load(fh))
+        if regressions:
+            print(f"  REGRESSIONS vs {BASELINE} (tolerance {TOLERANCE:.0%}):")
+            for line in regressions:
+                print(f"    - {line}")
+            sys.exit(1)
+        print(f"  no regressions vs {BASELINE} (tolerance {TOLERANCE:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Benchmark: connect-per-event publishing vs. the persistent publisher, with
+publisher confirms and with AMQP transactions.
+
+Runs against a local broker stand-in (no RabbitMQ needed): ``pika.BlockingConnection``
+is replaced by a fake that charges a configurable round-trip time for every
+synchronous AMQP step, which is where the real cost of the old code lives.
+In confirm mode pika's BlockingChannel waits for the broker's ack after every
+``basic_publish`` (one round trip per message); in tx mode the messages go out
+unacknowledged and one ``tx_commit`` per batch waits for the broker, which also
+pays a per-commit cost on its side (BENCH_TX_COMMIT_MS).
+
+Knobs (environment variables):
+
+* BENCH_RTT_MS: simulated network round trip in milliseconds (default 1.0)
+* BENCH_EVENTS: events published per scenario (default 2000)
+* BENCH_BATCH: batch size used by the batched scenarios (default 50)
+* BENCH_TX_COMMIT_MS: extra broker-side time per tx_commit in milliseconds (default 0.5)
+
+Example::
+
+    BENCH_RTT_MS=0.5 BENCH_EVENTS=5000 python3 scripts/bench_publisher.py
+"""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RABBIT_HOST", "broker-stand-in")
+
+import pika  # noqa: E402
+
+from orders import publisher  # noqa: E402
+
+RTT = float(os.getenv("BENCH_RTT_MS", "1.0")) / 1000.0
+EVENTS = int(os.getenv("BENCH_EVENTS", "2000"))
+BATCH = int(os.getenv("BENCH_BATCH", "50"))
+TX_COMMIT = float(os.getenv("BENCH_TX_COMMIT_MS", "0.5")) / 1000.0
+
+
+class FakeChannel:
+    def __init__(self) -> None:
+        self.is_open = True
+        self.confirming = False
+
+    def exchange_declare(self, **_kwargs) -> None:
+        time.sleep(RTT)
+
+    def confirm_delivery(self) -> None:
+        time.sleep(RTT)
+        self.confirming = True
+
+    def tx_select(self) -> None:
+        time.sleep(RTT)
+
+    def tx_commit(self) -> None:
+        time.sleep(RTT + TX_COMMIT)
+
+    def basic_publish(self, **_kwargs) -> None:
+        # basic.publish is asynchronous on the wire; with confirms BlockingChannel waits for the ack
+        if self.confirming:
+            time.sleep(RTT)
+
+
+class FakeBlockingConnection:
+    """Charges TCP + AMQP handshake (start/tune/open) on connect and one RTT per sync call."""
+
+    def __init__(self, _params) -> None:
+        time.sleep(4 * RTT)
+
+    def channel(self) -> FakeChannel:
+        time.sleep(RTT)
+        return FakeChannel()
+
+    def close(self) -> None:
+        time.sleep(RTT)
+
+
+def legacy_publish(routing_key: str, payload: dict) -> None:
+    """Copy of the former connect-per-event ``_publish``."""
+    conn = pika.BlockingConnection(publisher._connection_parameters())
+    ch = conn.channel()
+    ch.exchange_declare(exchange=publisher.EXCHANGE, exchange_type="topic", durable=True)
+    ch.basic_publish(
+        exchange=publisher.EXCHANGE,
+        routing_key=routing_key,
+        body=json.dumps(payload).encode("utf-8"),
+        properties=pika.BasicProperties(content_type="application/json", delivery_mode=2),
+    )
+    conn.close()
+
+
+def _payload(i: int) -> dict:
+    return {"order_id": f"ORD-{i:06}", "new_status": "UPDATED", "version": i}
+
+
+def run(name: str, fn: Callable[[List[int]], None], batch: int) -> dict:
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for start in range(0, EVENTS, batch):
+        ids = list(range(start, min(start + batch, EVENTS)))
+        t0 = time.perf_counter()
+        fn(ids)
+        elapsed = time.perf_counter() - t0
+        # the added latency is felt by every event of the batch
+        latencies.extend([elapsed] * len(ids))
+    total = time.perf_counter() - started
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return {"scenario": name, "events_per_sec": EVENTS / total, "p99_ms": p99 * 1000.0}
+
+
+def main() -> None:
+    pika.BlockingConnection = FakeBlockingConnection  # type: ignore[misc]
+    publishers = {mode: publisher.Publisher(confirm=mode) for mode in ("confirm", "tx")}
+
+    def batch_of(pub):
+        return lambda ids: pub.publish_batch([("order.status.updated", _payload(i)) for i in ids])
+
+    scenarios = [("connect-per-event", lambda ids: [legacy_publish("order.status.updated", _payload(i)) for i in ids], 1)]
+    for mode, pub in publishers.items():
+        scenarios.append((f"{mode}", batch_of(pub), 1))
+        scenarios.append((f"{mode}-batch{BATCH}", batch_of(pub), BATCH))
+    print(f"[bench] {EVENTS} events, simulated RTT {RTT * 1000:.2f} ms, tx_commit +{TX_COMMIT * 1000:.2f} ms, "
+          f"default mode={publisher.PUBLISH_CONFIRM}")
+    for name, fn, batch in scenarios:
+        result = run(name, fn, batch)
+        print(f"{result['scenario']:>22}: {result['events_per_sec']:10.1f} ev/s   p99 {result['p99_ms']:8.3f} ms")
+    for pub in publishers.values():
+        pub.close()
+
+
+if __name__ == "__main__":
+    main()
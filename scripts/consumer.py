@@ -1,5 +1,54 @@
 # scripts/consumer.py
-import os, pika
+"""Servicio consumidor de eventos de órdenes.
+
+- CONSUMER_WORKERS procesos, cada uno con su conexión, repartiéndose las particiones
+  (o compitiendo por una sola cola durable con CONSUMER_PARTITIONS=0).
+- QoS con ventana de prefetch (CONSUMER_PREFETCH) y acks por lote con basic_ack(multiple=True)
+  cada CONSUMER_ACK_BATCH mensajes o CONSUMER_ACK_INTERVAL segundos.
+- Handlers por routing key, enchufables: CONSUMER_HANDLERS="order.created=paquete.modulo:funcion,..."
+  Cada handler recibe la lista de payloads (dict) del lote y la routing key sin sufijo de
+  partición. Si lanza, se reintenta de a un mensaje para aislar los que fallan: solo esos
+  vuelven a la cola (nack individual) y el resto se confirma. Los eventos posteriores de
+  la misma orden en el lote se devuelven con él para no procesarlos fuera de orden.
+  Si DJANGO_SETTINGS_MODULE está definido se hace django.setup() antes de importar handlers.
+- Mensajes venenosos: un body que no es un objeto JSON se rechaza al llegar, y un mensaje
+  que falló CONSUMER_MAX_ATTEMPTS veces (contadas en el worker, por el flag redelivered
+  y por el header x-death) se rechaza con basic_reject(requeue=False). Las colas se
+  declaran con x-dead-letter-exchange=CONSUMER_DEAD_LETTER (por defecto "<CONSUMER_QUEUE>.dead",
+  con una cola durable del mismo nombre) para que esos mensajes queden ahí y no se pierdan.
+  Colas ya existentes sin ese argumento: borrarlas o poner el dead-letter por policy y
+  definir CONSUMER_DEAD_LETTER="" (con "" no se declara nada).
+- CONSUMER_ORDERING=memory|db: los eventos pasan por orders.event_ordering.EventSequencer
+  (dedupe y orden por (order_id, version)); con "db" las marcas se guardan en EventWatermark
+  bajo el nombre CONSUMER_QUEUE. Los mensajes retenidos esperando un hueco no se confirman:
+  el ack llega solo hasta el delivery tag anterior al retenido más viejo.
+- Particiones (CONSUMER_PARTITIONS, por defecto RABBIT_PARTITIONS; 0 = una sola cola, por
+  defecto): con RABBIT_PARTITIONS>0 el publisher agrega el sufijo .pNN según crc32(order_id)
+  y hay que usar el mismo número aquí. Cada partición tiene su cola
+  durable "<CONSUMER_QUEUE>.pNN" con x-single-active-consumer, así una orden la procesa
+  un solo consumidor a la vez y en orden.
+  Los workers (de cualquier máquina) se anuncian cada CONSUMER_HEARTBEAT segundos por el
+  exchange fanout "<CONSUMER_QUEUE>.members"; cada uno consume las particiones que le tocan
+  por rendezvous hashing sobre los miembros vivos. Si alguien entra o sale (o deja de
+  latir por 3 heartbeats) se recalcula: solo se mueven las particiones del que cambió, y
+  antes de soltar una se procesa y confirma lo recibido. Single-active-consumer cubre la
+  ventana en que dos miembros todavía no coinciden en quién es el dueño.
+- SIGINT/SIGTERM: cada worker confirma lo procesado, anuncia su salida, cancela el consumo y cierra.
+- Cada CONSUMER_STATS_INTERVAL segundos cada worker reporta ev/s, backlog de la cola y
+  la edad del último mensaje (propiedad timestamp que pone el publisher).
+"""
+import importlib
+import json
+import multiprocessing
+import os
+import re
+import signal
+import socket
+import time
+import zlib
+from collections import OrderedDict
+
+import pika
 
 RABBIT_HOST   = os.getenv("RABBIT_HOST", "127.0.0.1")
 RABBIT_PORT   = int(os.getenv("RABBIT_PORT", "5672"))
@@ -8,37 +57,394 @@ RABBIT_PASS   = os.getenv("RABBIT_PASS", "guest")
 RABBIT_VHOST  = os.getenv("RABBIT_VHOST", "/")
 EXCHANGE      = os.getenv("RABBIT_EXCHANGE", "order_events")
 
+QUEUE          = os.getenv("CONSUMER_QUEUE", "order_events.consumer")
+WORKERS        = int(os.getenv("CONSUMER_WORKERS", "1"))
+PREFETCH       = int(os.getenv("CONSUMER_PREFETCH", "500"))
+ACK_BATCH      = int(os.getenv("CONSUMER_ACK_BATCH", "100"))
+ACK_INTERVAL   = float(os.getenv("CONSUMER_ACK_INTERVAL", "0.2"))
+STATS_INTERVAL = float(os.getenv("CONSUMER_STATS_INTERVAL", "5"))
+HANDLERS_RAW   = os.getenv("CONSUMER_HANDLERS", "")
+ORDERING       = os.getenv("CONSUMER_ORDERING", "")
+PARTITIONS     = int(os.getenv("CONSUMER_PARTITIONS", os.getenv("RABBIT_PARTITIONS", "0")))
+HEARTBEAT      = float(os.getenv("CONSUMER_HEARTBEAT", "2"))
+MAX_ATTEMPTS   = int(os.getenv("CONSUMER_MAX_ATTEMPTS", "5"))
+DEAD_LETTER    = os.getenv("CONSUMER_DEAD_LETTER", f"{QUEUE}.dead")
+MEMBERS_EXCHANGE = f"{QUEUE}.members"
+# Mensajes con fallos recientes cuyo conteo de intentos se recuerda
+ATTEMPTS_MAX_KEYS = 10000
+# Motivo de los eventos devueltos porque falló uno anterior de su orden (no cuenta como intento)
+AFTER_FAILED = "falló un evento anterior de la misma orden"
+
 BIND_KEYS = ["order.created", "order.status.updated"]  # añade más si usas otras
 
-def main():
-    creds = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS)
-    params = pika.ConnectionParameters(
+
+_PARTITION_SUFFIX = re.compile(r"\.p\d+$")
+
+
+def base_key(routing_key: str) -> str:
+    """order.status.updated.p07 -> order.status.updated"""
+    return _PARTITION_SUFFIX.sub("", routing_key)
+
+
+def partition_queue(partition: int) -> str:
+    return f"{QUEUE}.p{partition:02d}"
+
+
+def owned_partitions(member: str, members, partitions: int = PARTITIONS) -> set[int]:
+    """Rendezvous hashing: cada partición es del miembro con mayor hash(miembro, partición)."""
+    members = sorted(members)
+    return {
+        p for p in range(partitions)
+        if max(members, key=lambda m: zlib.crc32(f"{m}:{p}".encode("utf-8"))) == member
+    }
+
+
+class Membership:
+    """Miembros vivos según los heartbeats recibidos; uno se da por caído tras 3 heartbeats sin noticias."""
+
+    def __init__(self, member_id: str, ttl: float = 3 * HEARTBEAT):
+        self.member_id = member_id
+        self.ttl = ttl
+        self.seen = {member_id: time.monotonic()}
+
+    def heard(self, body: bytes) -> None:
+        try:
+            message = json.loads(body)
+            member = message["member"]
+        except (ValueError, KeyError, TypeError):
+            return
+        if member == self.member_id:
+            return
+        if message.get("leave"):
+            self.seen.pop(member, None)
+        else:
+            self.seen[member] = time.monotonic()
+
+    def live(self) -> frozenset:
+        now = time.monotonic()
+        for member, last in list(self.seen.items()):
+            if member != self.member_id and now - last > self.ttl:
+                del self.seen[member]
+        return frozenset(self.seen)
+
+
+def print_events(events, routing_key):
+    """Handler por defecto: imprime cada evento."""
+    for event in events:
+        print(f"[x] {routing_key} {json.dumps(event, ensure_ascii=False)}")
+
+
+def load_handlers(raw: str) -> dict:
+    handlers = {key: print_events for key in BIND_KEYS}
+    entries = [entry.strip() for entry in raw.split(",") if entry.strip()]
+    if entries and os.getenv("DJANGO_SETTINGS_MODULE"):
+        import django
+        django.setup()
+    for entry in entries:
+        routing_key, target = entry.split("=", 1)
+        module_name, func_name = target.split(":", 1)
+        handlers[routing_key.strip()] = getattr(importlib.import_module(module_name), func_name)
+    return handlers
+
+
+def build_sequencer():
+    if not ORDERING:
+        return None
+    if os.getenv("DJANGO_SETTINGS_MODULE"):
+        import django
+        django.setup()
+    from orders.event_ordering import EventSequencer, WatermarkStore
+    return EventSequencer(store=WatermarkStore(QUEUE) if ORDERING == "db" else None)
+
+
+def previous_attempts(method, props) -> int:
+    """Intentos anteriores que se pueden deducir del mensaje: x-death del broker o el flag redelivered."""
+    deaths = (props.headers or {}).get("x-death") or []
+    count = sum(int(death.get("count", 0)) for death in deaths if isinstance(death, dict))
+    return max(count, 1 if method.redelivered else 0)
+
+
+def queue_arguments(single_active: bool) -> dict:
+    arguments = {"x-single-active-consumer": True} if single_active else {}
+    if DEAD_LETTER:
+        arguments["x-dead-letter-exchange"] = DEAD_LETTER
+    return arguments
+
+
+def connection_parameters() -> pika.ConnectionParameters:
+    return pika.ConnectionParameters(
         host=RABBIT_HOST, port=RABBIT_PORT, virtual_host=RABBIT_VHOST,
-        credentials=creds, heartbeat=30, blocked_connection_timeout=10
+        credentials=pika.PlainCredentials(RABBIT_USER, RABBIT_PASS),
+        heartbeat=30, blocked_connection_timeout=10,
     )
-    conn = pika.BlockingConnection(params)
-    ch = conn.channel()
-    ch.exchange_declare(exchange=EXCHANGE, exchange_type="topic", durable=True)
-
-    # Cola exclusiva y autodelete para inspección
-    q = ch.queue_declare(queue="", exclusive=True, auto_delete=True)
-    qname = q.method.queue
-
-    for key in BIND_KEYS:
-        ch.queue_bind(exchange=EXCHANGE, queue=qname, routing_key=key)
-
-    print(f"👂 Escuchando {BIND_KEYS} en {EXCHANGE} (cola {qname}). Ctrl+C para salir.")
-    def on_msg(ch_, method, props, body):
-        print(f"[x] {method.routing_key} {body.decode('utf-8')}")
-        ch_.basic_ack(delivery_tag=method.delivery_tag)
-
-    ch.basic_consume(queue=qname, on_message_callback=on_msg, auto_ack=False)
-    try:
-        ch.start_consuming()
-    except KeyboardInterrupt:
-        print("\nCerrando…")
-        ch.stop_consuming()
-        conn.close()
+
+
+class Worker:
+    def __init__(self, index: int, handlers: dict, sequencer=None):
+        self.name = f"worker-{index}"
+        self.member_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.membership = Membership(self.member_id)
+        self.members = frozenset()
+        self.consumers = {}        # cola -> consumer tag
+        self.handlers = handlers
+        self.sequencer = sequencer
+        self.stopping = False
+        self.pending = []          # (routing_key, payload, delivery_tag) sin procesar
+        self.delivered = 0         # delivery tag más alto recibido
+        self.outstanding = {}      # delivery tag sin confirmar -> (clave del mensaje, intentos previos)
+        self.attempts = OrderedDict()  # clave del mensaje -> intentos fallidos vistos por este worker
+        self.processed = 0
+        self.failed = 0
+        self.dead = 0
+        self.last_timestamp = None
+
+    def stop(self, *_args):
+        self.stopping = True
+
+    def flush(self, ch) -> None:
+        """
+        Entrega el lote a los handlers (agrupado por routing key) y confirma con un ack
+        multiple lo procesado; los mensajes que fallan se devuelven o rechazan de a uno.
+        """
+        seq = self.sequencer
+        if not self.pending and not (seq and seq.held_count()):
+            return
+        batch = self.pending
+        if seq:
+            ready = seq.accept([(payload, (tag, routing_key)) for routing_key, payload, tag in self.pending])
+            batch = [(routing_key, payload, tag) for payload, (tag, routing_key) in ready]
+        self.pending = []
+
+        groups: dict[str, list] = {}
+        for routing_key, payload, tag in batch:
+            groups.setdefault(base_key(routing_key), []).append((payload, tag))
+        failed: dict = {}          # delivery tag -> error
+        broken: set[str] = set()   # órdenes con un evento fallido en este lote
+        for routing_key, entries in groups.items():
+            handler = self.handlers.get(routing_key, print_events)
+            entries = self.skip_broken(entries, broken, failed)
+            if not entries:
+                continue
+            try:
+                handler([payload for payload, _ in entries], routing_key)
+            except Exception:
+                # Aislar: de a un mensaje, así solo vuelven a la cola los que fallan
+                for payload, tag in entries:
+                    if payload.get("order_id") in broken:
+                        failed[tag] = AFTER_FAILED
+                        continue
+                    try:
+                        handler([payload], routing_key)
+                    except Exception as e:
+                        failed[tag] = e
+                        self.mark_broken(payload, broken)
+        try:
+            if seq:
+                seq.commit()
+        except Exception as e:
+            # No se pudieron fijar las marcas: todo lo no confirmado vuelve a la cola (at-least-once)
+            print(f"[{self.name}] Error guardando marcas: {e!r}; se devuelve el lote")
+            seq.rollback()
+            self.requeue_outstanding(ch)
+            self.failed += len(batch)
+            return
+
+        for tag, error in failed.items():
+            self.settle_failed(ch, tag, error)
+        self.failed += len(failed)
+        self.processed += len(batch) - len(failed)
+        top = self.delivered
+        if seq and seq.min_held_tag():
+            top = seq.min_held_tag()[0] - 1
+        self.ack_through(ch, top)
+
+    @staticmethod
+    def skip_broken(entries, broken, failed) -> list:
+        kept = []
+        for payload, tag in entries:
+            if payload.get("order_id") in broken:
+                failed[tag] = AFTER_FAILED
+            else:
+                kept.append((payload, tag))
+        return kept
+
+    def mark_broken(self, payload: dict, broken: set) -> None:
+        order_id = payload.get("order_id")
+        if order_id is None:
+            return
+        broken.add(order_id)
+        if self.sequencer and payload.get("version") is not None:
+            self.sequencer.reject(order_id, int(payload["version"]))
+
+    def settle_failed(self, ch, tag: int, error) -> None:
+        """nack individual con requeue, o basic_reject(requeue=False) al agotar los intentos."""
+        key, previous = self.outstanding.pop(tag)
+        if error is AFTER_FAILED:
+            ch.basic_nack(delivery_tag=tag, multiple=False, requeue=True)
+            return
+        attempts = max(previous, self.attempts.pop(key, 0)) + 1
+        if attempts >= MAX_ATTEMPTS:
+            ch.basic_reject(delivery_tag=tag, requeue=False)
+            self.dead += 1
+            print(f"[{self.name}] Mensaje descartado tras {attempts} intentos ({error!r})"
+                  f" -> {DEAD_LETTER or 'sin dead-letter'}")
+            return
+        self.attempts[key] = attempts
+        while len(self.attempts) > ATTEMPTS_MAX_KEYS:
+            self.attempts.popitem(last=False)
+        ch.basic_nack(delivery_tag=tag, multiple=False, requeue=True)
+
+    def ack_through(self, ch, top: int) -> None:
+        """ack multiple hasta el tag pendiente más alto <= top (los ya rechazados no cuentan)."""
+        done = [tag for tag in self.outstanding if tag <= top]
+        if not done:
+            return
+        ch.basic_ack(delivery_tag=max(done), multiple=True)
+        for tag in done:
+            key, _ = self.outstanding.pop(tag)
+            self.attempts.pop(key, None)
+
+    def requeue_outstanding(self, ch) -> None:
+        if self.outstanding:
+            ch.basic_nack(delivery_tag=max(self.outstanding), multiple=True, requeue=True)
+            self.outstanding.clear()
+
+    def on_message(self, ch, method, props, body) -> None:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            # Nunca se va a poder procesar: directo al dead-letter en vez de reintentarlo
+            ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
+            self.dead += 1
+            print(f"[{self.name}] Body inválido en {method.routing_key}; rechazado -> {DEAD_LETTER or 'sin dead-letter'}")
+            return
+        key = (method.routing_key, zlib.crc32(body))
+        self.outstanding[method.delivery_tag] = (key, previous_attempts(method, props))
+        self.pending.append((method.routing_key, payload, method.delivery_tag))
+        self.delivered = method.delivery_tag
+        if props.timestamp:
+            self.last_timestamp = props.timestamp
+
+    def announce(self, ch, leave: bool = False) -> None:
+        body = {"member": self.member_id, "leave": True} if leave else {"member": self.member_id}
+        ch.basic_publish(exchange=MEMBERS_EXCHANGE, routing_key="", body=json.dumps(body).encode("utf-8"))
+
+    def rebalance(self, ch) -> None:
+        """Ajusta las colas consumidas a las particiones que le tocan con los miembros actuales."""
+        members = self.membership.live()
+        if members == self.members:
+            return
+        self.members = members
+        wanted = {partition_queue(p) for p in owned_partitions(self.member_id, members)}
+        released = [queue for queue in self.consumers if queue not in wanted]
+        if released:
+            # Lo recibido se procesa y confirma antes de soltar la partición; lo retenido vuelve a la cola
+            self.flush(ch)
+            if self.sequencer and self.sequencer.held_count():
+                self.sequencer.rollback()
+                self.requeue_outstanding(ch)
+            for queue in released:
+                ch.basic_cancel(self.consumers.pop(queue))
+        for queue in sorted(wanted - set(self.consumers)):
+            self.consumers[queue] = ch.basic_consume(queue, self.on_message)
+        print(f"[{self.name}] {len(members)} miembros; consumo {len(self.consumers)}/{PARTITIONS} particiones")
+
+    def report(self, ch, elapsed: float, processed_since: int) -> None:
+        backlog = sum(ch.queue_declare(queue=queue, durable=True, passive=True).method.message_count
+                      for queue in self.consumers)
+        age = f"{time.time() - self.last_timestamp:.1f}s" if self.last_timestamp else "-"
+        ordering = f"  ordering={self.sequencer.stats()}" if self.sequencer else ""
+        print(f"[{self.name}] {processed_since / elapsed:8.1f} ev/s  total={self.processed}"
+              f"  failed={self.failed}  dead={self.dead}  backlog={backlog}  last_age={age}{ordering}")
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        conn = pika.BlockingConnection(connection_parameters())
+        ch = conn.channel()
+        ch.exchange_declare(exchange=EXCHANGE, exchange_type="topic", durable=True)
+        ch.basic_qos(prefetch_count=PREFETCH)
+        if DEAD_LETTER:
+            ch.exchange_declare(exchange=DEAD_LETTER, exchange_type="fanout", durable=True)
+            ch.queue_declare(queue=DEAD_LETTER, durable=True)
+            ch.queue_bind(exchange=DEAD_LETTER, queue=DEAD_LETTER)
+        if PARTITIONS:
+            for p in range(PARTITIONS):
+                ch.queue_declare(queue=partition_queue(p), durable=True, arguments=queue_arguments(True))
+                for key in BIND_KEYS:
+                    ch.queue_bind(exchange=EXCHANGE, queue=partition_queue(p), routing_key=f"{key}.p{p:02d}")
+            ch.exchange_declare(exchange=MEMBERS_EXCHANGE, exchange_type="fanout")
+            members_queue = ch.queue_declare(queue="", exclusive=True, auto_delete=True).method.queue
+            ch.queue_bind(exchange=MEMBERS_EXCHANGE, queue=members_queue)
+            ch.basic_consume(members_queue, lambda _ch, _m, _p, body: self.membership.heard(body), auto_ack=True)
+            self.announce(ch)
+            self.rebalance(ch)
+        else:
+            ch.queue_declare(queue=QUEUE, durable=True, arguments=queue_arguments(False))
+            for key in BIND_KEYS:
+                # ".#" acepta la key con o sin sufijo de partición
+                ch.queue_bind(exchange=EXCHANGE, queue=QUEUE, routing_key=f"{key}.#")
+            self.consumers[QUEUE] = ch.basic_consume(QUEUE, self.on_message)
+
+        last_flush = last_report = last_beat = time.monotonic()
+        reported = 0
+        try:
+            while not self.stopping:
+                conn.process_data_events(time_limit=ACK_INTERVAL)
+                now = time.monotonic()
+                if len(self.pending) >= ACK_BATCH or now - last_flush >= ACK_INTERVAL:
+                    self.flush(ch)
+                    last_flush = now
+                if PARTITIONS and now - last_beat >= HEARTBEAT:
+                    self.announce(ch)
+                    self.rebalance(ch)
+                    last_beat = now
+                if now - last_report >= STATS_INTERVAL:
+                    self.report(ch, now - last_report, self.processed - reported)
+                    reported = self.processed
+                    last_report = now
+        finally:
+            try:
+                self.flush(ch)
+                if PARTITIONS:
+                    self.announce(ch, leave=True)
+                for tag in self.consumers.values():
+                    ch.basic_cancel(tag)  # devuelve a la cola lo que quedó en el prefetch sin entregar
+                conn.close()
+            except Exception as e:
+                print(f"[{self.name}] Error cerrando: {e!r}")
+            print(f"[{self.name}] Cerrado; {self.processed} eventos procesados")
+
+
+def run_worker(index: int) -> None:
+    Worker(index, load_handlers(HANDLERS_RAW), build_sequencer()).run()
+
+
+def main():
+    queues = f"{PARTITIONS} particiones {QUEUE}.pNN" if PARTITIONS else f"cola {QUEUE}"
+    print(f"👂 {WORKERS} workers escuchando {BIND_KEYS} en {EXCHANGE} ({queues}, prefetch {PREFETCH}, "
+          f"ack cada {ACK_BATCH} msgs / {ACK_INTERVAL}s). Ctrl+C para salir.")
+    if WORKERS == 1:
+        run_worker(0)
+        return
+
+    processes = [multiprocessing.Process(target=run_worker, args=(i,), name=f"worker-{i}") for i in range(WORKERS)]
+    for p in processes:
+        p.start()
+
+    def shutdown(*_args):
+        for p in processes:
+            if p.is_alive():
+                p.terminate()  # SIGTERM: cada worker vacía su lote y cierra
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C llega directo a los hijos
+    for p in processes:
+        p.join()
+    print("\nCerrando…")
 
 if __name__ == "__main__":
     main()
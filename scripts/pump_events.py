@@ -1,4 +1,4 @@
-"""Utilities for generating synthetic traffic against the order service.
+r"""Utilities for generating synthetic traffic against the order service.
 
 The script keeps its original behaviour (publishing order events to RabbitMQ)
 while optionally issuing concurrent HTTP requests to the Django API. Two knobs
@@ -13,20 +13,48 @@ Any appearance of {order_id} will be substituted by a random live order tracked
 by the generator. If none are available yet the request is skipped. This allows
 mixing order-specific calls with general navigation (home page, measurements,
 etc.) while the RabbitMQ traffic keeps flowing.
+
+PUMP_MODE=open switches to an open-loop HTTP load generator (asyncio, no
+RabbitMQ). Requests are scheduled on a fixed arrival timeline of OPEN_RATE
+requests/s for OPEN_DURATION seconds (OPEN_ARRIVALS=uniform|poisson) no matter
+how slow the server gets, and latency is measured from the *intended* send
+time, so queueing caused by a slow server is counted instead of hidden
+(coordinated omission). Latencies go into log-linear HDR-style histograms; the
+run ends with p50/p90/p99/p99.9 per endpoint and a JSON summary written to
+OPEN_SUMMARY (default: stdout) for regression comparisons. OPEN_CONNECTIONS
+caps the keep-alive connections (waiting for one counts as latency).
+
+    PUMP_MODE=open OPEN_RATE=500 OPEN_DURATION=30 HTTP_BASE_URL=http://127.0.0.1:8080 \
+    HTTP_PATHS="POST:/orders,GET:/orders/{order_id},PUT:/orders/{order_id}/status" \
+    OPEN_SUMMARY=run.json python3 scripts/pump_events.py
+
+PUMP_PROCESSES=N (N > 1) publishes from N processes, each with its own
+connection and channel, its own share of EVENTS_RATE (0 = as fast as
+possible) and its own live-order set; per-event printing is replaced by
+aggregated per-second stats. PUMP_DURATION bounds the run (0 = until Ctrl+C)
+and PUMP_CREATE_RATIO sets the share of creations among events.
+
+Live orders are kept in an array-backed set (O(1) add, random sample and
+swap-remove); orders reaching DELIVERED or CANCELLED are evicted.
 """
 from __future__ import annotations
 
+import asyncio
 import json
+import multiprocessing
 import os
 import random
 import string
+import signal
 import threading
 import time
+import zlib
+from array import array
 from typing import Dict, List, Tuple
 
 import pika
 import requests
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
 
 RABBIT_HOST = os.getenv("RABBIT_HOST")
 RABBIT_PORT = int(os.getenv("RABBIT_PORT", "5672"))
@@ -35,12 +63,26 @@ RABBIT_PASS = os.getenv("RABBIT_PASS", "guest")
 RABBIT_VHOST = os.getenv("RABBIT_VHOST", "/")
 EXCHANGE = os.getenv("RABBIT_EXCHANGE", "order_events")
 EVENT_RATE = float(os.getenv("EVENTS_RATE", "2"))
+# Same partition suffix as orders.publisher (.pNN from crc32(order_id)); 0 disables it
+PARTITIONS = int(os.getenv("RABBIT_PARTITIONS", "0"))
 
 HTTP_BASE_URL = os.getenv("HTTP_BASE_URL")
 HTTP_PATHS_RAW = os.getenv("HTTP_PATHS", "").strip()
 HTTP_WORKERS = int(os.getenv("HTTP_WORKERS", "2"))
 HTTP_DELAY = float(os.getenv("HTTP_SLEEP", "0.3"))
 
+PUMP_MODE = os.getenv("PUMP_MODE", "closed")
+PUMP_PROCESSES = int(os.getenv("PUMP_PROCESSES", "1"))
+PUMP_DURATION = float(os.getenv("PUMP_DURATION", "0"))
+PUMP_CREATE_RATIO = float(os.getenv("PUMP_CREATE_RATIO", "0.5"))
+PUMP_STATS_INTERVAL = float(os.getenv("PUMP_STATS_INTERVAL", "1"))
+OPEN_RATE = float(os.getenv("OPEN_RATE", "100"))
+OPEN_DURATION = float(os.getenv("OPEN_DURATION", "30"))
+OPEN_ARRIVALS = os.getenv("OPEN_ARRIVALS", "uniform")
+OPEN_CONNECTIONS = int(os.getenv("OPEN_CONNECTIONS", "256"))
+OPEN_TIMEOUT = float(os.getenv("OPEN_TIMEOUT", "10"))
+OPEN_SUMMARY = os.getenv("OPEN_SUMMARY", "")
+
 STATUSES_FLOW = {
     "CREATED": ["UPDATED", "CANCELLED", "SHIPPED"],
     "UPDATED": ["SHIPPED", "CANCELLED"],
@@ -50,6 +92,69 @@ STATUSES_FLOW = {
 }
 
 
+STATUS_NAMES = list(STATUSES_FLOW)
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+TERMINAL_STATUSES = {name for name, nxt in STATUSES_FLOW.items() if not nxt}
+
+
+class LiveOrders:
+    """Orders that can still change status, with O(1) add, random sample and removal.
+
+    Ids live in a list and statuses/versions in parallel compact arrays; a dict maps
+    id -> position. Removing swaps the last element into the hole. Orders that reach
+    a terminal status are evicted, so the set only holds orders worth updating.
+    """
+
+    def __init__(self) -> None:
+        self.ids: List[str] = []
+        self.status = array("B")
+        self.version = array("I")
+        self.pos: Dict[str, int] = {}
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, order_id: str, status: str = "CREATED", version: int = 0) -> None:
+        if order_id in self.pos:
+            return
+        self.pos[order_id] = len(self.ids)
+        self.ids.append(order_id)
+        self.status.append(STATUS_CODES[status])
+        self.version.append(version)
+
+    def sample(self, rng: random.Random = random) -> Tuple[str, str, int]:
+        """Random live order as (order_id, status, version); the set must not be empty."""
+        index = rng.randrange(len(self.ids))
+        return self.ids[index], STATUS_NAMES[self.status[index]], self.version[index]
+
+    def random_id(self, rng: random.Random = random) -> str | None:
+        return self.ids[rng.randrange(len(self.ids))] if self.ids else None
+
+    def advance(self, order_id: str, status: str, version: int) -> None:
+        index = self.pos.get(order_id)
+        if index is None:
+            return
+        if status in TERMINAL_STATUSES:
+            self._remove(index)
+            self.evicted += 1
+        else:
+            self.status[index] = STATUS_CODES[status]
+            self.version[index] = version
+
+    def _remove(self, index: int) -> None:
+        last = len(self.ids) - 1
+        del self.pos[self.ids[index]]
+        if index != last:
+            self.ids[index] = self.ids[last]
+            self.status[index] = self.status[last]
+            self.version[index] = self.version[last]
+            self.pos[self.ids[index]] = index
+        self.ids.pop()
+        self.status.pop()
+        self.version.pop()
+
+
 def _parse_http_paths(raw: str) -> List[Tuple[str, str]]:
     paths: List[Tuple[str, str]] = []
     if not raw:
@@ -73,16 +178,22 @@ def rand_order_id(prefix: str = "ORD", length: int = 6) -> str:
     return f"{prefix}-" + "".join(random.choices(string.ascii_uppercase + string.digits, k=length))
 
 
+def partitioned_key(routing_key: str, order_id: str) -> str:
+    if PARTITIONS <= 0:
+        return routing_key
+    return f"{routing_key}.p{zlib.crc32(order_id.encode('utf-8')) % PARTITIONS:02d}"
+
+
 def publish(channel: pika.adapters.blocking_connection.BlockingChannel, routing_key: str, payload: Dict) -> None:
     channel.basic_publish(
         exchange=EXCHANGE,
-        routing_key=routing_key,
+        routing_key=partitioned_key(routing_key, payload["order_id"]),
         body=json.dumps(payload).encode("utf-8"),
         properties=pika.BasicProperties(content_type="application/json", delivery_mode=2),
     )
 
 
-def http_worker(name: str, live_orders: Dict[str, Dict[str, int]], stop: threading.Event) -> None:
+def http_worker(name: str, live_orders: LiveOrders, stop: threading.Event) -> None:
     if not HTTP_BASE_URL or not HTTP_PATHS:
         return
 
@@ -93,11 +204,10 @@ def http_worker(name: str, live_orders: Dict[str, Dict[str, int]], stop: threadi
 
         if "{order_id}" in url:
             with LIVE_LOCK:
-                order_ids = list(live_orders.keys())
-            if not order_ids:
+                order_id = live_orders.random_id()
+            if order_id is None:
                 time.sleep(HTTP_DELAY)
                 continue
-            order_id = random.choice(order_ids)
             url = url.replace("{order_id}", order_id)
 
         try:
@@ -117,27 +227,422 @@ def http_worker(name: str, live_orders: Dict[str, Dict[str, int]], stop: threadi
             time.sleep(HTTP_DELAY)
 
 
+class LatencyHistogram:
+    """Log-linear histogram of microsecond values, HDR style.
+
+    Values below 2 * 2**SIGNIFICANT_BITS are exact; above that every power of two
+    is split into 2**SIGNIFICANT_BITS buckets, so the relative error stays under
+    1 / 2**SIGNIFICANT_BITS (0.8%) up to any value. Buckets are a sparse dict,
+    so histograms are small and can be merged.
+    """
+
+    SIGNIFICANT_BITS = 7
+    SUB = 1 << SIGNIFICANT_BITS
+
+    def __init__(self) -> None:
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        if value < 2 * self.SUB:
+            return value
+        shift = value.bit_length() - self.SIGNIFICANT_BITS - 1
+        return shift * self.SUB + (value >> shift)
+
+    def _highest(self, index: int) -> int:
+        if index < 2 * self.SUB:
+            return index
+        shift = index // self.SUB - 1
+        return ((index - shift * self.SUB + 1) << shift) - 1
+
+    def record(self, micros: float) -> None:
+        value = max(0, int(micros))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> int:
+        if not self.total:
+            return 0
+        rank = max(1, int(p / 100.0 * self.total + 0.999999))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._highest(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        ms = lambda micros: round(micros / 1000.0, 3)  # noqa: E731
+        return {
+            "count": self.total,
+            "mean_ms": ms(self.sum / self.total) if self.total else 0.0,
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+            "p99.9_ms": ms(self.percentile(99.9)),
+            "max_ms": ms(self.max),
+        }
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.latency = LatencyHistogram()   # from the intended send time
+        self.service = LatencyHistogram()   # from the actual send time
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+
+    def merge(self, other: "EndpointStats") -> None:
+        self.latency.merge(other.latency)
+        self.service.merge(other.service)
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.errors += other.errors
+
+    def summary(self) -> Dict:
+        return {**self.latency.summary(), "service": self.service.summary(),
+                "errors": self.errors, "statuses": dict(sorted(self.statuses.items()))}
+
+
+class _HttpPool:
+    """Minimal HTTP/1.1 keep-alive client over asyncio streams (no third-party deps)."""
+
+    def __init__(self, base_url: str, size: int) -> None:
+        parts = urlsplit(base_url)
+        self.ssl = parts.scheme == "https"
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.host_header = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.slots = asyncio.Semaphore(size)
+
+    async def request(self, method: str, path: str, body: bytes | None) -> int:
+        async with self.slots:
+            conn = self.idle.pop() if self.idle else await asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl or None)
+            try:
+                status, keep_alive = await self._exchange(conn, method, path, body)
+            except BaseException:
+                conn[1].close()
+                raise
+            if keep_alive:
+                self.idle.append(conn)
+            else:
+                conn[1].close()
+            return status
+
+    async def _exchange(self, conn, method: str, path: str, body: bytes | None) -> Tuple[int, bool]:
+        reader, writer = conn
+        body = body or b""
+        head = (f"{method} {self.prefix}{path} HTTP/1.1\r\nHost: {self.host_header}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by server")
+        status = int(status_line.split(None, 2)[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+
+        keep_alive = headers.get("connection") != "close"
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            pass
+        elif "content-length" in headers:
+            await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await reader.read()
+            keep_alive = False
+        return status, keep_alive
+
+
+class OpenLoopRunner:
+    """Fires HTTP_PATHS requests on a fixed arrival schedule and records latencies per endpoint."""
+
+    def __init__(self, rate: float, duration: float, seed: int | None = None) -> None:
+        self.rate = rate
+        self.duration = duration
+        self.rng = random.Random(seed)
+        self.stats: Dict[str, EndpointStats] = {}
+        self.order_ids: List[str] = []
+        self.scheduled = 0
+        self.skipped = 0
+        self.max_lag = 0.0
+
+    def _request_for(self, method: str, path: str) -> Tuple[str, bytes | None] | None:
+        if "{order_id}" in path:
+            if not self.order_ids:
+                return None
+            path = path.replace("{order_id}", self.rng.choice(self.order_ids))
+        if method == "POST":
+            order_id = rand_order_id()
+            self.order_ids.append(order_id)
+            return path, json.dumps({"id": order_id, "status": "CREATED"}).encode("utf-8")
+        if method in {"PUT", "PATCH"}:
+            status = self.rng.choice(["UPDATED", "SHIPPED", "CANCELLED"])
+            return path, json.dumps({"status": status}).encode("utf-8")
+        return path, None
+
+    async def _fire(self, pool: _HttpPool, intended: float, endpoint: str, method: str,
+                    path: str, body: bytes | None) -> None:
+        loop = asyncio.get_running_loop()
+        stats = self.stats.setdefault(endpoint, EndpointStats())
+        sent = loop.time()
+        self.max_lag = max(self.max_lag, sent - intended)
+        try:
+            status = await asyncio.wait_for(pool.request(method, path, body), OPEN_TIMEOUT)
+            key = str(status)
+            if status >= 500:
+                stats.errors += 1
+        except Exception as exc:  # noqa: BLE001
+            key = type(exc).__name__
+            stats.errors += 1
+        done = loop.time()
+        stats.statuses[key] = stats.statuses.get(key, 0) + 1
+        stats.latency.record((done - intended) * 1e6)
+        stats.service.record((done - sent) * 1e6)
+
+    async def run(self) -> None:
+        pool = _HttpPool(HTTP_BASE_URL, OPEN_CONNECTIONS)
+        loop = asyncio.get_running_loop()
+        start = loop.time() + 0.05
+        end = start + self.duration
+        intended = start
+        tasks = set()
+        while intended < end:
+            delay = intended - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            method, path = self.rng.choice(HTTP_PATHS)
+            request = self._request_for(method, path)
+            if request is None:
+                self.skipped += 1
+            else:
+                task = asyncio.create_task(self._fire(pool, intended, f"{method} {path}", method, *request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                self.scheduled += 1
+            # Next arrival comes from the schedule, never from when the last response arrived
+            intended += self.rng.expovariate(self.rate) if OPEN_ARRIVALS == "poisson" else 1.0 / self.rate
+        await asyncio.gather(*tasks)
+        for _reader, writer in pool.idle:
+            writer.close()
+
+    def summary(self) -> Dict:
+        overall = EndpointStats()
+        for stats in self.stats.values():
+            overall.merge(stats)
+        return {
+            "mode": "open",
+            "rate": self.rate,
+            "duration_s": self.duration,
+            "arrivals": OPEN_ARRIVALS,
+            "scheduled": self.scheduled,
+            "skipped": self.skipped,
+            "max_schedule_lag_ms": round(self.max_lag * 1000.0, 3),
+            "overall": overall.summary(),
+            "endpoints": {endpoint: stats.summary() for endpoint, stats in sorted(self.stats.items())},
+        }
+
+
+def print_summary(summary: Dict) -> None:
+    print(f"[open] {summary['scheduled']} requests at {summary['rate']:.0f}/s for {summary['duration_s']:.0f}s"
+          f" ({summary['skipped']} skipped, max schedule lag {summary['max_schedule_lag_ms']:.1f} ms)")
+    print(f"  {'endpoint':40} {'count':>8} {'err':>6} {'p50':>9} {'p90':>9} {'p99':>9} {'p99.9':>9} {'max':>9}")
+    rows = list(summary["endpoints"].items()) + [("overall", summary["overall"])]
+    for endpoint, s in rows:
+        print(f"  {endpoint:40} {s['count']:8d} {s['errors']:6d} {s['p50_ms']:9.2f} {s['p90_ms']:9.2f}"
+              f" {s['p99_ms']:9.2f} {s['p99.9_ms']:9.2f} {s['max_ms']:9.2f}")
+
+
+def write_summary(summary: Dict) -> None:
+    if OPEN_SUMMARY:
+        with open(OPEN_SUMMARY, "w", encoding="utf-8") as fh:
+            json.dump(summary, fh, indent=2)
+        print(f"[open] summary written to {OPEN_SUMMARY}")
+    else:
+        print(json.dumps(summary, indent=2))
+
+
+def run_open_loop() -> None:
+    if not HTTP_BASE_URL or not HTTP_PATHS:
+        raise SystemExit("PUMP_MODE=open needs HTTP_BASE_URL and HTTP_PATHS")
+    runner = OpenLoopRunner(OPEN_RATE, OPEN_DURATION)
+    try:
+        asyncio.run(runner.run())
+    except KeyboardInterrupt:
+        print("\n[info] Stopped by user")
+    summary = runner.summary()
+    print_summary(summary)
+    write_summary(summary)
+
+
 LIVE_LOCK = threading.Lock()
 
 
-def main(rate_per_sec: float = EVENT_RATE) -> None:
-    creds = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS)
-    params = pika.ConnectionParameters(
+def connection_params() -> pika.ConnectionParameters:
+    return pika.ConnectionParameters(
         host=RABBIT_HOST,
         port=RABBIT_PORT,
         virtual_host=RABBIT_VHOST,
-        credentials=creds,
+        credentials=pika.PlainCredentials(RABBIT_USER, RABBIT_PASS),
         heartbeat=30,
         blocked_connection_timeout=10,
         connection_attempts=5,
         retry_delay=2.0,
     )
 
-    connection = pika.BlockingConnection(params)
+
+def next_event(live_orders: LiveOrders, rng: random.Random, create_ratio: float,
+               id_prefix: str = "ORD", id_length: int = 6) -> Tuple[str, Dict] | None:
+    """Picks the next event (creation or valid transition) and applies it to live_orders."""
+    if not live_orders or rng.random() < create_ratio:
+        order_id = rand_order_id(id_prefix, id_length)
+        live_orders.add(order_id)
+        return "order.created", {"order_id": order_id, "status": "CREATED"}
+    order_id, status, version = live_orders.sample(rng)
+    next_statuses = STATUSES_FLOW.get(status, [])
+    if not next_statuses:
+        return None
+    new_status = rng.choice(next_statuses)
+    live_orders.advance(order_id, new_status, version + 1)
+    return "order.status.updated", {"order_id": order_id, "new_status": new_status, "version": version + 1}
+
+
+def pump_process(index: int, rate: float, duration: float, stats_queue, stop) -> None:
+    """One publishing process: own connection/channel, own live orders, paced in small batches."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent sets `stop` on Ctrl+C
+    rng = random.Random()
+    live_orders = LiveOrders()
+    connection = pika.BlockingConnection(connection_params())
     channel = connection.channel()
     channel.exchange_declare(exchange=EXCHANGE, exchange_type="topic", durable=True)
+    properties = pika.BasicProperties(content_type="application/json", delivery_mode=2)
 
-    live_orders: Dict[str, Dict[str, int]] = {}
+    counts = {"created": 0, "updated": 0}
+    start = last_report = time.monotonic()
+    sent = 0
+    try:
+        while not stop.is_set():
+            now = time.monotonic()
+            if duration and now - start >= duration:
+                break
+            # Publish whatever the schedule owes (at most one tick's worth), then yield briefly
+            due = int((now - start) * rate) - sent if rate > 0 else 1000
+            if due <= 0:
+                time.sleep(min(0.001, 1.0 / rate))
+                continue
+            for _ in range(min(due, 5000)):
+                event = next_event(live_orders, rng, PUMP_CREATE_RATIO, f"ORD{index}", 8)
+                sent += 1
+                if event is None:
+                    continue
+                routing_key, payload = event
+                channel.basic_publish(
+                    exchange=EXCHANGE,
+                    routing_key=partitioned_key(routing_key, payload["order_id"]),
+                    body=json.dumps(payload).encode("utf-8"),
+                    properties=properties,
+                )
+                counts["created" if routing_key == "order.created" else "updated"] += 1
+            if now - last_report >= PUMP_STATS_INTERVAL:
+                stats_queue.put((index, dict(counts, live=len(live_orders), evicted=live_orders.evicted)))
+                last_report = now
+    finally:
+        stats_queue.put((index, dict(counts, live=len(live_orders), evicted=live_orders.evicted, done=True)))
+        connection.close()
+
+
+def run_processes(processes: int, rate_per_sec: float, duration: float) -> Dict:
+    """Starts `processes` publishers, prints aggregated ev/s every interval and returns the totals."""
+    stats_queue = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    share = rate_per_sec / processes if rate_per_sec > 0 else 0
+    workers = [
+        multiprocessing.Process(target=pump_process, args=(i, share, duration, stats_queue, stop), name=f"pump-{i}")
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    target = f"{rate_per_sec:.0f} ev/s" if rate_per_sec > 0 else "max rate"
+    print(f"[info] {processes} processes publishing to {EXCHANGE} at {RABBIT_HOST}:{RABBIT_PORT} ({target}). Ctrl+C to stop.")
+
+    latest: Dict[int, Dict] = {}
+    start = last_print = time.monotonic()
+    last_total = 0
+    try:
+        while len([s for s in latest.values() if s.get("done")]) < processes:
+            try:
+                index, snapshot = stats_queue.get(timeout=PUMP_STATS_INTERVAL)
+                latest[index] = snapshot
+            except Exception:  # noqa: BLE001 - queue.Empty
+                if not any(worker.is_alive() for worker in workers):
+                    break
+            now = time.monotonic()
+            if now - last_print >= PUMP_STATS_INTERVAL:
+                total = sum(s["created"] + s["updated"] for s in latest.values())
+                live = sum(s["live"] for s in latest.values())
+                print(f"[stats] {(total - last_total) / (now - last_print):10,.0f} ev/s  total={total:,}  live={live:,}")
+                last_total, last_print = total, now
+    except KeyboardInterrupt:
+        print("\n[info] Stopped by user")
+        stop.set()
+        while len([s for s in latest.values() if s.get("done")]) < processes:
+            try:
+                index, snapshot = stats_queue.get(timeout=10)
+            except Exception:  # noqa: BLE001 - queue.Empty
+                break
+            latest[index] = snapshot
+    for worker in workers:
+        worker.join()
+
+    elapsed = time.monotonic() - start
+    totals = {key: sum(s.get(key, 0) for s in latest.values()) for key in ("created", "updated", "live", "evicted")}
+    events = totals["created"] + totals["updated"]
+    totals.update(processes=processes, elapsed_s=round(elapsed, 3), events=events,
+                  events_per_s=round(events / elapsed, 1) if elapsed else 0.0)
+    print(f"[info] {events:,} events in {elapsed:.1f}s ({totals['events_per_s']:,.0f} ev/s), "
+          f"{totals['live']:,} live orders, {totals['evicted']:,} evicted")
+    return totals
+
+
+def main(rate_per_sec: float = EVENT_RATE) -> None:
+    if PUMP_MODE == "open":
+        run_open_loop()
+        return
+    if PUMP_PROCESSES > 1:
+        run_processes(PUMP_PROCESSES, rate_per_sec, PUMP_DURATION)
+        return
+
+    connection = pika.BlockingConnection(connection_params())
+    channel = connection.channel()
+    channel.exchange_declare(exchange=EXCHANGE, exchange_type="topic", durable=True)
+
+    live_orders = LiveOrders()
     stop_http = threading.Event()
     http_threads: List[threading.Thread] = []
 
@@ -157,40 +662,17 @@ def main(rate_per_sec: float = EVENT_RATE) -> None:
     print(f"[info] Publishing to {EXCHANGE} at {RABBIT_HOST}:{RABBIT_PORT} ({rate_per_sec:.1f} ev/s). Ctrl+C to stop.")
 
     counter = 0
+    started = time.monotonic()
     try:
-        while True:
+        while not PUMP_DURATION or time.monotonic() - started < PUMP_DURATION:
             counter += 1
             with LIVE_LOCK:
-                has_orders = bool(live_orders)
-
-            should_create = not has_orders or random.random() < 0.5
-            if should_create:
-                order_id = rand_order_id()
-                payload = {"order_id": order_id, "status": "CREATED"}
-                publish(channel, "order.created", payload)
-                with LIVE_LOCK:
-                    live_orders[order_id] = {"status": "CREATED", "version": 0}
-                print(f"[{counter:05}] created -> {payload}")
-            else:
-                with LIVE_LOCK:
-                    order_id = random.choice(list(live_orders.keys()))
-                    status = live_orders[order_id]["status"]
-                    version = live_orders[order_id]["version"]
-                next_statuses = STATUSES_FLOW.get(status, [])
-                if not next_statuses:
-                    time.sleep(sleep_time)
-                    continue
-                new_status = random.choice(next_statuses)
-                payload = {
-                    "order_id": order_id,
-                    "new_status": new_status,
-                    "version": version + 1,
-                }
-                publish(channel, "order.status.updated", payload)
-                with LIVE_LOCK:
-                    live_orders[order_id]["status"] = new_status
-                    live_orders[order_id]["version"] = version + 1
-                print(f"[{counter:05}] updated -> {payload}")
+                event = next_event(live_orders, random, PUMP_CREATE_RATIO)
+            if event is not None:
+                routing_key, payload = event
+                publish(channel, routing_key, payload)
+                label = "created" if routing_key == "order.created" else "updated"
+                print(f"[{counter:05}] {label} -> {payload}")
 
             time.sleep(sleep_time)
     except KeyboardInterrupt:
@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class VariablesConfig(AppConfig):
+    default_auto_field = 'django.db.models.AutoField'
     name = 'variables'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the page cache invalidation receivers)
@@ -1,10 +1,10 @@
 from ..models import Variable
 
 def get_variables():
-    queryset = Variable.objects.all()
+    queryset = Variable.objects.only('name').order_by('id')
     return (queryset)
 
 def create_variable(form):
-    measurement = form.save()
-    measurement.save()
-    return ()
\ No newline at end of file
+    # The post_save receiver in variables.signals invalidates the cached pages
+    variable = form.save()
+    return variable
\ No newline at end of file
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from measurements.logic.latest_buffer import latest_measurements
+from monitoring.page_cache import invalidate_on_commit
+from .models import Variable
+
+
+@receiver(post_save, sender=Variable)
+@receiver(post_delete, sender=Variable)
+def variable_changed(sender, **kwargs):
+    # Variable names also appear on the measurements dashboard
+    invalidate_on_commit('variables', 'measurements')
+    transaction.on_commit(latest_measurements.invalidate)
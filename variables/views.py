@@ -1,14 +1,20 @@
+from django.core.paginator import Paginator
 from django.shortcuts import render
 from django.contrib import messages
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 from .forms import VariableForm
+from monitoring.page_cache import cached_page
 from .logic.variable_logic import get_variables, create_variable
 
+VARIABLES_PER_PAGE = 50
+
+@cached_page('variables')
 def variable_list(request):
-    variables = get_variables()
+    page = Paginator(get_variables(), VARIABLES_PER_PAGE).get_page(request.GET.get('page'))
     context = {
-        'variable_list': variables
+        'variable_list': page,
+        'page': page,
     }
     return render(request, 'Variable/variables.html', context)
 